@@ -0,0 +1,108 @@
+# -*- coding: utf-8 -*-
+
+""" Implements an Append-Only Write-Ahead Journal of an Audit's Stage Transitions. """
+
+from json import dumps
+from json import loads
+from os import SEEK_END
+from os import fsync
+from os import replace
+from os.path import exists
+
+
+class AuditJournal(object):
+    """ Implements an append-only write-ahead journal of an audit's stage transitions.
+
+    Each entry is a line holding a JSON object, which is flushed to disk before the transition it describes is applied
+    to the audit's files. An entry holds everything needed to apply its transition again, so after an interruption
+    the audit can resume by replaying its last entry, which is found by reading the journal backwards from its end.
+
+    A line without a line ending was torn by an interruption while it was being appended, so it is ignored, and
+    removed before the next entry is appended.
+
+    Only the last entry is ever replayed, so the journal can be compacted to a single entry once the transitions
+    before it have been fully applied (see :meth:`compact`), which keeps the journal from growing with every stage.
+
+    :ivar str _path: The path to the journal file.
+    :ivar dict _last_entry: The last entry of the journal (None if the journal is empty).
+    """
+    # The number of bytes read at a time while searching backwards for the last entry.
+    READ_BLOCK_SIZE = 1 << 16
+
+    def __init__(self, path):
+        """ Initializes an :class:`AuditJournal` object.
+
+        :param str path: The path to the journal file.
+        """
+        self._path = path
+        self._last_entry = None
+        if exists(self._path):
+            with open(self._path, 'rb') as f:
+                _, last_line = self._find_last_line(f)
+            if last_line:
+                self._last_entry = loads(last_line.decode('utf-8'))
+
+    def _find_last_line(self, f):
+        """ Returns the end of the last complete line of the given journal file, and the line.
+
+        :param file f: The journal file, opened in binary mode.
+
+        :returns: The position after the line ending of the last complete line (0 if there is none), and the line
+            (without its line ending, empty if there is none).
+        :rtype: tuple
+        """
+        position = f.seek(0, SEEK_END)
+        data = b''
+        end = None
+        while position > 0:
+            start = max(position - AuditJournal.READ_BLOCK_SIZE, 0)
+            f.seek(start)
+            data = f.read(position - start) + data
+            position = start
+            if end is None:
+                newline = data.rfind(b'\n')
+                if newline < 0:
+                    continue
+                end = position + newline + 1
+                data = data[:newline]
+            newline = data.rfind(b'\n')
+            if newline >= 0:
+                return end, data[newline + 1:]
+        return (0, b'') if end is None else (end, data)
+
+    def get_last_entry(self):
+        """ Returns the last entry of the journal.
+
+        :returns: The last entry of the journal (None if the journal is empty).
+        :rtype: dict
+        """
+        return self._last_entry
+
+    def append(self, entry):
+        """ Appends the given entry to the journal, returning once it is on disk.
+
+        :param dict entry: The entry, which must be serializable as JSON.
+        """
+        if exists(self._path):
+            with open(self._path, 'r+b') as f:
+                end, _ = self._find_last_line(f)
+                f.truncate(end)
+        with open(self._path, 'a') as f:
+            f.write(dumps(entry) + '\n')
+            f.flush()
+            fsync(f.fileno())
+        self._last_entry = entry
+
+    def compact(self, entry):
+        """ Replaces the journal with the given entry alone, atomically, returning once it is on disk.
+
+        The entries replaced must describe transitions which have been fully applied, as they can no longer be replayed.
+
+        :param dict entry: The entry, which must be serializable as JSON.
+        """
+        with open(self._path + '.tmp', 'w') as f:
+            f.write(dumps(entry) + '\n')
+            f.flush()
+            fsync(f.fileno())
+        replace(self._path + '.tmp', self._path)
+        self._last_entry = entry
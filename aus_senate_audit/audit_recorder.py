@@ -2,39 +2,96 @@
 
 """ Encapsulates Utilities for Interacting with Information about the Audit's Progress thus far. """
 
+from contextlib import contextmanager
+from csv import reader
+from csv import writer
+from fcntl import LOCK_EX
+from fcntl import flock
+from glob import glob
+from io import StringIO
+from itertools import islice
 from json import load
 from json import dumps
+from os import fsync
 from os import makedirs
+from os import remove
+from os import replace
 from os.path import exists
+from os.path import getsize
 
+from aus_senate_audit.audit_journal import AuditJournal
+from aus_senate_audit.audit_store import AuditStore
 from aus_senate_audit.constants import AGGREGATE_BALLOTS_FILE_NAME
+from aus_senate_audit.constants import AGGREGATE_TALLY_FILE_NAME
 from aus_senate_audit.constants import AUDIT_DIR_NAME
+from aus_senate_audit.constants import AUDITED_EVENT
 from aus_senate_audit.constants import AUDIT_INFO_FILE_NAME
+from aus_senate_audit.constants import AUDIT_JOURNAL_FILE_NAME
+from aus_senate_audit.constants import AUDIT_LOCK_FILE_NAME
 from aus_senate_audit.constants import AUDIT_ROUND_FILE_NAME
+from aus_senate_audit.constants import AUDIT_STORE_FILE_NAME
+from aus_senate_audit.constants import BATCH_KEY_HEADERS
 from aus_senate_audit.constants import COLUMN_HEADERS
 from aus_senate_audit.constants import COLUMN_HEADER_DELIMS
+from aus_senate_audit.constants import FORMAL_PREFERENCES_CSV_NUM_HEADER_LINES
 from aus_senate_audit.constants import MATCH_HEADERS
+from aus_senate_audit.constants import PACKET_DIR_NAME
+from aus_senate_audit.constants import PACKET_FILE_NAME
 from aus_senate_audit.constants import ROUND_DIR_NAME
+from aus_senate_audit.constants import SAMPLED_EVENT
 from aus_senate_audit.constants import SELECTED_BALLOTS_FILE_NAME
+from aus_senate_audit.constants import SELECTED_BALLOTS_PACKET_FILE_NAME
 from aus_senate_audit.constants import AUDIT_STAGE_KEY
 from aus_senate_audit.constants import SAMPLE_SIZE_KEY
+from aus_senate_audit.constants import VALIDATED_EVENT
 
 
 class AuditRecorder(object):
     """ Encapsulates utilities for interacting with information about the audit's progress thus far.
 
+    The audit's progress is recorded either in the audit directory's info file, round files and aggregate ballots file,
+    or in an embedded SQLite store (see :class:`AuditStore`) in the audit directory. The store is used whenever it
+    exists, so only the first recorder of an audit needs to ask for it.
+
+    Each stage transition (drawing a sample, validating it and auditing it) is first appended to the audit's journal
+    (see :class:`AuditJournal`), and then applied by replacing files atomically. A transition interrupted before it
+    was fully applied is applied again from the journal when the audit is next resumed.
+
+    A manual audit round may be split into work packets, one per counting team. The completed packets are ingested
+    as they come back, possibly by several processes at once, and the round is closed (validated) once every team's
+    packet has been ingested. Closing a round and resuming an interrupted transition hold the audit's lock file, so
+    only one process applies them.
+
     :ivar str state: The abbreviated name of the state whose senate election is being audited.
+    :ivar :class:`AuditStore` _store: The store the audit's progress is recorded in (None if it is recorded in files).
+    :ivar :class:`AuditJournal` _journal: The journal of the audit's stage transitions.
     """
-    def __init__(self, state):
+    def __init__(self, state, use_store=None):
         """ Initializes an :class:`AuditResults` object.
 
         :param str state: The abbreviated name of the state whose senate election is being audited.
+        :param bool use_store: Whether to record the audit's progress in an embedded SQLite store, importing the
+            audit's files into it if the store does not exist yet (default: None, the store is used if it exists).
         """
         self._state = state
-        if not exists(self.get_audit_dir_name()):
+        is_new_audit = not exists(self.get_audit_dir_name())
+        if is_new_audit:
             makedirs('{}/{}'.format(self.get_audit_dir_name(), ROUND_DIR_NAME))
+        store_path = self.get_file_path(AUDIT_STORE_FILE_NAME)
+        if use_store is None:
+            use_store = exists(store_path)
+        self._store = None
+        if use_store:
+            is_new_store = not exists(store_path)
+            self._store = AuditStore(store_path)
+            if is_new_store and not is_new_audit:
+                self.import_files()
+        elif is_new_audit:
             self.record_audit_info(0, 0)
             self._initialize_aggregate_ballots_file()
+        with self._lock():
+            self._journal = AuditJournal(self.get_file_path(AUDIT_JOURNAL_FILE_NAME))
+            self._recover()
 
     @staticmethod
     def remove_preferences_from_ballot(ballot):
@@ -47,6 +104,59 @@ class AuditRecorder(object):
         """
         return ballot.split('"')[0]  # Works because preferences column is wrapped in quotation marks.
 
+    @staticmethod
+    def _replace_file(path, contents):
+        """ Replaces the given file with the given contents atomically, returning once the contents are on disk.
+
+        :param str path: The path to the file.
+        :param str contents: The new contents of the file.
+        """
+        with open(path + '.tmp', 'w') as f:
+            f.write(contents)
+            f.flush()
+            fsync(f.fileno())
+        replace(path + '.tmp', path)
+
+    @contextmanager
+    def _lock(self):
+        """ Holds the audit's lock file, which is released when the process holding it exits.
+
+        :returns: A context manager holding the audit's lock file.
+        :rtype: context manager
+        """
+        with open(self.get_file_path(AUDIT_LOCK_FILE_NAME), 'a') as f:
+            flock(f.fileno(), LOCK_EX)
+            yield
+
+    @staticmethod
+    def _format_ballot(fields):
+        """ Returns the line of the formal preferences format holding the given fields.
+
+        :param list fields: The fields of a ballot.
+
+        :returns: The line holding the fields (without a line ending).
+        :rtype: str
+        """
+        line = StringIO()
+        writer(line, lineterminator='').writerow(fields)
+        return line.getvalue()
+
+    def uses_store(self):
+        """ Returns whether the audit's progress is recorded in an embedded SQLite store.
+
+        :returns: Whether the audit's progress is recorded in an embedded SQLite store.
+        :rtype: bool
+        """
+        return self._store is not None
+
+    def get_store(self):
+        """ Returns the store the audit's progress is recorded in.
+
+        :returns: The store the audit's progress is recorded in (None if it is recorded in files).
+        :rtype: :class:`AuditStore`
+        """
+        return self._store
+
     def get_audit_dir_name(self):
         """ Returns the audit directory name for the given state.
 
@@ -70,17 +180,115 @@ class AuditRecorder(object):
         with open(self.get_file_path(AGGREGATE_BALLOTS_FILE_NAME), 'w') as f:
             f.write('{}\n{}\n'.format(','.join(COLUMN_HEADERS), ','.join(COLUMN_HEADER_DELIMS)))
 
-    def add_new_ballots_to_aggregate(self, path_to_selected_ballots_file):
+    def add_new_ballots_to_aggregate(self, new_ballots):
         """ Adds the completed selected ballots to the aggregate ballots file.
 
-        :param str path_to_selected_ballots_file: The path to the selected ballots file.
+        :param list new_ballots: The lines of the selected ballots file (excluding the header).
         """
+        if self._store is not None:
+            self._store.add_aggregate_ballots(
+                self.get_current_audit_stage(),
+                [new_ballot.rstrip('\n') for new_ballot in new_ballots if new_ballot.strip()],
+            )
+            return
         with open(self.get_file_path(AGGREGATE_BALLOTS_FILE_NAME), 'a') as f:
-            with open(path_to_selected_ballots_file, 'r') as selected_ballots_file:
-                selected_ballots_file.readline()  # Skip the header.
-                new_ballots = [line for line in selected_ballots_file]
-                for new_ballot in new_ballots:
-                    f.write(new_ballot)
+            for new_ballot in new_ballots:
+                f.write(new_ballot)
+            f.flush()
+            fsync(f.fileno())
+
+    def _get_aggregate_position(self):
+        """ Returns the position of the end of the aggregate ballots.
+
+        :returns: The size of the aggregate ballots file in bytes, or the number of aggregate ballots in the store.
+        :rtype: int
+        """
+        if self._store is not None:
+            return self._store.get_num_aggregate_ballots()
+        return getsize(self.get_file_path(AGGREGATE_BALLOTS_FILE_NAME))
+
+    def _get_aggregate_end(self, position, new_ballots):
+        """ Returns the position of the end of the aggregate ballots once the given ballots are added at the given
+        position.
+
+        :param int position: The position of the end of the aggregate ballots (see :meth:`_get_aggregate_position`).
+        :param list new_ballots: The lines of the selected ballots file (excluding the header).
+
+        :returns: The position of the end of the aggregate ballots once the ballots are added.
+        :rtype: int
+        """
+        if self._store is not None:
+            return position + sum(1 for new_ballot in new_ballots if new_ballot.strip())
+        return position + sum(len(new_ballot.encode('utf-8')) for new_ballot in new_ballots)
+
+    def _truncate_aggregate_ballots(self, position):
+        """ Removes the aggregate ballots after the given position.
+
+        :param int position: The position of the end of the aggregate ballots to keep (see
+            :meth:`_get_aggregate_position`).
+        """
+        if self._store is not None:
+            self._store.truncate_aggregate_ballots(position)
+            return
+        with open(self.get_file_path(AGGREGATE_BALLOTS_FILE_NAME), 'r+b') as f:
+            f.truncate(position)
+
+    def read_aggregate_ballots(self, position=0):
+        """ Returns the aggregate ballots added after the given position.
+
+        The position is the byte offset in the aggregate ballots file, or the number of aggregate ballots in the store.
+
+        :param int position: The position returned by a previous call (default: 0, all aggregate ballots are read).
+
+        :returns: The aggregate ballots (lines in the formal preferences format) added after the given position, and
+            the position after them (None if the position is past the end of the aggregate ballots, e.g. because they
+            were reset).
+        :rtype: tuple
+        """
+        if self._store is not None:
+            end = self._store.get_num_aggregate_ballots()
+            return (self._store.get_aggregate_ballots(position), end) if position <= end else None
+        path = self.get_file_path(AGGREGATE_BALLOTS_FILE_NAME)
+        if position > getsize(path):
+            return None
+        with open(path, 'rb') as f:
+            f.seek(position)
+            new_data = f.read()
+        lines = StringIO(new_data.decode('utf-8'), newline=None)
+        if position == 0:
+            lines = islice(lines, FORMAL_PREFERENCES_CSV_NUM_HEADER_LINES, None)
+        return lines, position + len(new_data)
+
+    def get_aggregate_tally(self):
+        """ Returns the tally of the ballot types in the aggregate ballots file recorded thus far.
+
+        Example of the aggregate tally.
+
+        .. code-block:: python
+
+            {
+                'signature': [[1024, 1500000000000000000], ...],
+                'max_ballots': None,
+                'offset': 158118,
+                'num_ballots_read': 1200,
+                'ballots': [[[28147, 28148, 28150], 35], ...],
+            }
+
+        :returns: The tally of the aggregate ballots file (None if no tally has been recorded).
+        :rtype: dict
+        """
+        try:
+            with open(self.get_file_path(AGGREGATE_TALLY_FILE_NAME), 'r') as f:
+                return load(f)
+        except (OSError, ValueError):
+            return None
+
+    def record_aggregate_tally(self, tally):
+        """ Records the tally of the ballot types in the aggregate ballots file, replacing it atomically.
+
+        :param dict tally: The tally of the aggregate ballots file (see :meth:`get_aggregate_tally`).
+        """
+        AuditRecorder._replace_file(self.get_file_path(AGGREGATE_TALLY_FILE_NAME), dumps(tally))
 
     def record_audit_info(self, audit_stage, sample_size):
         """ Sets information about the audit recored thus far.
@@ -88,8 +296,20 @@ class AuditRecorder(object):
         :param int audit_stage: The new stage of the audit.
         :param int sample_size: The sample size of the audit.
         """
-        open(self.get_file_path(AUDIT_INFO_FILE_NAME), 'w').write(
-            dumps({AUDIT_STAGE_KEY: audit_stage, SAMPLE_SIZE_KEY: sample_size})
+        if self._store is not None:
+            self._store.record_audit_info(audit_stage, sample_size)
+            return
+        self._write_audit_info_file(audit_stage, sample_size)
+
+    def _write_audit_info_file(self, audit_stage, sample_size):
+        """ Writes the given information about the audit to the audit info file.
+
+        :param int audit_stage: The stage of the audit.
+        :param int sample_size: The sample size of the audit.
+        """
+        AuditRecorder._replace_file(
+            self.get_file_path(AUDIT_INFO_FILE_NAME),
+            dumps({AUDIT_STAGE_KEY: audit_stage, SAMPLE_SIZE_KEY: sample_size}),
         )
 
     def get_audit_info(self):
@@ -108,7 +328,10 @@ class AuditRecorder(object):
         :returns: A dictionary containing information about the audit recorded thus far.
         :rtype: dict
         """
-        return load(open(self.get_file_path(AUDIT_INFO_FILE_NAME), 'r'))
+        if self._store is not None:
+            return self._store.get_audit_info()
+        with open(self.get_file_path(AUDIT_INFO_FILE_NAME), 'r') as f:
+            return load(f)
 
     def get_current_audit_stage(self):
         """ Returns the current stage of the audit.
@@ -126,34 +349,320 @@ class AuditRecorder(object):
         """
         return self.get_audit_info()[SAMPLE_SIZE_KEY]
 
-    def record_selected_ballots(self, audit_stage, sample, quick):
+    @staticmethod
+    def assign_teams(sample, num_teams):
+        """ Returns the counting team assigned to each of the given ballots.
+
+        Every ballot of a batch (vote collection point ID and batch number) is assigned to the same team, and the
+        batches are assigned, largest first, to the team with the fewest ballots thus far.
+
+        :param list sample: A list of ballots from the most recently drawn increment sample.
+        :param int num_teams: The number of counting teams.
+
+        :returns: The team (numbered from 1) of each ballot, in the order of the sample.
+        :rtype: list
+        """
+        batch_column_indices = [COLUMN_HEADERS.index(header) for header in BATCH_KEY_HEADERS]
+        batches = {}
+        for position, fields in enumerate(reader(sample)):
+            batches.setdefault(tuple(fields[i].strip() for i in batch_column_indices), []).append(position)
+        teams = [None] * len(sample)
+        num_ballots = [0] * num_teams
+        for positions in sorted(batches.values(), key=len, reverse=True):
+            team = num_ballots.index(min(num_ballots))
+            num_ballots[team] += len(positions)
+            for position in positions:
+                teams[position] = team + 1
+        return teams
+
+    def record_selected_ballots(self, audit_stage, sample, quick, teams=None):
         """ Writes the given sample of ballots to the appropriate selected ballots and round file.
 
         :param int audit_stage: The current stage of the audit.
         :param list sample: A list of ballots from the most recently drawn increment sample.
         :param boolean quick: A flag indicating whether the audit is manual (`quick` is False) or not manual.
+        :param list teams: The counting team assigned to each ballot (default: None, the ballots are not split into
+            work packets). The work packets of earlier audit rounds are removed, so only this round's packets remain.
         """
         # Write the new ballots in the sample to the selected ballots file, without specifying the original preferences.
-        with open(SELECTED_BALLOTS_FILE_NAME, 'w') as f:
-            f.write('{}\n'.format(','.join(COLUMN_HEADERS)))
-            f.write('\n'.join([ballot if quick else self.remove_preferences_from_ballot(ballot) for ballot in sample]) + '\n')
-        # Write the new ballots in the sample to the audit round file.
-        with open(self.get_file_path(AUDIT_ROUND_FILE_NAME.format(ROUND_DIR_NAME, audit_stage)), 'w') as f:
-            f.write('{}\n'.format(','.join(COLUMN_HEADERS + MATCH_HEADERS)) + '\n')
-            f.write('\n'.join([ballot for ballot in sample]) + '\n')
-
-    def record_current_audit_round_match_records(self, match_records):
-        """ Writes the given match records to the current audit round file.
-
-        :param list match_records: The match records to write to the current audit round file.
-        """
-        audit_round_file_name = self.get_file_path(AUDIT_ROUND_FILE_NAME.format(
-            ROUND_DIR_NAME,
-            self.get_current_audit_stage(),
-        ))
-        with open(audit_round_file_name, 'w') as f:
-            f.write('{}\n'.format(','.join(COLUMN_HEADERS + MATCH_HEADERS)))
-            f.write('\n'.join([match_record for match_record in match_records]))
+        selected_ballots = [ballot if quick else self.remove_preferences_from_ballot(ballot) for ballot in sample]
+        AuditRecorder._replace_file(
+            SELECTED_BALLOTS_FILE_NAME,
+            '{}\n'.format(','.join(COLUMN_HEADERS)) + '\n'.join(selected_ballots) + '\n',
+        )
+        # Remove the work packets of earlier audit rounds (which may have had more teams), so they cannot be mistaken
+        # for this round's packets, and write each team's ballots to the team's work packet.
+        for path in glob(SELECTED_BALLOTS_PACKET_FILE_NAME.format('*')):
+            remove(path)
+        for team in sorted(set(teams or [])):
+            AuditRecorder._replace_file(
+                SELECTED_BALLOTS_PACKET_FILE_NAME.format(team),
+                '{}\n'.format(','.join(COLUMN_HEADERS)) + ''.join([
+                    '{}\n'.format(ballot) for ballot, ballot_team in zip(selected_ballots, teams) if ballot_team == team
+                ]),
+            )
+        # Write the new ballots in the sample to the audit round.
+        if self._store is not None:
+            self._store.record_sampled_ballots(audit_stage, sample)
+        else:
+            self._write_round_file(audit_stage, sample)
+
+    def _write_round_file(self, audit_stage, sample):
+        """ Writes the given sample of ballots to the round file of the given audit stage.
+
+        :param int audit_stage: The audit stage.
+        :param list sample: The ballots drawn for the audit stage.
+        """
+        AuditRecorder._replace_file(
+            self.get_file_path(AUDIT_ROUND_FILE_NAME.format(ROUND_DIR_NAME, audit_stage)),
+            '{}\n'.format(','.join(COLUMN_HEADERS + MATCH_HEADERS)) + ''.join([
+                '{}\n'.format(ballot) for ballot in sample
+            ]),
+        )
+
+    def get_current_audit_round_ballots(self):
+        """ Returns the electronic ballots drawn for the current audit round.
+
+        :returns: The electronic ballots drawn for the current audit round.
+        :rtype: list
+        """
+        if self._store is not None:
+            return self._store.get_sampled_ballots(self.get_current_audit_stage())
+        with open(self.get_current_audit_round_file_name(), 'r') as f:
+            f.readline()  # Skip the header.
+            return [line.rstrip() for line in f if line.strip()]
+
+    def record_current_audit_round_matches(self, matches):
+        """ Records whether the paper preferences of each ballot drawn for the current audit round matched its
+        electronic preferences.
+
+        :param list matches: The electronic ballot, whether it matched (1 or 0) and the paper preferences of each
+            ballot drawn for the current audit round (None for ballots which were not validated).
+        """
+        if self._store is not None:
+            self._store.record_matches(
+                self.get_current_audit_stage(),
+                [(match, paper_preferences) if match is not None else None for _, match, paper_preferences in matches],
+            )
+            return
+        self._write_match_records_file(self.get_current_audit_stage(), matches)
+
+    def _write_match_records_file(self, audit_stage, matches):
+        """ Writes the given match records to the round file of the given audit stage.
+
+        :param int audit_stage: The audit stage.
+        :param list matches: The electronic ballot, whether it matched (1 or 0) and the paper preferences of each
+            ballot drawn for the audit stage (None for ballots which were not validated, whose match record is left
+            empty).
+        """
+        match_records = [
+            electronic_ballot + (',{},"{}"'.format(match, paper_preferences) if match is not None else '') + '\n'
+            for electronic_ballot, match, paper_preferences in matches
+        ]
+        AuditRecorder._replace_file(
+            self.get_file_path(AUDIT_ROUND_FILE_NAME.format(ROUND_DIR_NAME, audit_stage)),
+            '{}\n'.format(','.join(COLUMN_HEADERS + MATCH_HEADERS)) + ''.join(match_records),
+        )
+
+    def get_journal_entry(self):
+        """ Returns the last entry of the audit's journal.
+
+        :returns: The last stage transition of the audit (None if no stage transition has been journaled).
+        :rtype: dict
+        """
+        return self._journal.get_last_entry()
+
+    def get_current_stage_event(self):
+        """ Returns the last event journaled for the current stage of the audit.
+
+        :returns: The last event of the current audit stage (None if no event of the stage has been journaled).
+        :rtype: str
+        """
+        entry = self._journal.get_last_entry()
+        if entry is None or entry[AUDIT_STAGE_KEY] != self.get_current_audit_stage():
+            return None
+        return entry['event']
+
+    def is_audit_complete(self):
+        """ Returns whether the audit has terminated, according to its journal.
+
+        :returns: Whether the last audited stage of the audit terminated the audit.
+        :rtype: bool
+        """
+        return self.get_current_stage_event() == AUDITED_EVENT and self._journal.get_last_entry()['done']
+
+    def record_sample(self, audit_stage, sample_size, sample_indices, sample, quick, num_teams=1):
+        """ Records the sample drawn for the given new audit stage, journaling it before it is applied.
+
+        :param int audit_stage: The new stage of the audit.
+        :param int sample_size: The sample size of the audit.
+        :param list sample_indices: The positions of the ballots drawn for the new audit stage.
+        :param list sample: A list of ballots from the most recently drawn increment sample.
+        :param boolean quick: A flag indicating whether the audit is manual (`quick` is False) or not manual.
+        :param int num_teams: The number of counting teams the sample is split between (default: 1).
+        """
+        entry = {
+            'event': SAMPLED_EVENT,
+            AUDIT_STAGE_KEY: audit_stage,
+            SAMPLE_SIZE_KEY: sample_size,
+            'sample_indices': sample_indices,
+            'sample': sample,
+            'quick': quick,
+            'teams': AuditRecorder.assign_teams(sample, num_teams) if num_teams > 1 else None,
+        }
+        self._journal.append(entry)
+        self._apply_sample(entry)
+
+    def _apply_sample(self, entry):
+        """ Applies the given journaled sample. The audit info is recorded last, so it only records the new audit
+        stage once the stage's selected ballots and round file are in place.
+
+        :param dict entry: The journal entry of the sample (see :meth:`record_sample`).
+        """
+        self.record_selected_ballots(entry[AUDIT_STAGE_KEY], entry['sample'], entry['quick'], entry.get('teams'))
+        self.record_audit_info(entry[AUDIT_STAGE_KEY], entry[SAMPLE_SIZE_KEY])
+
+    def record_validation(self, matches, new_ballots):
+        """ Records the validation of the current audit round, journaling it before it is applied.
+
+        :param list matches: The electronic ballot, whether it matched (1 or 0) and the paper preferences of each
+            ballot drawn for the current audit round (None for ballots which were not validated).
+        :param list new_ballots: The validated paper ballots (lines of the selected ballots files), which are added to
+            the aggregate ballots.
+        """
+        position = self._get_aggregate_position()
+        entry = {
+            'event': VALIDATED_EVENT,
+            AUDIT_STAGE_KEY: self.get_current_audit_stage(),
+            'matches': matches,
+            'new_ballots': new_ballots,
+            'aggregate_position': position,
+            'aggregate_end': self._get_aggregate_end(position, new_ballots),
+        }
+        self._journal.append(entry)
+        self._apply_validation(entry)
+
+    def _apply_validation(self, entry):
+        """ Applies the given journaled validation. Any ballots a previous attempt added to the aggregate ballots
+        are removed first, so the validated ballots are added exactly once.
+
+        :param dict entry: The journal entry of the validation (see :meth:`record_validation`).
+        """
+        self.record_current_audit_round_matches([tuple(match) for match in entry['matches']])
+        self._truncate_aggregate_ballots(entry['aggregate_position'])
+        self.add_new_ballots_to_aggregate(entry['new_ballots'])
+
+    def get_current_round_teams(self):
+        """ Returns the counting team assigned to each ballot of the current audit round, if it has not been closed.
+
+        :returns: The team of each ballot drawn for the current audit round (None if the round was not split into work
+            packets, or has been closed).
+        :rtype: list
+        """
+        if self.get_current_stage_event() != SAMPLED_EVENT:
+            return None
+        return self._journal.get_last_entry().get('teams')
+
+    def _get_packet_file_path(self, team):
+        """ Returns the path to the ingested work packet of the given team for the current audit round.
+
+        :param int team: The team.
+
+        :returns: The path to the ingested work packet.
+        :rtype: str
+        """
+        return self.get_file_path(PACKET_FILE_NAME.format(PACKET_DIR_NAME, self.get_current_audit_stage(), team))
+
+    def record_packet(self, team, matches, new_ballots):
+        """ Records the given team's ingested work packet for the current audit round, replacing any recorded before.
+
+        :param int team: The team.
+        :param list matches: The position in the round, whether it matched (1 or 0) and the paper preferences of each
+            ballot validated by the packet.
+        :param list new_ballots: The position in the round and paper ballot (line of the packet) of each ballot
+            validated by the packet.
+        """
+        makedirs(self.get_file_path(PACKET_DIR_NAME), exist_ok=True)
+        AuditRecorder._replace_file(
+            self._get_packet_file_path(team),
+            dumps({'team': team, 'matches': matches, 'new_ballots': new_ballots}),
+        )
+
+    def get_packets(self):
+        """ Returns the work packets of the current audit round ingested thus far.
+
+        :returns: The ingested work packets (see :meth:`record_packet`), indexed by team.
+        :rtype: dict
+        """
+        packets = {}
+        for team in sorted(set(self.get_current_round_teams() or [])):
+            if exists(self._get_packet_file_path(team)):
+                with open(self._get_packet_file_path(team), 'r') as f:
+                    packets[team] = load(f)
+        return packets
+
+    def get_waiting_teams(self):
+        """ Returns the teams whose work packet for the current audit round has not been ingested.
+
+        :returns: The teams whose work packet is still to come back.
+        :rtype: list
+        """
+        packets = self.get_packets()
+        return [team for team in sorted(set(self.get_current_round_teams() or [])) if team not in packets]
+
+    def close_round(self):
+        """ Closes the current audit round by merging its ingested work packets, once every team's packet has been
+        ingested.
+
+        A paper ballot validated by several packets is merged from the packet of the lowest numbered team only. The
+        validated paper ballots are added to the aggregate ballots in the order they were drawn, whatever order the
+        packets came back in.
+
+        :returns: The merged matches (see :meth:`record_validation`) and the paper ballots which were validated by more
+            than one packet (None if the round is still waiting for packets, or was closed by another process).
+        :rtype: tuple
+        """
+        with self._lock():
+            # Another process may have closed the round since the journal was read.
+            self._journal = AuditJournal(self.get_file_path(AUDIT_JOURNAL_FILE_NAME))
+            if self.get_current_round_teams() is None or self.get_waiting_teams():
+                return None
+            electronic_ballots = self.get_current_audit_round_ballots()
+            matches = [(electronic_ballot, None, None) for electronic_ballot in electronic_ballots]
+            new_ballots = {}
+            duplicates = []
+            for _, packet in sorted(self.get_packets().items()):
+                for (position, match, paper_preferences), (_, new_ballot) in zip(
+                    packet['matches'],
+                    packet['new_ballots'],
+                ):
+                    if position in new_ballots:
+                        duplicates.append(new_ballot.rstrip('\n'))
+                        continue
+                    matches[position] = (electronic_ballots[position], match, paper_preferences)
+                    new_ballots[position] = new_ballot
+            self.record_validation(matches, [new_ballots[position] for position in sorted(new_ballots)])
+        return matches, duplicates
+
+    def record_stage_outcome(self, done):
+        """ Records the outcome of auditing the current audit stage.
+
+        The stage's sample and validation have been applied by the time it is audited, so the journal is compacted to
+        the outcome alone rather than keeping another copy of every audit round's ballots.
+
+        :param bool done: Whether the audit terminated at the current audit stage.
+        """
+        self._journal.compact({'event': AUDITED_EVENT, AUDIT_STAGE_KEY: self.get_current_audit_stage(), 'done': done})
+
+    def _recover(self):
+        """ Applies the last journaled stage transition again if it was interrupted before it was fully applied. """
+        entry = self._journal.get_last_entry()
+        if entry is None:
+            return
+        if entry['event'] == SAMPLED_EVENT and self.get_current_audit_stage() < entry[AUDIT_STAGE_KEY]:
+            self._apply_sample(entry)
+        elif entry['event'] == VALIDATED_EVENT and self._get_aggregate_position() != entry['aggregate_end']:
+            self._apply_validation(entry)
 
     def get_current_audit_round_file_name(self):
         """ Returns the path to the current round file for the audit.
@@ -162,3 +671,61 @@ class AuditRecorder(object):
         :rtype: str
         """
         return self.get_file_path(AUDIT_ROUND_FILE_NAME.format(ROUND_DIR_NAME, self.get_audit_info()[AUDIT_STAGE_KEY]))
+
+    def import_files(self):
+        """ Imports the audit's info file, round files and aggregate ballots file into the audit's store. """
+        audit_info_file_name = self.get_file_path(AUDIT_INFO_FILE_NAME)
+        if not exists(audit_info_file_name):
+            return
+        with open(audit_info_file_name, 'r') as f:
+            audit_info = load(f)
+        sample_size = 0
+        for audit_stage in range(1, audit_info[AUDIT_STAGE_KEY] + 1):
+            audit_round_file_name = self.get_file_path(AUDIT_ROUND_FILE_NAME.format(ROUND_DIR_NAME, audit_stage))
+            if not exists(audit_round_file_name):
+                continue
+            with open(audit_round_file_name, 'r') as f:
+                f.readline()  # Skip the header.
+                lines = [line.rstrip('\n') for line in f if line.strip()]
+            sample, matches = [], []
+            for line, fields in zip(lines, reader(lines)):
+                if len(fields) < len(COLUMN_HEADERS):
+                    continue  # Not a ballot (e.g. the match record of a blank line).
+                if len(fields) == len(COLUMN_HEADERS) + len(MATCH_HEADERS):
+                    sample.append(AuditRecorder._format_ballot(fields[:len(COLUMN_HEADERS)]))
+                    matches.append((int(fields[-2]), fields[-1]))
+                else:
+                    sample.append(line)
+                    matches.append(None)
+            sample_size += len(sample)
+            if audit_stage == audit_info[AUDIT_STAGE_KEY]:
+                sample_size = audit_info[SAMPLE_SIZE_KEY]
+            self._store.record_audit_info(audit_stage, sample_size)
+            self._store.record_sampled_ballots(audit_stage, sample)
+            if any(match is not None for match in matches):
+                self._store.record_matches(audit_stage, matches)
+        aggregate_ballots_file_name = self.get_file_path(AGGREGATE_BALLOTS_FILE_NAME)
+        if exists(aggregate_ballots_file_name):
+            with open(aggregate_ballots_file_name, 'r') as f:
+                lines = islice(f, FORMAL_PREFERENCES_CSV_NUM_HEADER_LINES, None)
+                self._store.add_aggregate_ballots(None, [line.rstrip('\n') for line in lines if line.strip()])
+
+    def export_files(self):
+        """ Exports the audit's progress recorded in the audit's store to the audit's info file, round files and
+        aggregate ballots file (which can then be audited without the store).
+        """
+        audit_info = self._store.get_audit_info()
+        self._write_audit_info_file(audit_info[AUDIT_STAGE_KEY], audit_info[SAMPLE_SIZE_KEY])
+        for audit_stage in range(1, audit_info[AUDIT_STAGE_KEY] + 1):
+            sample = self._store.get_sampled_ballots(audit_stage)
+            matches = self._store.get_matches(audit_stage)
+            if any(match is not None for match in matches):
+                self._write_match_records_file(audit_stage, [
+                    (electronic_ballot,) + (tuple(match) if match is not None else (None, None))
+                    for electronic_ballot, match in zip(sample, matches)
+                ])
+            elif sample:
+                self._write_round_file(audit_stage, sample)
+        self._initialize_aggregate_ballots_file()
+        with open(self.get_file_path(AGGREGATE_BALLOTS_FILE_NAME), 'a') as f:
+            f.writelines('{}\n'.format(ballot) for ballot in self._store.get_aggregate_ballots())
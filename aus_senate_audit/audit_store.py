@@ -0,0 +1,245 @@
+# -*- coding: utf-8 -*-
+
+""" Implements an Embedded SQLite Store of an Audit's Progress. """
+
+from csv import reader
+import sqlite3
+
+from aus_senate_audit.constants import AUDIT_STAGE_KEY
+from aus_senate_audit.constants import COLUMN_HEADERS
+from aus_senate_audit.constants import PAPER_KEY_HEADERS
+from aus_senate_audit.constants import SAMPLE_SIZE_KEY
+
+
+class AuditStore(object):
+    """ Implements an embedded SQLite store of an audit's progress.
+
+    The store holds the same information as the audit's info file, round files and aggregate ballots file, in tables:
+
+    - ``rounds``: the sample size of each audit stage (the last is the audit's current stage).
+    - ``sampled_ballots``: the ballots drawn for each audit stage, indexed by stage and by paper (vote collection point
+      ID, batch number and paper number).
+    - ``match_results``: whether the paper preferences of each sampled ballot matched its electronic preferences.
+    - ``stage_summaries``: the number of ballots validated, and of those that matched, in each audit stage.
+    - ``aggregate_ballots``: the validated (paper) ballots of every audit stage, in the order they were added.
+
+    Every update is a single transaction, so an interrupted audit stage never leaves a partial update behind.
+
+    :ivar :class:`sqlite3.Connection` _connection: The connection to the store's database.
+    """
+    # The statements creating the store's tables and indexes.
+    SCHEMA = '''
+        CREATE TABLE IF NOT EXISTS rounds (
+            audit_stage INTEGER PRIMARY KEY,
+            sample_size INTEGER NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS sampled_ballots (
+            audit_stage INTEGER NOT NULL,
+            position INTEGER NOT NULL,
+            collection_point_id INTEGER,
+            batch_no INTEGER,
+            paper_no INTEGER,
+            ballot TEXT NOT NULL,
+            PRIMARY KEY (audit_stage, position)
+        );
+        CREATE INDEX IF NOT EXISTS sampled_ballots_paper
+            ON sampled_ballots (collection_point_id, batch_no, paper_no);
+        CREATE TABLE IF NOT EXISTS match_results (
+            audit_stage INTEGER NOT NULL,
+            position INTEGER NOT NULL,
+            match INTEGER NOT NULL,
+            paper_preferences TEXT NOT NULL,
+            PRIMARY KEY (audit_stage, position)
+        );
+        CREATE TABLE IF NOT EXISTS stage_summaries (
+            audit_stage INTEGER PRIMARY KEY,
+            num_ballots INTEGER NOT NULL,
+            num_matches INTEGER NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS aggregate_ballots (
+            id INTEGER PRIMARY KEY,
+            audit_stage INTEGER,
+            ballot TEXT NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS aggregate_ballots_stage ON aggregate_ballots (audit_stage);
+    '''
+
+    # The positions of the columns identifying the paper of a ballot.
+    PAPER_COLUMN_INDICES = [COLUMN_HEADERS.index(header) for header in PAPER_KEY_HEADERS]
+
+    def __init__(self, path):
+        """ Initializes an :class:`AuditStore` object, creating the store's tables if they do not exist.
+
+        :param str path: The path to the store's database file.
+        """
+        self._connection = sqlite3.connect(path)
+        with self._connection:
+            self._connection.executescript(AuditStore.SCHEMA)
+
+    def close(self):
+        """ Closes the connection to the store's database. """
+        self._connection.close()
+
+    def get_audit_info(self):
+        """ Returns information about the audit recorded thus far.
+
+        :returns: The current stage of the audit and its sample size (see :meth:`AuditRecorder.get_audit_info`).
+        :rtype: dict
+        """
+        row = self._connection.execute(
+            'SELECT audit_stage, sample_size FROM rounds ORDER BY audit_stage DESC LIMIT 1'
+        ).fetchone()
+        audit_stage, sample_size = row if row is not None else (0, 0)
+        return {AUDIT_STAGE_KEY: audit_stage, SAMPLE_SIZE_KEY: sample_size}
+
+    def record_audit_info(self, audit_stage, sample_size):
+        """ Records the sample size of the given audit stage, which becomes the audit's current stage.
+
+        :param int audit_stage: The new stage of the audit.
+        :param int sample_size: The sample size of the audit.
+        """
+        with self._connection:
+            self._connection.execute(
+                'INSERT OR REPLACE INTO rounds (audit_stage, sample_size) VALUES (?, ?)',
+                (audit_stage, sample_size),
+            )
+
+    def record_sampled_ballots(self, audit_stage, sample):
+        """ Records the ballots drawn for the given audit stage, replacing any recorded for it before.
+
+        :param int audit_stage: The audit stage.
+        :param list sample: The ballots drawn for the audit stage (lines of the formal preferences file).
+        """
+        rows = []
+        for position, (ballot, fields) in enumerate(zip(sample, reader(sample))):
+            paper = [fields[i] if i < len(fields) else None for i in AuditStore.PAPER_COLUMN_INDICES]
+            rows.append([audit_stage, position] + paper + [ballot])
+        with self._connection:
+            self._connection.execute('DELETE FROM sampled_ballots WHERE audit_stage = ?', (audit_stage,))
+            self._connection.execute('DELETE FROM match_results WHERE audit_stage = ?', (audit_stage,))
+            self._connection.execute('DELETE FROM stage_summaries WHERE audit_stage = ?', (audit_stage,))
+            self._connection.executemany(
+                'INSERT INTO sampled_ballots (audit_stage, position, collection_point_id, batch_no, paper_no, ballot) '
+                'VALUES (?, ?, ?, ?, ?, ?)',
+                rows,
+            )
+
+    def get_sampled_ballots(self, audit_stage):
+        """ Returns the ballots drawn for the given audit stage.
+
+        :param int audit_stage: The audit stage.
+
+        :returns: The ballots drawn for the audit stage, in the order they were drawn.
+        :rtype: list
+        """
+        return [ballot for ballot, in self._connection.execute(
+            'SELECT ballot FROM sampled_ballots WHERE audit_stage = ? ORDER BY position',
+            (audit_stage,),
+        )]
+
+    def find_sampled_ballots(self, collection_point_id, batch_no, paper_no):
+        """ Returns the audit stages which drew the ballot printed on the given paper.
+
+        :param int collection_point_id: The ID of the vote collection point of the paper.
+        :param int batch_no: The number of the batch of the paper.
+        :param int paper_no: The number of the paper within its batch.
+
+        :returns: The audit stage, position in the stage's sample and ballot of each time the paper was drawn.
+        :rtype: list
+        """
+        return self._connection.execute(
+            'SELECT audit_stage, position, ballot FROM sampled_ballots '
+            'WHERE collection_point_id = ? AND batch_no = ? AND paper_no = ? ORDER BY audit_stage, position',
+            (collection_point_id, batch_no, paper_no),
+        ).fetchall()
+
+    def record_matches(self, audit_stage, matches):
+        """ Records the match results of the given audit stage, and its summary, replacing any recorded before.
+
+        :param int audit_stage: The audit stage.
+        :param list matches: Whether the paper preferences of each ballot drawn for the audit stage matched its
+            electronic preferences (1 or 0), and the paper preferences, in the order the ballots were drawn (None for
+            ballots which were not validated).
+        """
+        rows = [
+            (audit_stage, position, match[0], match[1])
+            for position, match in enumerate(matches) if match is not None
+        ]
+        with self._connection:
+            self._connection.execute('DELETE FROM match_results WHERE audit_stage = ?', (audit_stage,))
+            self._connection.executemany(
+                'INSERT INTO match_results (audit_stage, position, match, paper_preferences) VALUES (?, ?, ?, ?)',
+                rows,
+            )
+            self._connection.execute(
+                'INSERT OR REPLACE INTO stage_summaries (audit_stage, num_ballots, num_matches) VALUES (?, ?, ?)',
+                (audit_stage, len(rows), sum(row[2] for row in rows)),
+            )
+
+    def get_matches(self, audit_stage):
+        """ Returns the match results recorded for the given audit stage.
+
+        :param int audit_stage: The audit stage.
+
+        :returns: Whether each ballot drawn for the audit stage matched (1 or 0), and its paper preferences, in the
+            order the ballots were drawn (None for ballots which were not validated).
+        :rtype: list
+        """
+        rows = self._connection.execute(
+            'SELECT m.match, m.paper_preferences FROM sampled_ballots AS s LEFT JOIN match_results AS m '
+            'ON m.audit_stage = s.audit_stage AND m.position = s.position WHERE s.audit_stage = ? ORDER BY s.position',
+            (audit_stage,),
+        ).fetchall()
+        return [row if row[0] is not None else None for row in rows]
+
+    def get_stage_summaries(self):
+        """ Returns the summary of each validated audit stage.
+
+        :returns: The audit stage, number of ballots validated and number of those that matched, of each validated
+            audit stage in order.
+        :rtype: list
+        """
+        return self._connection.execute(
+            'SELECT audit_stage, num_ballots, num_matches FROM stage_summaries ORDER BY audit_stage'
+        ).fetchall()
+
+    def add_aggregate_ballots(self, audit_stage, ballots):
+        """ Appends the given validated ballots to the aggregate ballots.
+
+        :param int audit_stage: The audit stage which validated the ballots (None if unknown).
+        :param list ballots: The validated ballots (lines in the formal preferences format, without line endings).
+        """
+        with self._connection:
+            self._connection.executemany(
+                'INSERT INTO aggregate_ballots (audit_stage, ballot) VALUES (?, ?)',
+                [(audit_stage, ballot) for ballot in ballots],
+            )
+
+    def truncate_aggregate_ballots(self, num_ballots):
+        """ Removes the aggregate ballots after the given number of aggregate ballots.
+
+        :param int num_ballots: The number of aggregate ballots to keep.
+        """
+        with self._connection:
+            self._connection.execute('DELETE FROM aggregate_ballots WHERE id > ?', (num_ballots,))
+
+    def get_num_aggregate_ballots(self):
+        """ Returns the number of aggregate ballots.
+
+        :returns: The number of aggregate ballots (which is also the ID of the last aggregate ballot).
+        :rtype: int
+        """
+        return self._connection.execute('SELECT COALESCE(MAX(id), 0) FROM aggregate_ballots').fetchone()[0]
+
+    def get_aggregate_ballots(self, start=0):
+        """ Returns the aggregate ballots after the given position.
+
+        :param int start: The number of aggregate ballots to skip (default: 0).
+
+        :returns: The aggregate ballots after the first :param:`start`, in the order they were added.
+        :rtype: list
+        """
+        return [ballot for ballot, in self._connection.execute(
+            'SELECT ballot FROM aggregate_ballots WHERE id > ? ORDER BY id',
+            (start,),
+        )]
@@ -92,26 +92,39 @@ Usage:
          - Added edge G -> D because G elected over D.
          - Added edge D -> E because E excluded over D.
          - Added edge F -> E because E excluded over F.
-         --> Linear order determined as B, C, A, F, G, D, E.
+         --> Linear order determined as B, A, F, G, D, E, C.
 
         = Verifying linear order is consisent with real election's tie-breaking events...
-         - Election order tie between ['A', 'B', 'C'] broken with permutation ['B', 'C', 'A'].
+         - Election order tie between ['A', 'B', 'C'] broken with permutation ['B', 'A', 'C'].
          - Election tie between ['D', 'G'] broken by electing G.
          - Exclusion tie between ['D', 'E', 'F'] broken by excluding E.
          --> Linear order is consistent with real election's tie-breaking events.
 
         >> atb.break_tie(['A', 'B', 'C'], 1)
-         - Election order tie between ['A', 'B', 'C'] broken with permutation ['B', 'C', 'A'].
+         - Election order tie between ['A', 'B', 'C'] broken with permutation ['B', 'A', 'C'].
 """
 
+from bisect import bisect_left
 import itertools
-import random
+from json import dumps
+from json import load
+from json import loads
+from os import replace
+from os.path import exists
 import sys
 
+from aus_senate_audit.constants import TIE_BREAKER_RNG_STREAM
+from aus_senate_audit.random_streams import get_rng
+
 
 class AuditTieBreaker(object):
     """ Implements a class for breaking ties encountered during an audit.
 
+    :ivar _seed: The random seed used to determine the random topological sort.
+    :vartype _seed: int
+    :ivar _rng: The random number generator used to determine the random
+        topological sort.
+    :vartype _rng: :class:`numpy.random.Generator`
     :ivar _vertices: A mapping from a vertex in the audit tie breaking graph to its
         neighbors.
     :vartype _vertices: dict
@@ -146,7 +159,7 @@ class AuditTieBreaker(object):
     ELECTION_TIE_BREAK = ' - Election tie between {0} broken by electing {1}.'
     EXCLUSION_TIE_BREAK = ' - Exclusion tie between {0} broken by excluding {1}.'
 
-    def __init__(self, candidate_ids, seed=1, verbose=False, out_f=None):
+    def __init__(self, candidate_ids, seed=1, verbose=False, out_f=None, rng=None):
         """ Initializes the `AuditTieBreaker` object.
 
         :param candidate_ids: A list of the candidate IDs of all candidates in the
@@ -162,10 +175,15 @@ class AuditTieBreaker(object):
         :param out_f: A string representing the name of a file to write all debug
             information to (default: stdout). Only used when `verbose` is true.
         :type out_f: str
+        :param rng: The random number generator used to determine the random
+            topological sort (default: None, the tie breaker's substream of
+            :param:`seed` is used).
+        :type rng: :class:`numpy.random.Generator`
         """
-        random.seed(seed)
+        self._seed = seed
+        self._rng = get_rng(seed, TIE_BREAKER_RNG_STREAM) if rng is None else rng
         self._vertices = {candidate_id : [] for candidate_id in candidate_ids}
-        self._print_fn = AuditTieBreaker._setup_print_fn(out_f) if verbose else lambda x : None
+        self._print_fn = AuditTieBreaker._setup_print_fn(out_f) if verbose else AuditTieBreaker._skip_print
         self._linear_order = {}
 
     @staticmethod
@@ -182,28 +200,107 @@ class AuditTieBreaker(object):
         """
         if out_f is not None:
             sys.stdout = open(out_f, AuditTieBreaker.WRITE_OPT)
-        return lambda x : print(x)
+        return print
+
+    @staticmethod
+    def _skip_print(x):
+        """ Discards the given verbose information.
+
+        NOTE: A named function (rather than a lambda) is used so that `AuditTieBreaker` objects can be pickled and
+        shipped to worker processes.
+
+        :param x: The verbose information to discard.
+        :type x: str
+        """
+        pass
+
+    def _sort(self, vertices):
+        """ Returns a random topological sort of the audit tie-breaking graph.
 
-    def _visit(self, v, linear_order):
-        """ Explores the neighbors of the given node recursively and then adds the
-        explored node to the head of the linear order.
+        The graph is explored depth first from each of the given vertices in turn,
+        with an explicit stack rather than recursion, so the sort takes time linear
+        in the size of the graph however long its chains are. The neighbors of each
+        vertex are shuffled when the vertex is first explored, and each vertex is
+        added to the head of the linear order once all of its neighbors have been
+        explored.
 
-        :param v: A candidate ID.
-        :type v: int
-        :param linear_order: The linear order of candidate IDs so far.
+        :param vertices: The candidate IDs to explore from, in order.
+        :type vertices: list
+
+        :return: The linear order of the candidate IDs.
+        :rtype: list
+        """
+        explored = set()
+        reversed_linear_order = []
+        for root in vertices:
+            if root in explored:
+                continue
+            explored.add(root)
+            self._rng.shuffle(self._vertices[root])
+            stack = [(root, iter(self._vertices[root]))]
+            while stack:
+                v, neighbors = stack[-1]
+                for u in neighbors:
+                    if u not in explored:
+                        # Explore u before the rest of v's neighbors.
+                        explored.add(u)
+                        self._rng.shuffle(self._vertices[u])
+                        stack.append((u, iter(self._vertices[u])))
+                        break
+                else:
+                    stack.pop()
+                    reversed_linear_order.append(v)
+        return reversed_linear_order[::-1]
+
+    def _load_linear_order(self, path, events):
+        """ Returns the linear order saved in the given file, if it was determined
+        for the same candidates, seed and tie-breaking events.
+
+        :param path: The path to the file.
+        :type path: str
+        :param events: The tie-breaking events.
+        :type events: list
+
+        :return: The linear order of the candidate IDs (None if there is no such
+            linear order).
+        :rtype: list
+        """
+        if path is None or not exists(path):
+            return None
+        with open(path, 'r') as f:
+            state = load(f)
+        if (state['seed'], state['candidate_ids'], state['events']) != (
+                self._seed, sorted(self._vertices.keys()), loads(dumps(events))):
+            return None
+        return state['linear_order']
+
+    def _save_linear_order(self, path, events, linear_order):
+        """ Saves the linear order to the given file, replacing it atomically.
+
+        :param path: The path to the file.
+        :type path: str
+        :param events: The tie-breaking events the linear order was determined for.
+        :type events: list
+        :param linear_order: The linear order of the candidate IDs.
         :type linear_order: list
         """
-        if v in linear_order:
-            # Do not explore a node twice.
-            return
-        random.shuffle(self._vertices[v])
-        for u in self._vertices[v]:
-            self._visit(u, linear_order)
-        linear_order.insert(0, v)
-
-    def load_events(self, election_order_ties, election_ties, exclusion_ties):
+        with open(path + '.tmp', 'w') as f:
+            f.write(dumps({
+                'seed': self._seed,
+                'candidate_ids': sorted(self._vertices.keys()),
+                'events': events,
+                'linear_order': linear_order,
+            }))
+        replace(path + '.tmp', path)
+
+    def load_events(self, election_order_ties, election_ties, exclusion_ties, linear_order_path=None):
         """ Loads all tie-breaking events specified in `events_f`.
 
+        If :param:`linear_order_path` is given, the linear order is saved to it,
+        and later tie breakers for the same candidates, seed and events (e.g. in
+        later audit stages) reuse the saved linear order rather than sorting the
+        graph again.
+
         :param election_order_ties: A list of 2-tuples representing election order
             tie events where the first entry is the permutations of election orders
             and the second entry is the permutation that resovled the tie.
@@ -216,6 +313,9 @@ class AuditTieBreaker(object):
             where the first entry is the IDs of the candidates tied for exclusion
             and the second entry is the candidate ID that resovled the tie.
         :type exclusion_ties: list
+        :param linear_order_path: The path to the file the linear order is saved
+            to (default: None, the linear order is not saved).
+        :type linear_order_path: str
         """
         # Construct audit tie-breaking graph.
         self._print_fn(AuditTieBreaker.BUILDING_GRAPH_MSG)
@@ -250,11 +350,14 @@ class AuditTieBreaker(object):
                     ))
 
         # Determine a random topological sorting of the vertices in the audit tie-breaking graph.
-        vertices = sorted(self._vertices.keys())
-        random.shuffle(vertices)
-        linear_order = []
-        for v in vertices:
-            self._visit(v, linear_order)
+        events = [election_order_ties, election_ties, exclusion_ties]
+        linear_order = self._load_linear_order(linear_order_path, events)
+        if linear_order is None:
+            vertices = sorted(self._vertices.keys())
+            self._rng.shuffle(vertices)
+            linear_order = self._sort(vertices)
+            if linear_order_path is not None:
+                self._save_linear_order(linear_order_path, events, linear_order)
         self._linear_order = {linear_order[i] : i for i in range(len(linear_order))}
         self._print_fn(AuditTieBreaker.LINEAR_ORDER_MSG.format(
             AuditTieBreaker.COMMA_DELIM.join([str(x) for x in linear_order]))
@@ -262,8 +365,8 @@ class AuditTieBreaker(object):
 
         # Verify linear order is consistent with the real election's tie-breakin events.
         self._print_fn(AuditTieBreaker.VERIFY_LINEAR_ORDER_MSG)
-        for permutations, resolution in election_order_ties:
-            assert self.break_election_order_tie(permutations) == permutations.index(resolution)
+        for _, resolution in election_order_ties:
+            assert self.get_election_order(resolution) == list(resolution)
         for candidate_ids, resolution in election_ties:
             assert self.break_election_tie(candidate_ids) == candidate_ids.index(resolution)
         for candidate_ids, resolution in exclusion_ties:
@@ -296,9 +399,49 @@ class AuditTieBreaker(object):
             self._print_fn(AuditTieBreaker.EXCLUSION_TIE_BREAK.format(candidate_ids, result))
         return result
 
+    def get_election_order(self, candidate_ids):
+        """ Returns the order in which the given candidates, tied for election, are elected.
+
+        :param candidate_ids: A list of the IDs of the tied candidates.
+        :type candidate_ids: list
+
+        :return: The IDs of the tied candidates, in the order they are elected.
+        :rtype: list
+        """
+        return self.break_tie(candidate_ids, AuditTieBreaker.ELECTION_ORDER_TIE_ID)
+
+    def get_election_order_rank(self, candidate_ids):
+        """ Returns the position of the election order of the given tied candidates in the lexicographically sorted
+        permutations of their IDs.
+
+        The position is computed from the election order directly (as its Lehmer code), without building the
+        permutations.
+
+        :param candidate_ids: A list of the IDs of the tied candidates.
+        :type candidate_ids: list
+
+        :return: The position of the election order in the sorted permutations of the candidate IDs.
+        :rtype: int
+        """
+        remaining = sorted(candidate_ids)
+        rank = 0
+        for cid in self.get_election_order(candidate_ids):
+            i = bisect_left(remaining, cid)
+            rank = rank * len(remaining) + i
+            del remaining[i]
+        return rank
+
     def break_election_order_tie(self, permutations):
-        """ Convenience wrapper for breaking election order ties. """
-        return permutations.index(tuple(self.break_tie(permutations[0], AuditTieBreaker.ELECTION_ORDER_TIE_ID)))
+        """ Convenience wrapper for breaking election order ties, with the callback signature dividebatur expects.
+
+        :param permutations: The lexicographically sorted permutations of the IDs of the tied candidates. Only the
+            first permutation is read.
+        :type permutations: list
+
+        :return: The position of the election order in :param:`permutations`.
+        :rtype: int
+        """
+        return self.get_election_order_rank(permutations[0])
 
     def break_election_tie(self, candidate_ids):
         """ Convenience wrapper for breaking election ties. """
@@ -344,8 +487,8 @@ def test_audit_tie_breaker():
     assert audit_tb.break_tie(['A', 'B', 'C'], 1) == ['B', 'A', 'C']
     assert audit_tb.break_tie(['D', 'E', 'F'], 3) == 'E'
     assert audit_tb.break_tie(['D', 'G'], 2) == 'G'
-    assert audit_tb.break_tie(['B', 'F'], 2) == 'B'  # Test depends on random.seed of 1.
-    assert audit_tb.break_tie(['B', 'F'], 3) == 'F'  # Test depends on random.seed of 1.
+    assert audit_tb.break_tie(['B', 'F'], 2) == 'B'  # Test depends on the tie breaker's random substream for a seed of 1.
+    assert audit_tb.break_tie(['B', 'F'], 3) == 'F'  # Test depends on the tie breaker's random substream for a seed of 1.
     audit_tb._print_fn(' --> Tests PASSED!')
 
 
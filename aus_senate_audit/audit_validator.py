@@ -2,25 +2,106 @@
 
 """ Validates Paper Preferences Against Electronic Preferences. """
 
+from collections import Counter
+from collections import deque
+from csv import reader
+from multiprocessing import Pool
+
 from aus_senate_audit.audit_recorder import AuditRecorder
+from aus_senate_audit.constants import COLUMN_HEADERS
+from aus_senate_audit.constants import PAPER_KEY_HEADERS
+
+
+def read_paper_ballots(paths):
+    """ Returns an iterator over the paper ballots recorded in the given selected ballots files.
+
+    :param list paths: The paths to the selected ballots files.
+
+    :returns: An iterator over the paper ballots (without line endings), in the order they are recorded.
+    :rtype: iterator
+    """
+    for path in paths:
+        with open(path, 'r') as f:
+            f.readline()  # Skip the header.
+            for line in f:
+                if line.strip():
+                    yield line.rstrip()
+
+
+def match_paper_ballots(electronic_ballots, paths):
+    """ Matches the paper ballots recorded in the given selected ballots files against the given electronic ballots.
+
+    :param list electronic_ballots: The electronic ballots drawn for the current audit round.
+    :param list paths: The paths to the selected ballots files.
+
+    :returns: The electronic ballot, whether it matched (1, 0 or None if it has no paper ballot) and the paper
+        preferences of each electronic ballot, in the order they were drawn; the position of the electronic ballot
+        and the paper ballot (with a line ending) of each matched paper ballot, in the order they were read; the extra
+        paper ballots; and the duplicate paper ballots.
+    :rtype: tuple
+    """
+    positions = {}
+    for position, fields in enumerate(reader(electronic_ballots)):
+        positions.setdefault(AuditValidator.get_paper_key(fields), deque()).append(position)
+
+    matches = [(electronic_ballot, None, None) for electronic_ballot in electronic_ballots]
+    new_ballots = []
+    extra, duplicates = [], []
+    for paper_ballot in read_paper_ballots(paths):
+        key = AuditValidator.get_paper_key(next(reader([paper_ballot])))
+        if key not in positions:
+            extra.append(paper_ballot)
+            continue
+        if not positions[key]:
+            duplicates.append(paper_ballot)
+            continue
+        position = positions[key].popleft()
+        matches[position] = (
+            electronic_ballots[position],
+            int(paper_ballot == electronic_ballots[position]),
+            AuditValidator.get_preferences_from_ballot(paper_ballot),
+        )
+        new_ballots.append((position, paper_ballot + '\n'))
+    return matches, new_ballots, extra, duplicates
 
 
 class AuditValidator(object):
     """ Validates paper preferences against electronic preferences.
 
-    :ivar str _path_to_selected_ballots_file: The path to the selected ballots file.
+    The electronic ballots drawn for the current audit round are indexed by the paper they are printed on (vote
+    collection point ID, batch number and paper number). The paper ballots are then streamed from the selected ballots
+    files, which may hold the round in several chunks, in any order, and each is matched against the electronic ballot
+    with the same key as it is read.
+
+    When the round was split into work packets between counting teams, each selected ballots file is instead the
+    completed packet of one team. The packets are validated separately (in parallel, if there are several) and
+    recorded, and the round is closed once every team's packet has been ingested.
+
+    :ivar list _paths_to_selected_ballots_files: The paths to the selected ballots files.
     :ivar :class:`AuditRecorder` _audit_recorder: An object for interfacing with information stored about the audit's
         progress thus far.
+    :ivar list _missing: The electronic ballots with no paper ballot in the selected ballots files.
+    :ivar list _extra: The paper ballots which were not drawn for the current audit round.
+    :ivar list _duplicates: The paper ballots whose paper appears more often than it was drawn.
     """
-    def __init__(self, path_to_selected_ballots_file, audit_recorder):
+    # The positions of the columns identifying the paper of a ballot.
+    PAPER_COLUMN_INDICES = [COLUMN_HEADERS.index(header) for header in PAPER_KEY_HEADERS]
+
+    def __init__(self, paths_to_selected_ballots_files, audit_recorder):
         """ Initializes a :class:`AuditValidator` object.
 
-        :param str path_to_selected_ballots_file: The path to the file containing completed, selected ballots.
+        :param paths_to_selected_ballots_files: The path to the file containing completed, selected ballots, or a list
+            of paths to files each containing a chunk of them.
         :param :class:`AuditRecorder` audit_recorder: An object for interfacing with information stored about the
             audit's progress thus far.
         """
-        self._path_to_selected_ballots_file = path_to_selected_ballots_file
+        if isinstance(paths_to_selected_ballots_files, str):
+            paths_to_selected_ballots_files = [paths_to_selected_ballots_files]
+        self._paths_to_selected_ballots_files = paths_to_selected_ballots_files
         self._audit_recorder = audit_recorder
+        self._missing = []
+        self._extra = []
+        self._duplicates = []
 
     @staticmethod
     def get_preferences_from_ballot(ballot):
@@ -33,41 +114,137 @@ class AuditValidator(object):
         """
         return ballot.split('"')[1]
 
+    @staticmethod
+    def get_paper_key(fields):
+        """ Returns the key identifying the paper of the ballot with the given fields.
+
+        :param list fields: The fields of a ballot.
+
+        :returns: The vote collection point ID, batch number and paper number of the ballot (None if the ballot does
+            not have them).
+        :rtype: tuple
+        """
+        if len(fields) <= max(AuditValidator.PAPER_COLUMN_INDICES):
+            return None
+        return tuple(fields[i].strip() for i in AuditValidator.PAPER_COLUMN_INDICES)
+
     def get_paper_ballots(self):
-        """ Returns the paper ballots recorded in the selected ballots file.
+        """ Returns an iterator over the paper ballots recorded in the selected ballots files.
 
-        :returns: The paper ballots recorded in the selected ballots file.
-        :rtype: list
+        :returns: An iterator over the paper ballots (without line endings), in the order they are recorded.
+        :rtype: iterator
         """
-        with open(self._path_to_selected_ballots_file, 'r') as f:
-            f.readline()  # Skip the header.
-            return [line.rstrip() for line in f]
+        return read_paper_ballots(self._paths_to_selected_ballots_files)
 
     def get_electronic_ballots(self):
-        """ Returns the electronic ballots recorded in the current audit round file.
+        """ Returns the electronic ballots drawn for the current audit round.
 
-        :returns: The electronic ballots recorded in the current audit round file.
+        :returns: The electronic ballots drawn for the current audit round.
         :rtype: list
         """
-        audit_round_file_name = self._audit_recorder.get_current_audit_round_file_name()
-        with open(audit_round_file_name, 'r') as f:
-            f.readline()  # Skip the header.
-            return [line.rstrip() for line in f]
+        return self._audit_recorder.get_current_audit_round_ballots()
+
+    def get_missing(self):
+        """ Returns the electronic ballots with no paper ballot in the selected ballots files.
+
+        :returns: The electronic ballots with no paper ballot, in the order they were drawn.
+        :rtype: list
+        """
+        return self._missing
+
+    def get_extra(self):
+        """ Returns the paper ballots which were not drawn for the current audit round.
+
+        :returns: The paper ballots which were not drawn, in the order they were read.
+        :rtype: list
+        """
+        return self._extra
+
+    def get_duplicates(self):
+        """ Returns the paper ballots whose paper appears in the selected ballots files more often than it was drawn.
+
+        :returns: The duplicate paper ballots, in the order they were read.
+        :rtype: list
+        """
+        return self._duplicates
 
     def compare(self):
         """ Compares the paper preferences against the electronic preferences.
 
-        In addition, records the result of the comparison in the current audit round file and adds the new ballots to
-        the file containing all ballots for the given sample.
+        In addition, records the result of the comparison for the current audit round and adds the matched paper
+        ballots to the aggregate ballots for the given sample. Electronic ballots without a paper ballot are recorded
+        without a match result, and paper ballots which are extra or duplicates are not added to the aggregate ballots;
+        each is reported.
         """
-        paper_ballots = self.get_paper_ballots()
+        matches, new_ballots, self._extra, self._duplicates = match_paper_ballots(
+            self.get_electronic_ballots(),
+            self._paths_to_selected_ballots_files,
+        )
+        self._missing = [electronic_ballot for electronic_ballot, match, _ in matches if match is None]
+        self.report()
+        self._audit_recorder.record_validation(matches, [new_ballot for _, new_ballot in new_ballots])
+
+    def ingest(self, workers=1):
+        """ Ingests the completed work packets of the current audit round, closing the round if every team's packet
+        has been ingested.
+
+        Each selected ballots file is validated separately, and recorded as the packet of the team most of its matched
+        ballots were assigned to (replacing any packet of the team ingested before). Extra and duplicate paper ballots
+        are reported as they are ingested, and missing ballots once the round is closed.
+
+        :param int workers: The number of worker processes used to validate the packets (default: 1).
+
+        :returns: Whether the current audit round was closed by this ingest.
+        :rtype: bool
+        """
+        teams = self._audit_recorder.get_current_round_teams()
         electronic_ballots = self.get_electronic_ballots()
-        match_records = []
-        for paper_ballot, electronic_ballot in zip(paper_ballots, electronic_ballots):
-            match = int(paper_ballot == electronic_ballot)
-            match_records.append(electronic_ballot + ',{},"{}"\n'.format(
-                match,
-                AuditValidator.get_preferences_from_ballot(paper_ballot))
+        args = [(electronic_ballots, [path]) for path in self._paths_to_selected_ballots_files]
+        if workers > 1 and len(args) > 1:
+            with Pool(min(workers, len(args))) as pool:
+                results = pool.starmap(match_paper_ballots, args)
+        else:
+            results = [match_paper_ballots(*arg) for arg in args]
+
+        self._missing, self._extra, self._duplicates = [], [], []
+        for path, (matches, new_ballots, extra, duplicates) in zip(self._paths_to_selected_ballots_files, results):
+            self._extra.extend(extra)
+            self._duplicates.extend(duplicates)
+            if not new_ballots:
+                print('The packet {} has no ballots drawn for the audit round.'.format(path))
+                continue
+            team = Counter(teams[position] for position, _ in new_ballots).most_common(1)[0][0]
+            self._audit_recorder.record_packet(
+                team,
+                [[position] + list(matches[position][1:]) for position, _ in new_ballots],
+                [list(new_ballot) for new_ballot in new_ballots],
             )
-        self._audit_recorder.record_current_audit_round_match_records(match_records)
-        self._audit_recorder.add_new_ballots_to_aggregate(self._path_to_selected_ballots_file)
+            print('Ingested the packet of team {} ({} ballot(s)).'.format(team, len(new_ballots)))
+
+        closed = self._audit_recorder.close_round()
+        if closed is None:
+            self.report()
+            waiting_teams = self._audit_recorder.get_waiting_teams()
+            if waiting_teams:
+                print('Waiting for the packets of team(s) {}.'.format(', '.join(str(team) for team in waiting_teams)))
+            else:
+                print('The audit round has already been closed.')
+            return False
+        matches, duplicates = closed
+        self._duplicates.extend(duplicates)
+        self._missing = [electronic_ballot for electronic_ballot, match, _ in matches if match is None]
+        self.report()
+        print('Closed audit round {}.'.format(self._audit_recorder.get_current_audit_stage()))
+        return True
+
+    def report(self):
+        """ Prints the missing, extra and duplicate ballots found by the last comparison, if there are any. """
+        for description, ballots in (
+            ('drawn for the audit round but missing from the selected ballots', self._missing),
+            ('in the selected ballots but not drawn for the audit round', self._extra),
+            ('duplicated in the selected ballots', self._duplicates),
+        ):
+            if ballots:
+                print('{} ballot(s) {}:'.format(len(ballots), description))
+                for ballot in ballots:
+                    print('  {}'.format(ballot))
@@ -4,12 +4,15 @@
 
 from collections import Counter
 from itertools import chain
-from random import gammavariate
-from random import seed as set_seed
 from time import time
 
+import numpy
 
-def get_new_ballot_weights(election, r):
+from aus_senate_audit.audits.trial_executor import get_trial_executor
+from aus_senate_audit.constants import TRIAL_BLOCK_SIZE
+
+
+def get_new_ballot_weights(election, r, rng):
     """ Returns new ballot weights for the given election.
 
     The new ballot weights are constructed using Gamma Variates to draw from a
@@ -17,25 +20,89 @@ def get_new_ballot_weights(election, r):
     weights. The sum of the new ballot weights should be equal to :param:`r`
     (appoximately). Note that ballot weights are rounded down.
 
+    All Gamma Variates for a trial are drawn with a single call to
+    :param:`rng`, and are normalized and rounded down as a whole array.
+
     :param :class:`BaseSenateElection` election: The senate election to generate
         new ballot weights for.
     :param int r: The sum of the new ballot weights.
+    :param :class:`numpy.random.Generator` rng: The random number generator
+        used to draw the Gamma Variates.
+
+    :returns: The new ballot weights generated using Gamma Variates, indexed
+        by ballot type ID (see :meth:`BaseSenateElection.get_ballot_id`).
+    :rtype: :class:`numpy.ndarray`
+    """
+    gamma_variates = rng.standard_gamma(election.get_ballot_weight_array())
+    return numpy.floor(r * gamma_variates / gamma_variates.sum()).astype(numpy.int64)
+
+
+def get_trial_rng(seed, audit_stage, trial):
+    """ Returns the random number generator for the given trial of the given audit stage.
+
+    Each trial draws from its own stream, derived from the audit seed, the
+    audit stage and the trial index, so the outcome of a trial does not
+    depend on which process runs it or on how many trials ran before it.
+
+    :param int seed: The seed for the audit.
+    :param int audit_stage: The audit stage the trial belongs to.
+    :param int trial: The index of the trial within the audit stage.
+
+    :returns: The random number generator for the given trial.
+    :rtype: :class:`numpy.random.Generator`
+    """
+    return numpy.random.default_rng([seed, audit_stage, trial])
+
+
+def run_trials(election, seed, audit_stage, trials):
+    """ Runs a block of Bayesian trials (posterior-based election simulations).
+
+    The ballot weights of each trial are drawn from the trial's own random
+    number generator, and the trials are then scored together (see
+    :meth:`BaseSenateElection.get_outcomes`).
+
+    :param :class:`BaseSenateElection` election: The senate election to audit.
+    :param int seed: The seed for the audit.
+    :param int audit_stage: The audit stage the trials belong to.
+    :param range trials: The indices of the trials within the audit stage.
+
+    :returns: The IDs of the candidates elected in each trial, sorted in
+        lexicographical order.
+    :rtype: list
+    """
+    new_ballot_weights = numpy.array([
+        get_new_ballot_weights(election, election.get_num_cast_ballots(), get_trial_rng(seed, audit_stage, trial))
+        for trial in trials
+    ])
+    return election.get_outcomes(new_ballot_weights)
+
+
+def is_stage_decided(outcome_counts, trials_run, trials, alpha):
+    """ Returns whether the stopping rule of an audit stage is already decided by the trials run thus far.
 
-    :returns: The new ballot weights generated using Gamma Variates.
-    :rtype: dict
+    The stage confirms its most common outcome if that outcome occurs in at
+    least a (1 - :param:`alpha`) fraction of :param:`trials` trials. Once the
+    most common outcome has reached that frequency, the remaining trials
+    cannot undo the confirmation. Conversely, once the most common outcome
+    could not reach that frequency even if it occurred in every remaining
+    trial, the stage cannot be confirmed.
+
+    :param :class:`Counter` outcome_counts: A mapping from an outcome to the
+        number of trials run thus far with that outcome.
+    :param int trials_run: The number of trials run thus far.
+    :param int trials: The number of trials performed per sample.
+    :param float alpha: The error tolerance for the given audit.
+
+    :returns: Whether the stopping rule of the audit stage is decided.
+    :rtype: bool
     """
-    new_ballot_weights = {}
-    total = 0
-    for ballot in election.get_ballots():
-        weight = election.get_ballot_weight(ballot)
-        new_ballot_weights[ballot] = gammavariate(weight, 1) if weight else 0
-        total += new_ballot_weights[ballot]
-    for ballot in election.get_ballots():
-        new_ballot_weights[ballot] = int(r * new_ballot_weights[ballot] / total)
-    return new_ballot_weights
-
-
-def audit(election, seed, unpopular_freq_threshold, stage_counter=0, alpha=0.05, trials=100, quick=False):
+    freq = outcome_counts.most_common(1)[0][1] if outcome_counts else 0
+    threshold = trials * (1 - alpha)
+    return freq >= threshold or freq + (trials - trials_run) < threshold
+
+
+def audit(election, seed, unpopular_freq_threshold, stage_counter=0, alpha=0.05, trials=100, quick=False, workers=1,
+          sequential=False):
     """ Runs a Bayesian audit on the given senate election.
 
     :param :class:`BaseSenateElection` election: The senate election to audit.
@@ -47,6 +114,12 @@ def audit(election, seed, unpopular_freq_threshold, stage_counter=0, alpha=0.05,
         (default: 0.05).
     :param int trials: The number of trials performed per sample
         (default: 100).
+    :param int workers: The number of worker processes the trials of each
+        stage are spread across (default: 1). The outcomes do not depend on
+        the number of workers.
+    :param bool sequential: Whether to check the stopping rule as trials
+        complete and end a stage as soon as it is decided either way, rather
+        than always running all trials (default: False).
     """
     print(
         'Audit of {} election.\n'.format(election.get_type()),
@@ -62,102 +135,123 @@ def audit(election, seed, unpopular_freq_threshold, stage_counter=0, alpha=0.05,
         '  Random number seed: {}'.format(seed),
     )
     start_time = time()
-    set_seed(seed)
 
     # Cast one "prior" ballot for each candidate to establish a Bayesian
     # prior. The prior ballot is a length-one partial ballot with just a
     # first choice vote for that candidate.
-    for cid in election.get_candidate_ids():
-        election.add_ballot((cid,), 1)
+    election.add_prior_ballots()
 
     # Mapping from candidates to the set of ballots that elected them.
     candidate_to_ballots_map = {}
     candidate_outcomes = None
 
-    while True:
-
-        stage_counter += 1
-        election.draw_ballots()  # Increase sample of cast ballots.
-        print(
-            '\nAudit stage number: {}\n'.format(stage_counter),
-            '  Sample size (including prior ballots): {}\n'.format(
-                election.get_num_ballots_drawn(),
-            ),
-        )
-
-        # -- Run trials in a Bayesian manner --
-        # Each outcome is a tuple of candidates who have been elected in
-        # lexicographical order (NOT the order in which they were elected).
-        print('  Performing {} Bayesian trials (posterior-based election '
-              'simulations) in this stage.'.format(trials)
-        )
-
-        outcomes = []
-        for _ in range(trials):
-            new_ballot_weights = get_new_ballot_weights(
-                election,
-                election.get_num_cast_ballots(),
+    # The executor (and its pool of worker processes) is created once for all stages of the audit.
+    with get_trial_executor(election, run_trials, workers) as executor:
+        while True:
+
+            stage_counter += 1
+            executor.draw_ballots()  # Increase sample of cast ballots.
+            print(
+                '\nAudit stage number: {}\n'.format(stage_counter),
+                '  Sample size (including prior ballots): {}\n'.format(
+                    election.get_num_ballots_drawn(),
+                ),
+            )
+
+            # -- Run trials in a Bayesian manner --
+            # Each outcome is a tuple of candidates who have been elected in
+            # lexicographical order (NOT the order in which they were elected).
+            print('  Performing {} Bayesian trials (posterior-based election '
+                  'simulations) in this stage.'.format(trials)
             )
-            outcome = election.get_outcome(new_ballot_weights)
-            for cid in outcome:
-                if cid not in candidate_to_ballots_map:
-                    candidate_to_ballots_map[cid] = new_ballot_weights
-            outcomes.append(outcome)
-
-        best, freq = Counter(outcomes).most_common(1)[0]
-        print(
-            '  Most common outcome ({} seats):\n'.format(
-                election.get_num_seats(),
-            ),
-            '  {}\n'.format(best),
-            '  Frequency of most common outcome: {} / {}'.format(freq, trials),
-        )
-
-        candidate_outcomes = Counter(chain(*outcomes))
-        print(
-            '  Fraction present in outcome by candidate:\n  {}'.format(
-                ', '.join([
-                    '{}: {}'.format(str(cid), cid_freq / trials)
-                    for cid, cid_freq in sorted(
-                        candidate_outcomes.items(),
-                        key=lambda x: (x[1], x[0]),
-                    )
-                ]),
-            ),
-        )
-        done = False
-        if freq >= trials * (1 - alpha):
+
+            outcomes = []
+            outcome_counts = Counter()
+            blocks_args = [
+                (seed, stage_counter, range(start, min(start + TRIAL_BLOCK_SIZE, trials)))
+                for start in range(0, trials, TRIAL_BLOCK_SIZE)
+            ]
+            # Outcomes are consumed in trial order, so a sequential stage stops after the same trial however many
+            # workers are running. Blocks are submitted lazily as outcomes are consumed.
+            block_outcomes = executor.run(blocks_args)
+            for trial, outcome in enumerate(chain.from_iterable(block_outcomes)):
+                for cid in outcome:
+                    if cid not in candidate_to_ballots_map:
+                        # Trials are reproducible, so the ballot weights are regenerated rather than shipped back.
+                        candidate_to_ballots_map[cid] = get_new_ballot_weights(
+                            election,
+                            election.get_num_cast_ballots(),
+                            get_trial_rng(seed, stage_counter, trial),
+                        )
+                outcomes.append(outcome)
+                outcome_counts[outcome] += 1
+                if sequential and is_stage_decided(outcome_counts, len(outcomes), trials, alpha):
+                    break
+            # No further blocks of the stage are submitted once it is decided.
+            block_outcomes.close()
+            trials_run = len(outcomes)
+            if sequential:
+                print('  Stopping rule decided after {} of {} trials.'.format(trials_run, trials))
+
+            best, freq = outcome_counts.most_common(1)[0]
             print(
-                'Stopping because audit confirmed outcome:\n',
+                '  Most common outcome ({} seats):\n'.format(
+                    election.get_num_seats(),
+                ),
                 '  {}\n'.format(best),
-                'Total number of ballots examined: {}'.format(
-                    election.get_num_ballots_drawn(),
+                '  Frequency of most common outcome: {} / {}'.format(freq, trials_run),
+            )
+
+            candidate_outcomes = Counter(chain(*outcomes))
+            print(
+                '  Fraction present in outcome by candidate:\n  {}'.format(
+                    ', '.join([
+                        '{}: {}'.format(str(cid), cid_freq / trials_run)
+                        for cid, cid_freq in sorted(
+                            candidate_outcomes.items(),
+                            key=lambda x: (x[1], x[0]),
+                        )
+                    ]),
                 ),
             )
-            done = True
-            break
+            done = False
+            if freq >= trials * (1 - alpha):
+                print(
+                    'Stopping because audit confirmed outcome:\n',
+                    '  {}\n'.format(best),
+                    'Total number of ballots examined: {}'.format(
+                        election.get_num_ballots_drawn(),
+                    ),
+                )
+                done = True
+                break
 
-        if election.get_num_ballots_drawn() >= election.get_num_cast_ballots():
-            print('Audit has looked at all ballots. Done.')
-            done = True
-            break
+            if election.get_num_ballots_drawn() >= election.get_num_cast_ballots():
+                print('Audit has looked at all ballots. Done.')
+                done = True
+                break
 
-        if not quick:
-            break
+            if not quick:
+                break
 
     if candidate_outcomes is not None and done:
         for cid, cid_freq in sorted(
                 candidate_outcomes.items(),
                 key=lambda x: (x[1], x[0]),
             ):
-            if cid_freq / trials < unpopular_freq_threshold:
+            if cid_freq / trials_run < unpopular_freq_threshold:
+                # Identical ballot types may be held in several rows (e.g. in a compact simulation), so their weights
+                # are summed rather than collapsed into the weight of the last row.
+                ballot_weights = Counter()
+                for ballot, weight in zip(election.get_ballots(), candidate_to_ballots_map[cid].tolist()):
+                    ballot_weights[ballot] += weight
                 print(
                     '  One set of ballots that elected low frequency '
                     'candidate {} which occurred in {}% of outcomes\n'.format(
                             str(cid),
                             str(cid_freq),
                     ),
-                    '  {}'.format(candidate_to_ballots_map[cid]),
+                    '  {}'.format(dict(ballot_weights)),
                 )
 
     print('Elasped time: {} seconds.'.format(time() - start_time))
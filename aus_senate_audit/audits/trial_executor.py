@@ -0,0 +1,167 @@
+# -*- coding: utf-8 -*-
+
+""" Implements Executors for Running the Trials of an Audit Stage. """
+
+from collections import deque
+from multiprocessing import Pool
+
+from aus_senate_audit.constants import TRIAL_BLOCKS_IN_FLIGHT_PER_WORKER
+
+
+# The senate election and trial function installed in a worker process by :func:`_initialize_worker`, and the number
+# of times the installed senate election has drawn ballots since.
+_worker_election = None
+_worker_trial_fn = None
+_worker_num_draws = 0
+
+
+def _initialize_worker(election, trial_fn):
+    """ Installs the given senate election and trial function in the current worker process.
+
+    Called once per worker process, so the election data is only transferred to each worker once.
+
+    :param :class:`BaseSenateElection` election: The senate election being audited.
+    :param function trial_fn: The function used to run a single trial.
+    """
+    global _worker_election
+    global _worker_trial_fn
+    global _worker_num_draws
+    _worker_election = election
+    _worker_trial_fn = trial_fn
+    _worker_num_draws = 0
+
+
+def _run_worker_trial(task):
+    """ Runs a single trial in a worker process.
+
+    The senate election installed in the worker process first draws ballots until it has drawn them as many times as
+    the executor's senate election had when the trial was submitted. Drawing ballots is deterministic (each senate
+    election draws from its own seeded random number generator), so the worker's copy holds the same ballots.
+
+    :param tuple task: The number of times the executor's senate election had drawn ballots, and the arguments of the
+        trial, passed after the election to the trial function.
+
+    :returns: The result of the trial.
+    """
+    global _worker_num_draws
+    num_draws, trial_args = task
+    while _worker_num_draws < num_draws:
+        _worker_election.draw_ballots()
+        _worker_num_draws += 1
+    return _worker_trial_fn(_worker_election, *trial_args)
+
+
+class SerialTrialExecutor(object):
+    """ Runs the trials of an audit stage one after another in the current process.
+
+    :ivar :class:`BaseSenateElection` _election: The senate election being audited.
+    :ivar function _trial_fn: The function used to run a single trial. It is called with the election followed by
+        the arguments of the trial.
+    """
+    def __init__(self, election, trial_fn):
+        """ Initializes a :class:`SerialTrialExecutor` object.
+
+        :param :class:`BaseSenateElection` election: The senate election being audited.
+        :param function trial_fn: The function used to run a single trial.
+        """
+        self._election = election
+        self._trial_fn = trial_fn
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def draw_ballots(self):
+        """ Adds cast ballots to the growing sample of the senate election being audited, for the next audit stage. """
+        self._election.draw_ballots()
+
+    def run(self, trials_args):
+        """ Runs the given trials.
+
+        :param list trials_args: The arguments of each trial to run.
+
+        :returns: The results of the trials, in the same order as :param:`trials_args`.
+        :rtype: iterator
+        """
+        for trial_args in trials_args:
+            yield self._trial_fn(self._election, *trial_args)
+
+    def close(self):
+        """ Releases any resources held by the executor. """
+        pass
+
+
+class ProcessPoolTrialExecutor(SerialTrialExecutor):
+    """ Runs the trials of an audit stage across a pool of worker processes.
+
+    The pool is created once for all the stages of an audit, so the senate election is only transferred to each worker
+    process once. Each worker process keeps its copy of the senate election up to date by drawing ballots as many times
+    as the executor's senate election has (see :func:`_run_worker_trial`).
+
+    Only a bounded number of trials are submitted to the pool ahead of the trial being consumed, so when the consumer
+    stops reading the results (e.g. once a sequential stage is decided) the workers stop shortly after, rather than
+    running every remaining trial of the stage ahead of the next stage's trials.
+
+    :ivar :class:`multiprocessing.pool.Pool` _pool: The pool of worker processes.
+    :ivar int _max_in_flight: The most trials submitted to the pool whose results have not been consumed.
+    :ivar int _num_draws: The number of times the senate election has drawn ballots through the executor.
+    """
+    def __init__(self, election, trial_fn, workers):
+        """ Initializes a :class:`ProcessPoolTrialExecutor` object.
+
+        :param :class:`BaseSenateElection` election: The senate election being audited.
+        :param function trial_fn: The function used to run a single trial. Must be picklable.
+        :param int workers: The number of worker processes.
+        """
+        super(ProcessPoolTrialExecutor, self).__init__(election, trial_fn)
+        self._pool = Pool(workers, initializer=_initialize_worker, initargs=(election, trial_fn))
+        self._max_in_flight = workers * TRIAL_BLOCKS_IN_FLIGHT_PER_WORKER
+        self._num_draws = 0
+
+    def draw_ballots(self):
+        """ Adds cast ballots to the growing sample of the senate election being audited, and of its copy in each worker
+        process, for the next audit stage.
+        """
+        super(ProcessPoolTrialExecutor, self).draw_ballots()
+        self._num_draws += 1
+
+    def run(self, trials_args):
+        """ Runs the given trials across the pool of worker processes.
+
+        A trial is only submitted once the result of the trial :attr:`_max_in_flight` places before it has been
+        consumed, so no further trials are submitted once the consumer stops reading the results.
+
+        :param list trials_args: The arguments of each trial to run.
+
+        :returns: The results of the trials, in the same order as :param:`trials_args`.
+        :rtype: iterator
+        """
+        in_flight = deque()
+        for trial_args in trials_args:
+            if len(in_flight) >= self._max_in_flight:
+                yield in_flight.popleft().get()
+            in_flight.append(self._pool.apply_async(_run_worker_trial, ((self._num_draws, trial_args),)))
+        while in_flight:
+            yield in_flight.popleft().get()
+
+    def close(self):
+        """ Stops the worker processes, abandoning any trials which have not been run yet. """
+        self._pool.terminate()
+        self._pool.join()
+
+
+def get_trial_executor(election, trial_fn, workers):
+    """ Returns an executor for running the trials of the stages of an audit with the given number of worker processes.
+
+    :param :class:`BaseSenateElection` election: The senate election being audited.
+    :param function trial_fn: The function used to run a single trial.
+    :param int workers: The number of worker processes (one or fewer runs the trials in the current process).
+
+    :returns: An executor for running the trials of an audit stage.
+    :rtype: :class:`SerialTrialExecutor`
+    """
+    if workers <= 1:
+        return SerialTrialExecutor(election, trial_fn)
+    return ProcessPoolTrialExecutor(election, trial_fn, workers)
@@ -0,0 +1,340 @@
+# -*- coding: utf-8 -*-
+
+""" Implements a Compact Binary Columnar Store of the Ballots of a Formal Preferences File. """
+
+from collections import Counter
+from csv import reader
+from csv import writer
+from io import StringIO
+from json import dumps
+from json import load
+from os import makedirs
+from os import remove
+from os import replace
+from os.path import exists
+
+import numpy
+from numpy.lib.format import open_memmap
+
+from aus_senate_audit.constants import BALLOT_STORE_INFO_FILE_NAME
+from aus_senate_audit.constants import COLUMN_HEADERS
+from aus_senate_audit.constants import PREFERENCES_COLUMN_INDEX
+from aus_senate_audit.formal_preferences_index import FormalPreferencesIndex
+
+
+class BallotStore(object):
+    """ Implements a compact binary columnar store of the ballots of a formal preferences file.
+
+    The store is a directory of NumPy arrays, read through memory maps:
+
+    - ``preferences.npy``: the dense preference matrix, with one row per ballot and one column per group (above the
+      line) followed by one column per candidate (below the line).
+    - ``electorate.npy`` and ``collection_point_name.npy``: codes into the dictionaries of names in the store's info
+      file.
+    - ``collection_point_id.npy``, ``batch_no.npy`` and ``paper_no.npy``: the integer columns of each ballot.
+    - ``ballot_type.npy``: the ID of each ballot's formal form (or :attr:`INFORMAL_BALLOT_TYPE`).
+    - ``ballot_type_offsets.npy`` and ``ballot_type_candidate_ids.npy``: the dictionary of formal forms, stored as
+      the concatenated candidate IDs of every form and the offset of each form within them.
+
+    Like :class:`FormalPreferencesIndex`, the store behaves like the list of ballots (lines of the formal preferences
+    file, excluding the header lines) it was converted from; every ballot is checked to round trip exactly when the
+    store is built.
+
+    :ivar str _path: The path to the store's directory.
+    :ivar dict _info: The store's info (the signature of the data it was built from and its dictionaries of names).
+    :ivar dict _columns: A mapping from the name of a column to a memory map of its array.
+    """
+    # The columns of the store, in addition to the preference matrix.
+    COLUMNS = [
+        'electorate',
+        'collection_point_name',
+        'collection_point_id',
+        'batch_no',
+        'paper_no',
+        'ballot_type',
+    ]
+
+    # The dictionary coded columns of the store, and the key of their dictionary in the store's info.
+    DICTIONARY_COLUMNS = {
+        'electorate': 'electorates',
+        'collection_point_name': 'collection_point_names',
+    }
+
+    # The codes for the preference marks which are not numbers.
+    PREFERENCE_CODES = {'': 0, '*': 0xFFFF, '/': 0xFFFE}
+
+    # The text of each preference code which is not a number.
+    PREFERENCE_TEXTS = dict((code, text) for text, code in PREFERENCE_CODES.items())
+
+    # The ballot type of an informal ballot.
+    INFORMAL_BALLOT_TYPE = -1
+
+    def __init__(self, path):
+        """ Initializes a :class:`BallotStore` object.
+
+        :param str path: The path to the store's directory.
+        """
+        self._path = path
+        with open(self._get_file_path(BALLOT_STORE_INFO_FILE_NAME), 'r') as f:
+            self._info = load(f)
+        self._columns = dict(
+            (name, numpy.load(self._get_file_path('{}.npy'.format(name)), mmap_mode='r'))
+            for name in BallotStore.COLUMNS + ['preferences', 'ballot_type_offsets', 'ballot_type_candidate_ids']
+        )
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        """ Releases the memory maps of the store's columns (once no arrays read from them remain). The ballots cannot
+        be read once the store is closed.
+        """
+        self._columns = {}
+
+    def _get_file_path(self, file_name):
+        """ Returns the path to the given file within the store's directory.
+
+        :param str file_name: The name of the file.
+
+        :returns: The path to the given file within the store's directory.
+        :rtype: str
+        """
+        return '{}/{}'.format(self._path, file_name)
+
+    @classmethod
+    def open(cls, path, signature):
+        """ Returns the store in the given directory, if it was built from the data with the given signature.
+
+        :param str path: The path to the store's directory.
+        :param list signature: The signature of the data the store must have been built from.
+
+        :returns: The store, or None if it does not exist or is out of date.
+        :rtype: :class:`BallotStore`
+        """
+        if not exists('{}/{}'.format(path, BALLOT_STORE_INFO_FILE_NAME)):
+            return None
+        store = cls(path)
+        return store if store.get_signature() == signature else None
+
+    @staticmethod
+    def _encode_preferences(preferences):
+        """ Returns the preference codes of the given preferences.
+
+        :param str preferences: The comma separated preferences of a ballot.
+
+        :returns: The code of each preference.
+        :rtype: list
+        """
+        return [BallotStore.PREFERENCE_CODES[pref] if pref in BallotStore.PREFERENCE_CODES else int(pref)
+                for pref in preferences.split(',')]
+
+    @staticmethod
+    def _decode_preferences(codes):
+        """ Returns the preferences with the given preference codes.
+
+        :param list codes: The code of each preference.
+
+        :returns: The comma separated preferences of a ballot.
+        :rtype: str
+        """
+        return ','.join(BallotStore.PREFERENCE_TEXTS.get(code, str(code)) for code in codes)
+
+    @staticmethod
+    def _format_row(row):
+        """ Returns the line of a formal preferences file holding the given row.
+
+        :param list row: The value of each column of the row.
+
+        :returns: The line of a formal preferences file holding the given row, without a line break.
+        :rtype: str
+        """
+        line = StringIO()
+        writer(line, lineterminator='').writerow(row)
+        return line.getvalue()
+
+    @classmethod
+    def convert(cls, path_to_formal_preferences_file, path, parser, signature):
+        """ Builds a store in the given directory from the given formal preferences file.
+
+        :param str path_to_formal_preferences_file: The path to a file in the AEC formal preferences format.
+        :param str path: The path to the store's directory.
+        :param :class:`FormalPreferencesParser` parser: Parses the formal form of each ballot.
+        :param list signature: The signature of the data the store is built from.
+
+        :returns: The store.
+        :rtype: :class:`BallotStore`
+
+        :raises ValueError: If a ballot cannot be represented exactly by the store.
+        """
+        info_file_path = '{}/{}'.format(path, BALLOT_STORE_INFO_FILE_NAME)
+        if not exists(path):
+            makedirs(path)
+        elif exists(info_file_path):
+            # Invalidate the previous store before overwriting its columns.
+            remove(info_file_path)
+        with FormalPreferencesIndex(path_to_formal_preferences_file) as index:
+            return cls._convert(index, path, parser, signature, info_file_path)
+
+    @classmethod
+    def _convert(cls, index, path, parser, signature, info_file_path):
+        """ Builds a store in the given directory from the ballots of the given formal preferences file.
+
+        :param :class:`FormalPreferencesIndex` index: The ballots of the formal preferences file.
+        :param str path: The path to the store's directory.
+        :param :class:`FormalPreferencesParser` parser: Parses the formal form of each ballot.
+        :param list signature: The signature of the data the store is built from.
+        :param str info_file_path: The path to the store's info file.
+
+        :returns: The store.
+        :rtype: :class:`BallotStore`
+
+        :raises ValueError: If a ballot cannot be represented exactly by the store.
+        """
+        num_ballots = len(index)
+        num_columns = len(next(reader([index[0]]))[PREFERENCES_COLUMN_INDEX].split(',')) if num_ballots else 0
+
+        def create_column(name, dtype, shape=(num_ballots,)):
+            return open_memmap('{}/{}.npy'.format(path, name), mode='w+', dtype=dtype, shape=shape)
+
+        preferences = create_column('preferences', numpy.uint16, (num_ballots, num_columns))
+        columns = {
+            'electorate': create_column('electorate', numpy.int32),
+            'collection_point_name': create_column('collection_point_name', numpy.int32),
+            'collection_point_id': create_column('collection_point_id', numpy.int32),
+            'batch_no': create_column('batch_no', numpy.int32),
+            'paper_no': create_column('paper_no', numpy.int32),
+            'ballot_type': create_column('ballot_type', numpy.int32),
+        }
+        dictionaries = dict((key, {}) for key in BallotStore.DICTIONARY_COLUMNS.values())
+        ballot_types = {}
+        for i, line in enumerate(index):
+            row = next(reader([line]))
+            if len(row) != len(COLUMN_HEADERS):
+                raise ValueError('Ballot {} does not have {} columns: {}'.format(i, len(COLUMN_HEADERS), line))
+            electorate, collection_point_name, collection_point_id, batch_no, paper_no, prefs = row
+            codes = BallotStore._encode_preferences(prefs)
+            if len(codes) != num_columns:
+                raise ValueError('Ballot {} does not have {} preferences: {}'.format(i, num_columns, line))
+            preferences[i] = codes
+            for name, value in (('electorate', electorate), ('collection_point_name', collection_point_name)):
+                dictionary = dictionaries[BallotStore.DICTIONARY_COLUMNS[name]]
+                columns[name][i] = dictionary.setdefault(value, len(dictionary))
+            columns['collection_point_id'][i] = int(collection_point_id)
+            columns['batch_no'][i] = int(batch_no)
+            columns['paper_no'][i] = int(paper_no)
+            form = parser.parse_preferences(prefs)
+            columns['ballot_type'][i] = (
+                BallotStore.INFORMAL_BALLOT_TYPE if form is None else ballot_types.setdefault(form, len(ballot_types))
+            )
+            decoded_row = [electorate, collection_point_name, str(int(collection_point_id)), str(int(batch_no)),
+                           str(int(paper_no)), BallotStore._decode_preferences(codes)]
+            if BallotStore._format_row(decoded_row) != line:
+                raise ValueError('Ballot {} cannot be represented exactly by the store: {}'.format(i, line))
+        for column in [preferences] + list(columns.values()):
+            column.flush()
+
+        forms = list(ballot_types)
+        numpy.save('{}/ballot_type_offsets.npy'.format(path), numpy.cumsum([0] + [len(form) for form in forms]))
+        numpy.save(
+            '{}/ballot_type_candidate_ids.npy'.format(path),
+            numpy.array([cid for form in forms for cid in form], dtype=numpy.int32),
+        )
+        info = {'signature': signature}
+        for key, dictionary in dictionaries.items():
+            info[key] = sorted(dictionary, key=dictionary.get)
+        # The info file is written last, so an interrupted conversion never leaves a store which appears complete.
+        with open(info_file_path + '.tmp', 'w') as f:
+            f.write(dumps(info))
+        replace(info_file_path + '.tmp', info_file_path)
+        return cls(path)
+
+    def get_signature(self):
+        """ Returns the signature of the data the store was built from.
+
+        :returns: The signature of the data the store was built from.
+        :rtype: list
+        """
+        return self._info['signature']
+
+    def get_column(self, name):
+        """ Returns the given column of the store.
+
+        :param str name: The name of the column (one of :attr:`COLUMNS`, or ``preferences``).
+
+        :returns: A read only memory map of the column.
+        :rtype: :class:`numpy.ndarray`
+        """
+        return self._columns[name]
+
+    def get_ballot_type(self, ballot_type):
+        """ Returns the formal form of the given ballot type.
+
+        :param int ballot_type: The ID of the ballot type.
+
+        :returns: The candidate IDs in preference order.
+        :rtype: tuple
+        """
+        offsets = self._columns['ballot_type_offsets']
+        return tuple(self._columns['ballot_type_candidate_ids'][offsets[ballot_type]:offsets[ballot_type + 1]].tolist())
+
+    def get_formal_ballots(self, indices, parser=None):
+        """ Returns the formal ballots at the given positions, read from the store's ballot type column.
+
+        :param list indices: The positions of the ballots (0 based, excluding the header lines).
+        :param :class:`FormalPreferencesParser` parser: Unused, as the formal form of each ballot is stored
+            (default: None).
+
+        :returns: A mapping from a ballot type to the number of formal ballots of that type, in the order the ballot
+            types first appear (as when they are parsed from the formal preferences file).
+        :rtype: :class:`Counter`
+        """
+        ballot_types = self._columns['ballot_type'][numpy.asarray(indices, dtype=numpy.int64)]
+        ballot_types, first_indices, counts = numpy.unique(ballot_types, return_index=True, return_counts=True)
+        order = numpy.argsort(first_indices)
+        ballots = Counter()
+        for ballot_type, count in zip(ballot_types[order].tolist(), counts[order].tolist()):
+            if ballot_type != BallotStore.INFORMAL_BALLOT_TYPE:
+                ballots[self.get_ballot_type(ballot_type)] += count
+        return ballots
+
+    def __len__(self):
+        """ Returns the number of ballots in the store.
+
+        :returns: The number of ballots in the store.
+        :rtype: int
+        """
+        return len(self._columns['ballot_type'])
+
+    def __getitem__(self, i):
+        """ Returns the ballot at the given position, as the line of the formal preferences file it was converted from.
+
+        :param int i: The position of the ballot (0 based, excluding the header lines).
+
+        :returns: The ballot, without trailing whitespace.
+        :rtype: str
+        """
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError('ballot index out of range')
+        columns = self._columns
+        row = [
+            self._info['electorates'][columns['electorate'][i]],
+            self._info['collection_point_names'][columns['collection_point_name'][i]],
+            str(columns['collection_point_id'][i]),
+            str(columns['batch_no'][i]),
+            str(columns['paper_no'][i]),
+            BallotStore._decode_preferences(columns['preferences'][i].tolist()),
+        ]
+        return BallotStore._format_row(row)
+
+    def __iter__(self):
+        """ Returns an iterator over the ballots in the store.
+
+        :returns: An iterator over the ballots in the store.
+        :rtype: iterator
+        """
+        return (self[i] for i in range(len(self)))
@@ -4,11 +4,22 @@
 
 from argparse import ArgumentParser
 
+from aus_senate_audit.constants import CONVERT_MODE
+from aus_senate_audit.constants import COUNTERS
+from aus_senate_audit.constants import DEFAULT_COUNTER
+from aus_senate_audit.constants import DEFAULT_NUM_TEAMS
+from aus_senate_audit.constants import DEFAULT_NUM_WORKERS
 from aus_senate_audit.constants import DEFAULT_SAMPLE_INCREMENT_SIZE
 from aus_senate_audit.constants import DEFAULT_SEED_VALUE
 from aus_senate_audit.constants import DEFAULT_SIMULATED_SENATE_ELECTION_NUM_BALLOTS
 from aus_senate_audit.constants import DEFAULT_SIMULATED_SENATE_ELECTION_NUM_CANDIDATES
+from aus_senate_audit.constants import DEFAULT_SYNTHETIC_ATL_FRACTION
+from aus_senate_audit.constants import DEFAULT_SYNTHETIC_NUM_GROUPS
+from aus_senate_audit.constants import DEFAULT_SYNTHETIC_NUM_TIE_EVENTS
+from aus_senate_audit.constants import DEFAULT_SYNTHETIC_VACANCIES
 from aus_senate_audit.constants import DEFAULT_UNPOPULAR_FREQUENCY_THRESHOLD
+from aus_senate_audit.constants import EXPORT_MODE
+from aus_senate_audit.constants import GENERATE_MODE
 from aus_senate_audit.constants import QUICK_MODE
 from aus_senate_audit.constants import REAL_MODE
 from aus_senate_audit.constants import SIMULATION_MODE
@@ -22,8 +33,9 @@ def parse_command_line_args():
         'mode',
         type=str,
         metavar='MODE',
-        choices=[QUICK_MODE, REAL_MODE, SIMULATION_MODE],
-        help='The mode in which to run the audit.',
+        choices=[QUICK_MODE, REAL_MODE, SIMULATION_MODE, CONVERT_MODE, GENERATE_MODE, EXPORT_MODE],
+        help='The mode in which to run the audit (or convert the data for a state, or all states, to binary ballot \
+        stores, or generate a synthetic dataset for a state, or export the audit store of a state to files).',
     )
     parser.add_argument(
         '-s',
@@ -36,13 +48,51 @@ def parse_command_line_args():
         '--num-ballots',
         type=int,
         default=DEFAULT_SIMULATED_SENATE_ELECTION_NUM_BALLOTS,
-        help='The number of ballots cast for a simulated senate election',
+        help='The number of ballots cast for a simulated senate election (or a generated synthetic dataset).',
     )
     parser.add_argument(
         '--num-candidates',
         type=int,
         default=DEFAULT_SIMULATED_SENATE_ELECTION_NUM_CANDIDATES,
-        help='The number of candidates for a simulated senate election.',
+        help='The number of candidates for a simulated senate election (or a generated synthetic dataset).',
+    )
+    parser.add_argument(
+        '--stv',
+        action='store_true',
+        help='Count a simulated senate election with STV over ballots with group tickets (rather than with Borda count \
+        over random permutations of the candidates).',
+    )
+    parser.add_argument(
+        '--num-groups',
+        type=int,
+        default=DEFAULT_SYNTHETIC_NUM_GROUPS,
+        help='The number of groups (above the line boxes) in an STV simulated senate election or a generated \
+        synthetic dataset.',
+    )
+    parser.add_argument(
+        '--vacancies',
+        type=int,
+        default=DEFAULT_SYNTHETIC_VACANCIES,
+        help='The number of vacancies in an STV simulated senate election or a generated synthetic dataset.',
+    )
+    parser.add_argument(
+        '--atl-fraction',
+        type=float,
+        default=DEFAULT_SYNTHETIC_ATL_FRACTION,
+        help='The fraction of the ballots marked above the line in an STV simulated senate election or a generated \
+        synthetic dataset.',
+    )
+    parser.add_argument(
+        '--num-tie-events',
+        type=int,
+        default=DEFAULT_SYNTHETIC_NUM_TIE_EVENTS,
+        help='The number of tie events recorded in the configuration of a generated synthetic dataset.',
+    )
+    parser.add_argument(
+        '--compact',
+        action='store_true',
+        help='Store each simulated ballot as its own row of a compact ballot matrix, without merging ballots of the \
+        same type (for very large simulated senate elections).',
     )
     parser.add_argument(
         '--state',
@@ -53,7 +103,9 @@ def parse_command_line_args():
     parser.add_argument(
         '--selected-ballots',
         type=str,
-        help='The path to the CSV file containing the selected ballots data.',
+        nargs='+',
+        help='The path to the CSV file containing the selected ballots data (or the paths to several CSV files, each \
+        containing a chunk of it, in any order).',
     )
     parser.add_argument(
         '--data',
@@ -79,4 +131,37 @@ def parse_command_line_args():
         default=DEFAULT_SAMPLE_INCREMENT_SIZE,
         help='The number of ballots to add to the growing sample during this audit stage.',
     )
+    parser.add_argument(
+        '--workers',
+        type=int,
+        default=DEFAULT_NUM_WORKERS,
+        help='The number of worker processes to spread the trials of each audit stage across.',
+    )
+    parser.add_argument(
+        '--teams',
+        type=int,
+        default=DEFAULT_NUM_TEAMS,
+        help='The number of counting teams to split the selected ballots of a real senate election audit between. Each \
+        team is sent a work packet of whole batches, and the audit round is closed once every completed packet has \
+        been passed to --selected-ballots.',
+    )
+    parser.add_argument(
+        '--sequential',
+        action='store_true',
+        help='End each audit stage as soon as its trials decide the stopping rule, rather than running all trials.',
+    )
+    parser.add_argument(
+        '--counter',
+        type=str,
+        choices=COUNTERS,
+        default=DEFAULT_COUNTER,
+        help='The counter used to determine the outcome of each trial of a real senate election audit (crosscheck runs \
+        both the native counter and dividebatur, and fails if they disagree).',
+    )
+    parser.add_argument(
+        '--audit-store',
+        action='store_true',
+        help='Record the audit\'s progress in an embedded SQLite store in the audit directory (importing any audit \
+        files recorded thus far), rather than in CSV and JSON files. Once created, the store is always used.',
+    )
     return parser.parse_args()
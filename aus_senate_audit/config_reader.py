@@ -2,16 +2,20 @@
 
 """ Implements a Class for Reading the Australian Senate Election Configuration File. """
 
-from json import load
-
-from aus_senate_audit.constants import CONFIG_FILE_PATH
-from aus_senate_audit.constants import FORMAL_PREFERENCES_CSV_NUM_HEADER_LINES
+from aus_senate_audit.ballot_store import BallotStore
+from aus_senate_audit.constants import AEC_DATA_FORMAT
+from aus_senate_audit.constants import BALLOT_STORE_DIR_NAME
+from aus_senate_audit.constants import UNSUPPORTED_CONTEST_OPTIONS
+from aus_senate_audit.dataset_metadata_cache import DatasetMetadataCache
+from aus_senate_audit.formal_preferences_index import FormalPreferencesIndex
+from aus_senate_audit.senate_election.formal_preferences_parser import FormalPreferencesParser
 
 
 class ConfigReader(object):
     """ Implements a class for reading the Australian senate election configuration file.
 
     :ivar str _data_file_path: The path to all Australian senate election data.
+    :ivar :class:`DatasetMetadataCache` _metadata_cache: A cache of metadata about the senate election data.
     :ivar dict _config: The Australian senate election configuration.
 
     NOTE: The configuration file is in a JSON format.
@@ -22,7 +26,8 @@ class ConfigReader(object):
         :param str data_file_path: The path to all Australian senate election data.
         """
         self._data_file_path = data_file_path
-        self._config = load(open('{}/{}'.format(data_file_path, CONFIG_FILE_PATH), 'r'))
+        self._metadata_cache = DatasetMetadataCache(data_file_path)
+        self._config = self._metadata_cache.get_config()
 
     def get_config(self):
         """ Returns the configuration for the senate election.
@@ -32,16 +37,93 @@ class ConfigReader(object):
         """
         return self._config
 
+    def get_state_metadata(self, state):
+        """ Returns the cached metadata about the given state's contest.
+
+        :param str state: The abbreviated name of the state.
+
+        :returns: The metadata about the given state's contest (see :meth:`DatasetMetadataCache.get_state_metadata`).
+        :rtype: dict
+
+        :raises ValueError: If the state's AEC data is not in a format which can be audited, or the state's contest
+            uses an option which changes how it is counted (see :data:`UNSUPPORTED_CONTEST_OPTIONS`).
+        """
+        contest_config = self._metadata_cache.get_contest_config(state)
+        data_format = contest_config['aec-data']['format']
+        if data_format != AEC_DATA_FORMAT:
+            raise ValueError('Unsupported AEC data format {} for {} (only {} is supported).'.format(
+                data_format,
+                state,
+                AEC_DATA_FORMAT,
+            ))
+        options = [option for option in UNSUPPORTED_CONTEST_OPTIONS if contest_config.get(option)]
+        if options:
+            raise ValueError('Unsupported contest option(s) {} for {} (dividebatur would count it differently).'.format(
+                ', '.join(options),
+                state,
+            ))
+        return self._metadata_cache.get_state_metadata(state)
+
+    def get_state_signature(self, state):
+        """ Returns a signature identifying the current version of the configuration and the given state's data files.
+
+        :param str state: The abbreviated name of the state.
+
+        :returns: The signature of the state's data (see :meth:`DatasetMetadataCache.get_state_signature`).
+        :rtype: list
+        """
+        return self._metadata_cache.get_state_signature(state)
+
+    def get_formal_preferences_file_path(self, state):
+        """ Returns the path to the formal preferences file for the given state.
+
+        :param str state: The abbreviated name of the state.
+
+        :returns: The path to the formal preferences file for the given state.
+        :rtype: str
+        """
+        for state_config in self._config['count']:
+            if state_config['name'] == state:
+                return '{}/{}'.format(self._data_file_path, state_config['aec-data']['formal-preferences'])
+
+    def get_ballot_store_path(self, state):
+        """ Returns the path to the binary ballot store for the given state.
+
+        :param str state: The abbreviated name of the state.
+
+        :returns: The path to the binary ballot store for the given state.
+        :rtype: str
+        """
+        return '{}/{}'.format(self._data_file_path, BALLOT_STORE_DIR_NAME.format(state))
+
+    def convert_ballots_for_state(self, state):
+        """ Converts the formal preferences file for the given state into a binary ballot store.
+
+        :param str state: The abbreviated name of the state.
+
+        :returns: The binary ballot store for the given state.
+        :rtype: :class:`BallotStore`
+        """
+        return BallotStore.convert(
+            self.get_formal_preferences_file_path(state),
+            self.get_ballot_store_path(state),
+            FormalPreferencesParser.from_state_metadata(self.get_state_metadata(state)),
+            self.get_state_signature(state),
+        )
+
     def get_all_ballots_for_state(self, state):
         """ Returns all cast ballots for the given state.
 
+        The ballots are read from the state's binary ballot store if it is up to date, and otherwise on demand from the
+        state's formal preferences file, through an index of their byte offsets. Neither loads the ballots into memory,
+        but both hold memory maps of the state's data until they are closed (both are context managers).
+
         :param str state: The abbreviated name of the state to retrieve all cast ballots for.
 
         :returns: All cast ballots for the given state.
-        :rtype: list
+        :rtype: :class:`BallotStore` or :class:`FormalPreferencesIndex`
         """
-        for state_config in self._config['count']:
-            if state_config['name'] == state:
-                path_to_formal_preferences = state_config['aec-data']['formal-preferences']
-                with open('{}/{}'.format(self._data_file_path, path_to_formal_preferences), 'r') as f:
-                    return [line.rstrip() for line in f][FORMAL_PREFERENCES_CSV_NUM_HEADER_LINES:]
+        store = BallotStore.open(self.get_ballot_store_path(state), self.get_state_signature(state))
+        if store is not None:
+            return store
+        return FormalPreferencesIndex(self.get_formal_preferences_file_path(state))
@@ -9,6 +9,9 @@ import os
 SIMULATION_MODE = 'simulation'
 QUICK_MODE = 'quick'
 REAL_MODE = 'real'
+CONVERT_MODE = 'convert'
+GENERATE_MODE = 'generate'
+EXPORT_MODE = 'export'
 
 # The Australian states with senate electiond data available to audit.
 STATES = [
@@ -36,20 +39,76 @@ DEFAULT_UNPOPULAR_FREQUENCY_THRESHOLD = 0.03
 # audit stage.
 DEFAULT_SAMPLE_INCREMENT_SIZE = 1500
 
+# The default number of groups (above the line boxes) in a synthetic senate election dataset.
+DEFAULT_SYNTHETIC_NUM_GROUPS = 40
+
+# The default number of vacancies in a synthetic senate election dataset.
+DEFAULT_SYNTHETIC_VACANCIES = 12
+
+# The default fraction of the ballots in a synthetic senate election dataset marked above the line.
+DEFAULT_SYNTHETIC_ATL_FRACTION = 0.95
+
+# The default number of tie events recorded in the configuration of a synthetic senate election dataset.
+DEFAULT_SYNTHETIC_NUM_TIE_EVENTS = 3
+
 #
 DEFAULT_SEED_VALUE = 1
 
+# The names of the substreams of an audit's random number generator used by the tie breaker and by a simulated
+# senate election.
+TIE_BREAKER_RNG_STREAM = 'tie_breaker'
+SIMULATION_RNG_STREAM = 'simulation'
+SYNTHETIC_DATASET_RNG_STREAM = 'synthetic_dataset'
+
+# The default number of worker processes the trials of an audit stage are spread across.
+DEFAULT_NUM_WORKERS = 1
+
+# The number of trials of an audit stage scored together (and handed to a worker process at a time).
+TRIAL_BLOCK_SIZE = 10
+
+# The number of trial blocks per worker process submitted to the pool ahead of the block being consumed.
+TRIAL_BLOCKS_IN_FLIGHT_PER_WORKER = 2
+
+# The default number of counting teams the paper ballots of each manual audit round are split between.
+DEFAULT_NUM_TEAMS = 1
+
+# The counters which may determine the outcome of each trial of a real senate election audit: the native counter,
+# dividebatur's counter, or both (checking that they elect the same candidates).
+NATIVE_COUNTER = 'native'
+DIVIDEBATUR_COUNTER = 'dividebatur'
+CROSSCHECK_COUNTER = 'crosscheck'
+COUNTERS = [NATIVE_COUNTER, DIVIDEBATUR_COUNTER, CROSSCHECK_COUNTER]
+
+# The default counter used to determine the outcome of each trial of a real senate election audit.
+DEFAULT_COUNTER = DIVIDEBATUR_COUNTER
+
 # 
 AUDIT_DIR_NAME = 'audit_{}'
 ROUND_DIR_NAME = 'rounds'
 AUDIT_INFO_FILE_NAME = 'info.json'
 AGGREGATE_BALLOTS_FILE_NAME = 'aggregate.csv'
+AGGREGATE_TALLY_FILE_NAME = 'aggregate_tally.json'
+AUDIT_STORE_FILE_NAME = 'audit.sqlite3'
+AUDIT_JOURNAL_FILE_NAME = 'journal.jsonl'
+AUDIT_LOCK_FILE_NAME = 'audit.lock'
 SELECTED_BALLOTS_FILE_NAME = 'selected_ballots.csv'
+SAMPLER_STATE_FILE_NAME = 'sampler_state.json'
+TIE_BREAKER_ORDER_FILE_NAME = 'tie_breaker_order.json'
+
+# The work packet of selected ballots of each counting team (numbered from 1), and the packets ingested thus far.
+SELECTED_BALLOTS_PACKET_FILE_NAME = 'selected_ballots_team_{}.csv'
+PACKET_DIR_NAME = 'packets'
+PACKET_FILE_NAME = '{}/round_{}_team_{}.json'
 
 #
 AUDIT_STAGE_KEY = 'audit_stage'
 SAMPLE_SIZE_KEY = 'sample_size'
 
+# The events of an audit stage recorded in the audit's journal, in the order they occur.
+SAMPLED_EVENT = 'sampled'
+VALIDATED_EVENT = 'validated'
+AUDITED_EVENT = 'audited'
+
 # 
 COLUMN_HEADERS = [
     'ElectorateNm',
@@ -60,6 +119,12 @@ COLUMN_HEADERS = [
     'Preferences',
 ]
 
+# The columns identifying the batch a ballot is in, and the paper it is printed on.
+BATCH_KEY_HEADERS = ['VoteCollectionPointId', 'BatchNo']
+PAPER_KEY_HEADERS = BATCH_KEY_HEADERS + ['PaperNo']
+
+# The index of the column holding a ballot's preferences.
+PREFERENCES_COLUMN_INDEX = COLUMN_HEADERS.index('Preferences')
 
 COLUMN_HEADER_DELIMS = [
     '------------',
@@ -78,8 +143,31 @@ MATCH_HEADERS = [
 
 CONFIG_FILE_PATH = 'aec_fed2016.json'
 
+# The file in the data directory caching metadata about each state's contest.
+DATASET_METADATA_CACHE_FILE_NAME = '.aus_senate_audit_metadata.json'
+
 FORMAL_PREFERENCES_CSV_NUM_HEADER_LINES = 2
 
+# The format of the AEC data which can be audited (the post-2015 senate format, as named by dividebatur).
+AEC_DATA_FORMAT = 'AusSenatePost2015'
+
+# The options of a contest in the configuration file which change how dividebatur counts it (a section 282 recount
+# restricted to the elected candidates, or the removal of candidates), and which cannot be audited.
+UNSUPPORTED_CONTEST_OPTIONS = ['s282', 'remove']
+
+# The title of a synthetic senate election, and the names of the data files of each of its states.
+SYNTHETIC_ELECTION_TITLE = 'Synthetic Federal Election'
+SYNTHETIC_ALL_CANDIDATES_FILE_NAME = 'synthetic-all-candidates-{}.csv'
+SYNTHETIC_SENATE_CANDIDATES_FILE_NAME = 'synthetic-senate-candidates-{}.csv'
+SYNTHETIC_FORMAL_PREFERENCES_FILE_NAME = 'aec-senate-formalpreferences-synthetic-{}.csv'
+
+# The directory in the data directory holding the binary ballot store of a state, and the info file within it.
+BALLOT_STORE_DIR_NAME = 'ballot_store_{}'
+BALLOT_STORE_INFO_FILE_NAME = 'info.json'
+
+# The sidecar file holding the byte offset of each ballot in a formal preferences file.
+FORMAL_PREFERENCES_INDEX_FILE_NAME = '{}.idx.npy'
+
 AUDIT_ROUND_FILE_NAME = '{}/round_{}.csv'
 
 DATA_DIR_NAME = 'data/{}'
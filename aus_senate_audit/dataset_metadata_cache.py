@@ -0,0 +1,186 @@
+# -*- coding: utf-8 -*-
+
+""" Implements a Cache of Metadata about the Australian Senate Election Data. """
+
+from json import dumps
+from json import load
+from os import replace
+from os import stat
+
+from dividebatur.aecdata import CandidateList
+
+from aus_senate_audit.constants import CONFIG_FILE_PATH
+from aus_senate_audit.constants import DATASET_METADATA_CACHE_FILE_NAME
+from aus_senate_audit.formal_preferences_index import FormalPreferencesIndex
+
+
+class DatasetMetadataCache(object):
+    """ Implements a cache of metadata about the Australian senate election data.
+
+    The parsed configuration file is kept in memory for the life of the process, so every :class:`ConfigReader` built
+    for the same data shares it. The metadata about each state's contest (the number of ballots cast, the candidates
+    and groups, and the tie events) is persisted to a cache file in the data directory, so later runs and audit stages
+    do not rescan the state's data files. Every entry is keyed by the size and modification time of the files it was
+    derived from, and is rebuilt whenever any of them change.
+
+    :ivar str _data_file_path: The path to all Australian senate election data.
+    :ivar dict _state_metadata: A mapping from the abbreviated name of a state to its cached metadata (loaded lazily).
+
+    NOTE: If the data directory is read only, state metadata is only cached in memory.
+    """
+    # A mapping from the path to a configuration file to its signature and parsed contents.
+    _configs = {}
+
+    def __init__(self, data_file_path):
+        """ Initializes a :class:`DatasetMetadataCache` object.
+
+        :param str data_file_path: The path to all Australian senate election data.
+        """
+        self._data_file_path = data_file_path
+        self._state_metadata = None
+
+    @staticmethod
+    def get_file_signature(path):
+        """ Returns a signature identifying the current version of the given file.
+
+        :param str path: The path to the file.
+
+        :returns: The size and modification time (in nanoseconds) of the file.
+        :rtype: list
+        """
+        file_stat = stat(path)
+        return [file_stat.st_size, file_stat.st_mtime_ns]
+
+    def _get_data_file_path(self, file_name):
+        """ Returns the path to the given file within the data directory.
+
+        :param str file_name: The name of the file.
+
+        :returns: The path to the given file within the data directory.
+        :rtype: str
+        """
+        return '{}/{}'.format(self._data_file_path, file_name)
+
+    def get_config(self):
+        """ Returns the parsed configuration file, parsing it only if it changed since it was last parsed.
+
+        :returns: The configuration for the senate election.
+        :rtype: dict
+        """
+        path = self._get_data_file_path(CONFIG_FILE_PATH)
+        signature = DatasetMetadataCache.get_file_signature(path)
+        if path not in DatasetMetadataCache._configs or DatasetMetadataCache._configs[path][0] != signature:
+            with open(path, 'r') as f:
+                DatasetMetadataCache._configs[path] = (signature, load(f))
+        return DatasetMetadataCache._configs[path][1]
+
+    def _load_state_metadata(self):
+        """ Returns the state metadata persisted in the cache file (empty if there is none).
+
+        :returns: A mapping from the abbreviated name of a state to its cached metadata.
+        :rtype: dict
+        """
+        try:
+            with open(self._get_data_file_path(DATASET_METADATA_CACHE_FILE_NAME), 'r') as f:
+                return load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _save_state_metadata(self):
+        """ Persists the state metadata to the cache file, replacing it atomically. """
+        path = self._get_data_file_path(DATASET_METADATA_CACHE_FILE_NAME)
+        try:
+            with open(path + '.tmp', 'w') as f:
+                f.write(dumps(self._state_metadata))
+            replace(path + '.tmp', path)
+        except OSError:
+            pass
+
+    def get_contest_config(self, state):
+        """ Returns the configuration of the given state's contest.
+
+        :param str state: The abbreviated name of the state.
+
+        :returns: The configuration of the given state's contest.
+        :rtype: dict
+        """
+        for contest_config in self.get_config()['count']:
+            if contest_config['name'] == state:
+                return contest_config
+
+    def get_state_signature(self, state):
+        """ Returns a signature identifying the current version of the configuration and the given state's data files.
+
+        :param str state: The abbreviated name of the state.
+
+        :returns: The signature of the configuration file followed by that of each of the state's data files.
+        :rtype: list
+        """
+        aec_data = self.get_contest_config(state)['aec-data']
+        return [DatasetMetadataCache.get_file_signature(self._get_data_file_path(CONFIG_FILE_PATH))] + [
+            DatasetMetadataCache.get_file_signature(self._get_data_file_path(aec_data[key]))
+            for key in ('formal-preferences', 'all-candidates', 'senate-candidates')
+        ]
+
+    def get_state_metadata(self, state):
+        """ Returns the metadata about the given state's contest, building it only if its data files changed.
+
+        Example of the metadata.
+
+        .. code-block:: python
+
+            {
+                'title': 'Federal Election 2016',
+                'vacancies': 12,
+                'num_ballots': 339159,
+                'candidates': [[28147, 'SURNAME', 'Given', 0, 'A', 1, 'Party', 'PTY'], ...],
+                'group_candidate_ids': [[28147, 28148], ...],
+                'election_order_ties': [],
+                'election_ties': [],
+                'exclusion_ties': [],
+            }
+
+        :param str state: The abbreviated name of the state.
+
+        :returns: The metadata about the given state's contest.
+        :rtype: dict
+        """
+        contest_config = self.get_contest_config(state)
+        signature = self.get_state_signature(state)
+        if self._state_metadata is None:
+            self._state_metadata = self._load_state_metadata()
+        entry = self._state_metadata.get(state)
+        if entry is None or entry['signature'] != signature:
+            entry = {'signature': signature, 'metadata': self._build_state_metadata(contest_config)}
+            self._state_metadata[state] = entry
+            self._save_state_metadata()
+        return entry['metadata']
+
+    def _build_state_metadata(self, contest_config):
+        """ Returns the metadata about the given contest, read from its data files.
+
+        :param dict contest_config: The configuration of the contest.
+
+        :returns: The metadata about the given contest.
+        :rtype: dict
+        """
+        aec_data = contest_config['aec-data']
+        with FormalPreferencesIndex(self._get_data_file_path(aec_data['formal-preferences'])) as index:
+            num_ballots = len(index)
+        candidate_list = CandidateList(
+            contest_config['state'],
+            self._get_data_file_path(aec_data['all-candidates']),
+            self._get_data_file_path(aec_data['senate-candidates']),
+        )
+        return {
+            'title': self.get_config()['title'],
+            'vacancies': contest_config['vacancies'],
+            'num_ballots': num_ballots,
+            'candidates': [list(candidate) for candidate in candidate_list.candidates],
+            'group_candidate_ids': [
+                [candidate.candidate_id for candidate in group.candidates] for group in candidate_list.groups
+            ],
+            'election_order_ties': contest_config['election_order_ties'],
+            'election_ties': contest_config['election_ties'],
+            'exclusion_ties': contest_config['exclusion_ties'],
+        }
@@ -0,0 +1,157 @@
+# -*- coding: utf-8 -*-
+
+""" Implements Random Access to the Ballots of a Formal Preferences File. """
+
+from mmap import ACCESS_READ
+from mmap import mmap
+from os import replace
+from os import stat
+
+import numpy
+
+from aus_senate_audit.constants import FORMAL_PREFERENCES_CSV_NUM_HEADER_LINES
+from aus_senate_audit.constants import FORMAL_PREFERENCES_INDEX_FILE_NAME
+
+
+class FormalPreferencesIndex(object):
+    """ Implements random access to the ballots of a formal preferences file.
+
+    The byte offset of every ballot in the file is stored in a sidecar index file next to it, so the index is only
+    built once per data file. The sidecar records the size and modification time of the file it was built from and is
+    rebuilt whenever either changes. Ballots are read by slicing a memory map of the file, so memory use does not grow
+    with the number of ballots cast.
+
+    The index behaves like the list of ballots (lines without trailing whitespace, excluding the header lines) it
+    replaces. It holds the memory map open until it is closed, so it is best used as a context manager.
+
+    :ivar str _path: The path to the formal preferences file.
+    :ivar :class:`numpy.ndarray` _offsets: The byte offset of the start of each ballot, followed by the byte offset of
+        the end of the last ballot.
+    :ivar _data: A read only memory map of the formal preferences file (or empty bytes if the file is empty, as an
+        empty file cannot be memory mapped).
+    """
+    # Identifies a sidecar index file (and the version of its layout).
+    MAGIC = 0x46504958_00000001
+
+    # The number of entries at the start of a sidecar index file which precede the offsets.
+    NUM_HEADER_ENTRIES = 3
+
+    # The number of bytes of the formal preferences file scanned for line breaks at a time.
+    CHUNK_SIZE = 1 << 26
+
+    def __init__(self, path):
+        """ Initializes a :class:`FormalPreferencesIndex` object.
+
+        :param str path: The path to the formal preferences file.
+        """
+        self._path = path
+        with open(path, 'rb') as f:
+            # An empty file holds no ballots, and cannot be memory mapped.
+            self._data = mmap(f.fileno(), 0, access=ACCESS_READ) if stat(path).st_size else b''
+        self._offsets = self._load_offsets()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        """ Closes the memory map of the formal preferences file. The ballots cannot be read once it is closed. """
+        if isinstance(self._data, mmap):
+            self._data.close()
+
+    def _get_signature(self):
+        """ Returns the header identifying the current version of the formal preferences file.
+
+        :returns: The header of a sidecar index file which is valid for the formal preferences file.
+        :rtype: list
+        """
+        file_stat = stat(self._path)
+        return [FormalPreferencesIndex.MAGIC, file_stat.st_size, file_stat.st_mtime_ns]
+
+    def _load_offsets(self):
+        """ Returns the byte offsets of the ballots, from the sidecar index file if it is up to date.
+
+        The sidecar index file is (re)built if it is missing or out of date. If it cannot be written (e.g. the data
+        directory is read only), the offsets are only kept in memory.
+
+        :returns: The byte offset of the start of each ballot, followed by the byte offset of the end of the last
+            ballot.
+        :rtype: :class:`numpy.ndarray`
+        """
+        index_path = FORMAL_PREFERENCES_INDEX_FILE_NAME.format(self._path)
+        signature = self._get_signature()
+        try:
+            index = numpy.load(index_path, mmap_mode='r')
+            if index[:FormalPreferencesIndex.NUM_HEADER_ENTRIES].tolist() == signature:
+                return index[FormalPreferencesIndex.NUM_HEADER_ENTRIES:]
+        except (OSError, ValueError):
+            pass
+        offsets = self._build_offsets()
+        try:
+            with open(index_path + '.tmp', 'wb') as f:
+                numpy.save(f, numpy.concatenate([numpy.array(signature, dtype=numpy.uint64), offsets]))
+            replace(index_path + '.tmp', index_path)
+        except OSError:
+            pass
+        return offsets
+
+    def _build_offsets(self):
+        """ Returns the byte offsets of the ballots, found by scanning the formal preferences file for line breaks.
+
+        :returns: The byte offset of the start of each ballot, followed by the byte offset of the end of the last
+            ballot.
+        :rtype: :class:`numpy.ndarray`
+        """
+        size = len(self._data)
+        line_ends = []
+        for start in range(0, size, FormalPreferencesIndex.CHUNK_SIZE):
+            chunk = numpy.frombuffer(self._data[start:start + FormalPreferencesIndex.CHUNK_SIZE], dtype=numpy.uint8)
+            line_ends.append(numpy.flatnonzero(chunk == ord('\n')).astype(numpy.uint64) + (start + 1))
+        line_starts = numpy.concatenate([numpy.zeros(1, dtype=numpy.uint64)] + line_ends)
+        if line_starts[-1] != size:
+            # The last line has no trailing line break.
+            line_starts = numpy.append(line_starts, numpy.uint64(size))
+        return line_starts[FORMAL_PREFERENCES_CSV_NUM_HEADER_LINES:]
+
+    def get_formal_ballots(self, indices, parser):
+        """ Returns the formal ballots at the given positions, parsed from their lines.
+
+        :param list indices: The positions of the ballots (0 based, excluding the header lines).
+        :param :class:`FormalPreferencesParser` parser: Parses the formal form of each ballot.
+
+        :returns: A mapping from a ballot type to the number of formal ballots of that type.
+        :rtype: :class:`Counter`
+        """
+        return parser.parse_ballots(self[i] for i in indices)
+
+    def __len__(self):
+        """ Returns the number of ballots in the formal preferences file.
+
+        :returns: The number of ballots in the formal preferences file.
+        :rtype: int
+        """
+        return max(len(self._offsets) - 1, 0)
+
+    def __getitem__(self, i):
+        """ Returns the ballot at the given position in the formal preferences file.
+
+        :param int i: The position of the ballot (0 based, excluding the header lines).
+
+        :returns: The ballot, without trailing whitespace.
+        :rtype: str
+        """
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError('ballot index out of range')
+        return self._data[int(self._offsets[i]):int(self._offsets[i + 1])].decode('utf-8').rstrip()
+
+    def __iter__(self):
+        """ Returns an iterator over the ballots in the formal preferences file.
+
+        :returns: An iterator over the ballots in the formal preferences file.
+        :rtype: iterator
+        """
+        return (self[i] for i in range(len(self)))
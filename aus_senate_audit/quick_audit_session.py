@@ -0,0 +1,128 @@
+# -*- coding: utf-8 -*-
+
+""" Implements a Long-Lived Session for Running a Quick Audit. """
+
+from os import unlink
+
+from aus_senate_audit.audit_validator import AuditValidator
+from aus_senate_audit.audits.bayesian_audit import audit
+from aus_senate_audit.config_reader import ConfigReader
+from aus_senate_audit.constants import DEFAULT_COUNTER
+from aus_senate_audit.constants import SELECTED_BALLOTS_FILE_NAME
+from aus_senate_audit.constants import VALIDATED_EVENT
+from aus_senate_audit.sampler.sampler_wrapper import SamplerWrapper
+from aus_senate_audit.senate_election.real_senate_election import RealSenateElection
+
+
+class QuickAuditSession(object):
+    """ Implements a long-lived session for running a quick audit.
+
+    The election configuration, the state's cast ballots and the :class:`RealSenateElection` (including its tie
+    breaker) are loaded once for the whole audit. Between stages, only the ballots of the new sample increment are
+    parsed and added to the election, so the cost of a stage scales with the increment size rather than with the total
+    sample. The session holds the state's cast ballots open until it is closed, so it is best used as a context
+    manager.
+
+    :ivar int _seed: The starting value for the random number generator.
+    :ivar str _state: The abbreviated name of the state whose senate election is being audited.
+    :ivar int _sample_increment_size: The number of ballots to add to the growing sample during each audit stage.
+    :ivar str _data_file_path: The path to all Australian senate election data.
+    :ivar :class:`AuditRecorder` _audit_recorder: An object for interfacing with information stored about the audit's
+        progress thus far.
+    :ivar int _workers: The number of worker processes used for sampling and for the trials of each stage.
+    :ivar _ballots: All cast ballots for the given state, as a :class:`BallotStore` or :class:`FormalPreferencesIndex`.
+    :ivar :class:`RealSenateElection` _election: The senate election being audited.
+    """
+    def __init__(self, seed, state, sample_increment_size, data_file_path, audit_recorder, max_ballots=None,
+                 workers=1, counter=DEFAULT_COUNTER):
+        """ Initializes a :class:`QuickAuditSession` object.
+
+        :param int seed: The starting value for the random number generator.
+        :param str state: The abbreviated name of the state whose senate election is being audited.
+        :param int sample_increment_size: The number of ballots to add to the growing sample during each audit stage.
+        :param str data_file_path: The path to all Australian senate election data.
+        :param :class:`AuditRecorder` audit_recorder: An object for interfacing with information stored about the
+            audit's progress thus far.
+        :param int max_ballots: The maximum number of ballots to check when performing the senate election audit
+            (default: None).
+        :param int workers: The number of worker processes used for sampling and for the trials of each stage
+            (default: 1).
+        :param str counter: The counter used to determine the outcome of each trial (default: dividebatur).
+        """
+        self._seed = seed
+        self._state = state
+        self._sample_increment_size = sample_increment_size
+        self._data_file_path = data_file_path
+        self._audit_recorder = audit_recorder
+        self._workers = workers
+        config_reader = ConfigReader(data_file_path)
+        self._ballots = config_reader.get_all_ballots_for_state(state)
+        self._election = RealSenateElection(
+            seed,
+            state,
+            data_file_path,
+            max_ballots=max_ballots,
+            config_reader=config_reader,
+            counter=counter,
+        )
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        """ Closes the state's cast ballots. No further stages can be run once the session is closed. """
+        self._ballots.close()
+
+    def get_election(self):
+        """ Returns the senate election being audited.
+
+        :returns: The senate election being audited.
+        :rtype: :class:`RealSenateElection`
+        """
+        return self._election
+
+    def draw_ballots(self):
+        """ Samples the next increment of ballots, validates it and adds it to the senate election being audited. """
+        if self._audit_recorder.get_current_stage_event() == VALIDATED_EVENT:
+            # The current stage was validated before the audit was interrupted, so its ballots were already added to
+            # the senate election from the aggregate ballots.
+            return
+        sampler = SamplerWrapper(
+            self._seed,
+            self._state,
+            self._sample_increment_size,
+            self._data_file_path,
+            self._audit_recorder,
+            quick=True,
+            ballots=self._ballots,
+            workers=self._workers,
+        )
+        AuditValidator(SELECTED_BALLOTS_FILE_NAME, self._audit_recorder).compare()
+        self._election.add_ballots_from_sample(self._ballots, sampler.get_sample_indices())
+
+    def run(self, unpopular_freq_threshold, sequential=False):
+        """ Runs audit stages until the audit terminates.
+
+        :param float unpopular_freq_threshold: The upper bound on the frequency of trials a candidate is elected in
+            order for the candidate to be deemed unpopular.
+        :param bool sequential: Whether to end each stage as soon as its stopping rule is decided (default: False).
+        """
+        if self._audit_recorder.is_audit_complete():
+            print('The audit terminated at audit stage {}.'.format(self._audit_recorder.get_current_audit_stage()))
+            return
+        done = False
+        while not done:
+            self.draw_ballots()
+            done = audit(
+                self._election,
+                self._seed,
+                unpopular_freq_threshold,
+                stage_counter=self._audit_recorder.get_current_audit_stage() - 1,
+                workers=self._workers,
+                sequential=sequential,
+            )
+            self._audit_recorder.record_stage_outcome(done)
+        unlink(SELECTED_BALLOTS_FILE_NAME)
@@ -0,0 +1,24 @@
+# -*- coding: utf-8 -*-
+
+""" Implements Named Substreams of the Random Number Generator of an Audit. """
+
+from zlib import crc32
+
+import numpy
+
+
+def get_rng(seed, stream):
+    """ Returns the random number generator of the given named substream of an audit's seed.
+
+    Every component of an audit which needs randomness draws from its own substream, rather than from the global
+    random number generator, so creating or using one component never changes the random numbers drawn by another,
+    whichever process or thread it runs in. (The trials of each audit stage draw from their own substreams, see
+    :func:`aus_senate_audit.audits.bayesian_audit.get_trial_rng`.)
+
+    :param int seed: The seed for the audit.
+    :param str stream: The name of the substream (see the ``*_RNG_STREAM`` constants).
+
+    :returns: The random number generator of the substream.
+    :rtype: :class:`numpy.random.Generator`
+    """
+    return numpy.random.default_rng(numpy.random.SeedSequence(seed, spawn_key=(crc32(stream.encode('utf-8')),)))
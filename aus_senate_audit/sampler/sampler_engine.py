@@ -0,0 +1,256 @@
+# -*- coding: utf-8 -*-
+
+""" Implements a Resumable Engine for Rivest's SHA-256 Counter-Mode Sampler. """
+
+from hashlib import sha256
+from json import dumps
+from json import load
+from math import log
+from multiprocessing import Pool
+from os import fsync
+from os import replace
+from os.path import exists
+
+import numpy
+
+
+# The number of 32-bit words in a SHA-256 digest.
+DIGEST_NUM_WORDS = 8
+
+# The Euler-Mascheroni constant, used to approximate harmonic numbers.
+EULER_MASCHERONI = 0.5772156649
+
+
+def get_picks(seed, a, b, start, stop):
+    """ Returns the picks for a range of counter values, before duplicate rejection.
+
+    The digests of the whole range are reduced modulo the size of the range
+    [:param:`a`, :param:`b`] in bulk, one 32-bit word at a time, rather than
+    converting each digest to a Python integer.
+
+    :param str seed: The seed of the sampler.
+    :param int a: The least integer which may be picked.
+    :param int b: The greatest integer which may be picked.
+    :param int start: The first counter value (inclusive).
+    :param int stop: The last counter value (exclusive).
+
+    :returns: The pick for each counter value in the range, in counter order.
+    :rtype: :class:`numpy.ndarray`
+    """
+    num_choices = b - a + 1
+    digests = b''.join(sha256('{},{}'.format(seed, count).encode('utf-8')).digest() for count in range(start, stop))
+    if num_choices >= 2 ** 32:
+        # The bulk reduction would overflow 64-bit arithmetic, so reduce each digest separately.
+        return numpy.array([
+            a + int.from_bytes(digests[i:i + 32], 'big') % num_choices for i in range(0, len(digests), 32)
+        ], dtype=object)
+    words = numpy.frombuffer(digests, dtype='>u4').reshape(-1, DIGEST_NUM_WORDS).astype(numpy.uint64)
+    remainders = numpy.zeros(len(words), dtype=numpy.uint64)
+    for i in range(DIGEST_NUM_WORDS):
+        remainders = ((remainders << numpy.uint64(32)) | words[:, i]) % numpy.uint64(num_choices)
+    return remainders.astype(numpy.int64) + a
+
+
+def _get_expected_num_counts(num_choices, num_picked, num_new_picks):
+    """ Returns the expected number of counter values needed to make the given number of new distinct picks.
+
+    :param int num_choices: The number of integers which may be picked.
+    :param int num_picked: The number of distinct picks made thus far.
+    :param int num_new_picks: The number of new distinct picks to make.
+
+    :returns: The expected number of counter values needed.
+    :rtype: int
+    """
+    def harmonic(m):
+        return log(m) + EULER_MASCHERONI + 1.0 / (2 * m) if m > 0 else 0.0
+    unpicked = num_choices - num_picked
+    return int(num_choices * (harmonic(unpicked) - harmonic(unpicked - num_new_picks))) + 1
+
+
+class SamplerEngine(object):
+    """ Implements a resumable engine for Rivest's SHA-256 counter-mode sampler.
+
+    The engine produces exactly the same sequence of picks as :func:`aus_senate_audit.sampler.sampler.generate_outputs`,
+    but keeps the picks made thus far in a set (so duplicate rejection is a constant time check), and can save its
+    counter and picks to a checkpoint file so a later audit stage extends the sample from where the previous stage
+    stopped, rather than regenerating it.
+
+    :ivar str _seed: The seed of the sampler.
+    :ivar int _a: The least integer which may be picked.
+    :ivar int _b: The greatest integer which may be picked.
+    :ivar bool _with_replacement: Whether duplicate picks are allowed.
+    :ivar int _count: The value of the counter used for the most recent pick.
+    :ivar list _outputs: The picks made thus far, in the order they were made.
+    :ivar set _picked: The picks made thus far.
+    """
+    def __init__(self, seed, a, b, with_replacement=False):
+        """ Initializes a :class:`SamplerEngine` object.
+
+        :param str seed: The seed of the sampler.
+        :param int a: The least integer which may be picked.
+        :param int b: The greatest integer which may be picked.
+        :param bool with_replacement: Whether duplicate picks are allowed (default: False).
+        """
+        assert a <= b
+        self._seed = seed
+        self._a = a
+        self._b = b
+        self._with_replacement = with_replacement
+        self._count = 0
+        self._outputs = []
+        self._picked = set()
+
+    def get_outputs(self):
+        """ Returns the picks made thus far.
+
+        :returns: The picks made thus far, in the order they were made.
+        :rtype: list
+        """
+        return self._outputs
+
+    def get_pick(self, count):
+        """ Returns the pick for the given counter value, before duplicate rejection.
+
+        :param int count: The value of the counter.
+
+        :returns: The pick for the given counter value.
+        :rtype: int
+        """
+        hash_output = int.from_bytes(sha256('{},{}'.format(self._seed, count).encode('utf-8')).digest(), 'big')
+        return self._a + hash_output % (self._b - self._a + 1)
+
+    def _add_pick(self, count, pick):
+        """ Records the pick for the given counter value, unless it is a rejected duplicate.
+
+        :param int count: The value of the counter.
+        :param int pick: The pick for the given counter value.
+        """
+        self._count = count
+        if self._with_replacement or pick not in self._picked:
+            self._outputs.append(pick)
+            self._picked.add(pick)
+
+    def extend(self, n, workers=1):
+        """ Extends the picks made thus far to a total of :param:`n` picks.
+
+        :param int n: The total number of picks.
+        :param int workers: The number of worker processes used to hash counter values (default: 1).
+
+        :returns: The new picks, in the order they were made.
+        :rtype: list
+        """
+        assert self._with_replacement or n <= self._b - self._a + 1
+        num_old_outputs = len(self._outputs)
+        if workers > 1:
+            self._extend_in_parallel(n, workers)
+        while len(self._outputs) < n:
+            self._add_pick(self._count + 1, self.get_pick(self._count + 1))
+        return self._outputs[num_old_outputs:]
+
+    def _extend_in_parallel(self, n, workers):
+        """ Extends the picks made thus far to a total of :param:`n` picks, hashing counter values in parallel.
+
+        Each round hashes enough consecutive counter values for the expected number of remaining picks, split into one
+        chunk per worker process. The chunks are then merged in counter order, applying duplicate rejection exactly as
+        the serial sampler does; counter values beyond the last pick needed are discarded.
+
+        :param int n: The total number of picks.
+        :param int workers: The number of worker processes used to hash counter values.
+        """
+        num_choices = self._b - self._a + 1
+        with Pool(workers) as pool:
+            while len(self._outputs) < n:
+                num_new_picks = n - len(self._outputs)
+                if self._with_replacement:
+                    num_counts = num_new_picks
+                else:
+                    num_counts = _get_expected_num_counts(num_choices, len(self._picked), num_new_picks)
+                chunk_size = -(-num_counts // workers)
+                starts = range(self._count + 1, self._count + 1 + chunk_size * workers, chunk_size)
+                chunks = pool.starmap(
+                    get_picks,
+                    [(self._seed, self._a, self._b, start, start + chunk_size) for start in starts],
+                )
+                for start, picks in zip(starts, chunks):
+                    for count, pick in enumerate(picks.tolist(), start):
+                        if len(self._outputs) >= n:
+                            return
+                        self._add_pick(count, pick)
+
+    def matches(self, seed, a, b, with_replacement):
+        """ Returns whether the engine was created with the given parameters.
+
+        :param str seed: The seed of the sampler.
+        :param int a: The least integer which may be picked.
+        :param int b: The greatest integer which may be picked.
+        :param bool with_replacement: Whether duplicate picks are allowed.
+
+        :returns: Whether the engine was created with the given parameters.
+        :rtype: bool
+        """
+        return (self._seed, self._a, self._b, self._with_replacement) == (seed, a, b, with_replacement)
+
+    def save(self, path):
+        """ Saves the state of the engine to the given checkpoint file.
+
+        :param str path: The path to the checkpoint file.
+        """
+        with open(path + '.tmp', 'w') as f:
+            f.write(dumps({
+                'seed': self._seed,
+                'a': self._a,
+                'b': self._b,
+                'with_replacement': self._with_replacement,
+                'count': self._count,
+                'outputs': self._outputs,
+            }))
+            f.flush()
+            fsync(f.fileno())
+        replace(path + '.tmp', path)
+
+    @classmethod
+    def load(cls, path, seed, a, b, with_replacement=False):
+        """ Returns an engine with the given parameters, resumed from the given checkpoint file if possible.
+
+        A fresh engine is returned if the checkpoint file does not exist or was saved with different parameters.
+
+        :param str path: The path to the checkpoint file.
+        :param str seed: The seed of the sampler.
+        :param int a: The least integer which may be picked.
+        :param int b: The greatest integer which may be picked.
+        :param bool with_replacement: Whether duplicate picks are allowed (default: False).
+
+        :returns: An engine with the given parameters.
+        :rtype: :class:`SamplerEngine`
+        """
+        engine = cls(seed, a, b, with_replacement)
+        if exists(path):
+            with open(path, 'r') as f:
+                state = load(f)
+            if engine.matches(state['seed'], state['a'], state['b'], state['with_replacement']):
+                engine._count = state['count']
+                engine._outputs = state['outputs']
+                engine._picked = set(state['outputs'])
+        return engine
+
+    def sample(self, n, skip, workers=1):
+        """ Returns the previous and new picks of a sample of size :param:`n`, as
+        :func:`aus_senate_audit.sampler.sampler.generate_outputs` does.
+
+        If the engine has already made exactly :param:`skip` picks, only the new picks are generated. Otherwise, the
+        sample is regenerated from the start of the sequence.
+
+        :param int n: The total size of the sample.
+        :param int skip: The size of the previous sample.
+        :param int workers: The number of worker processes used to hash counter values (default: 1).
+
+        :returns: The :param:`skip` previous picks and the :param:`n` - :param:`skip` new picks.
+        :rtype: tuple
+        """
+        if len(self._outputs) != skip:
+            self._count = 0
+            self._outputs = []
+            self._picked = set()
+            self.extend(skip, workers)
+        old_outputs = list(self._outputs)
+        return old_outputs, self.extend(n, workers)
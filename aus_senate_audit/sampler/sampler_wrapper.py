@@ -3,15 +3,22 @@
 """ Wraps the Sampling Algorithm Used for the Australian Senate Audit. """
 
 from aus_senate_audit.config_reader import ConfigReader
-from aus_senate_audit.sampler.sampler import generate_outputs
+from aus_senate_audit.constants import SAMPLED_EVENT
+from aus_senate_audit.constants import SAMPLER_STATE_FILE_NAME
+from aus_senate_audit.sampler.sampler_engine import SamplerEngine
 
 
 class SamplerWrapper(object):
-    """ Wraps the algorithm used for sampling from the cast ballots of the Australian senate election. """
+    """ Wraps the algorithm used for sampling from the cast ballots of the Australian senate election.
+
+    :ivar list _sample_indices: The positions of the ballots drawn for the new audit stage.
+    :ivar list _sample: The ballots drawn for the new audit stage.
+    """
 
     NUM_HEADER_LINES = 2
 
-    def __init__(self, seed, state, sample_increment_size, data_file_path, audit_recorder, quick=False):
+    def __init__(self, seed, state, sample_increment_size, data_file_path, audit_recorder, quick=False, ballots=None,
+                 workers=1, num_teams=1):
         """ Initializes a :class:`SamplerWrapper` object.
 
         :param int seed: The starting value for the random number generator.
@@ -22,15 +29,60 @@ class SamplerWrapper(object):
             audit's progress thus far.
         :param boolean quick: A flag indicating whether the audit is manual (`quick` is False) or not manual (default:
             False).
+        :param ballots: All cast ballots for the given state, as a :class:`BallotStore` or
+            :class:`FormalPreferencesIndex` (default: None, read from :param:`data_file_path`).
+        :param int workers: The number of worker processes used to generate the sample (default: 1).
+        :param int num_teams: The number of counting teams the sample is split between (default: 1).
         """
         audit_stage = audit_recorder.get_current_audit_stage()
         sample_size = audit_recorder.get_current_sample_size()
 
+        # Resume a stage whose sample was drawn but not validated before the audit was interrupted, rather than
+        # drawing a new sample.
+        if audit_recorder.get_current_stage_event() == SAMPLED_EVENT:
+            entry = audit_recorder.get_journal_entry()
+            self._sample_indices = entry['sample_indices']
+            self._sample = entry['sample']
+            if quick:
+                audit_recorder.record_selected_ballots(audit_stage, self._sample, quick)
+            return
+
         new_audit_stage = audit_stage + 1
         new_sample_size = sample_size + sample_increment_size
 
-        ballots = ConfigReader(data_file_path).get_all_ballots_for_state(state)
-        _, sample_indices = generate_outputs(new_sample_size, False, 0, len(ballots) - 1, str(seed), sample_size)
-        sample = [ballots[i] for i in sample_indices]
-        audit_recorder.record_audit_info(new_audit_stage, new_sample_size)
-        audit_recorder.record_selected_ballots(new_audit_stage, sample, quick)
+        # Ballots read here are closed once the sample has been read from them.
+        close_ballots = ballots is None
+        if close_ballots:
+            ballots = ConfigReader(data_file_path).get_all_ballots_for_state(state)
+        # Resume the sampler from the previous stage's checkpoint rather than regenerating the previous sample.
+        sampler_state_file_path = audit_recorder.get_file_path(SAMPLER_STATE_FILE_NAME)
+        engine = SamplerEngine.load(sampler_state_file_path, str(seed), 0, len(ballots) - 1)
+        _, self._sample_indices = engine.sample(new_sample_size, sample_size, workers)
+        self._sample = [ballots[i] for i in self._sample_indices]
+        if close_ballots:
+            ballots.close()
+        audit_recorder.record_sample(
+            new_audit_stage,
+            new_sample_size,
+            self._sample_indices,
+            self._sample,
+            quick,
+            num_teams=num_teams,
+        )
+        engine.save(sampler_state_file_path)
+
+    def get_sample_indices(self):
+        """ Returns the positions of the ballots drawn for the new audit stage among all cast ballots.
+
+        :returns: The positions of the ballots drawn for the new audit stage.
+        :rtype: list
+        """
+        return self._sample_indices
+
+    def get_sample(self):
+        """ Returns the ballots drawn for the new audit stage.
+
+        :returns: The ballots drawn for the new audit stage.
+        :rtype: list
+        """
+        return self._sample
@@ -0,0 +1,143 @@
+# -*- coding: utf-8 -*-
+
+""" Implements a Compact Matrix of the Ballot Types of a Senate Election. """
+
+import numpy
+
+
+class BallotMatrix(object):
+    """ Implements a compact matrix of the ballot types of a senate election.
+
+    Each ballot type is a row of a contiguous small-integer matrix, holding the IDs of the candidates in preference
+    order, padded with :attr:`PADDING` (so candidate IDs must be positive, and fit in the matrix's integer type). The
+    matrix is grown geometrically, so only the first :meth:`__len__` rows are in use.
+
+    The matrix behaves like the list of ballot types (tuples of candidate IDs) it replaces.
+
+    :ivar int _num_candidates: The number of candidates, i.e. the number of columns of the matrix.
+    :ivar :class:`numpy.ndarray` _rows: The ballot types, one row per ballot type ID.
+    :ivar int _num_rows: The number of ballot types in the matrix.
+    """
+    # The value filling the row of a ballot type after its last preference.
+    PADDING = 0
+
+    # The least number of rows allocated when the matrix grows.
+    MIN_GROWTH = 16
+
+    def __init__(self, num_candidates, max_candidate_id):
+        """ Initializes a :class:`BallotMatrix` object.
+
+        :param int num_candidates: The number of candidates, i.e. the most preferences of any ballot type.
+        :param int max_candidate_id: The greatest candidate ID, which determines the integer type of the matrix.
+        """
+        self._num_candidates = num_candidates
+        dtype = numpy.min_scalar_type(max_candidate_id)
+        self._rows = numpy.zeros((0, num_candidates), dtype=dtype)
+        self._num_rows = 0
+
+    def get_rows(self, start=0, stop=None):
+        """ Returns the rows of the given ballot types.
+
+        :param int start: The first ballot type ID (inclusive, default: 0).
+        :param int stop: The last ballot type ID (exclusive, default: None, the end of the matrix).
+
+        :returns: A view of the rows of the ballot types.
+        :rtype: :class:`numpy.ndarray`
+        """
+        return self._rows[start:self._num_rows if stop is None else min(stop, self._num_rows)]
+
+    def append(self, rows):
+        """ Appends the given rows to the matrix.
+
+        :param :class:`numpy.ndarray` rows: The ballot types to append, one (padded) row per ballot type.
+
+        :returns: The IDs of the appended ballot types.
+        :rtype: :class:`numpy.ndarray`
+        """
+        num_rows = self._num_rows + len(rows)
+        if num_rows > len(self._rows):
+            growth = max(num_rows - len(self._rows), len(self._rows), BallotMatrix.MIN_GROWTH)
+            self._rows = numpy.concatenate([
+                self._rows,
+                numpy.zeros((growth, self._num_candidates), dtype=self._rows.dtype),
+            ])
+        self._rows[self._num_rows:num_rows] = rows
+        ballot_ids = numpy.arange(self._num_rows, num_rows)
+        self._num_rows = num_rows
+        return ballot_ids
+
+    def _to_row(self, ballot):
+        """ Returns the padded row of the given ballot type.
+
+        :param tuple ballot: The type of ballot.
+
+        :returns: The padded row of the ballot type.
+        :rtype: :class:`numpy.ndarray`
+        """
+        row = numpy.full(self._num_candidates, BallotMatrix.PADDING, dtype=self._rows.dtype)
+        row[:len(ballot)] = ballot
+        return row
+
+    def append_ballot(self, ballot):
+        """ Appends the given ballot type to the matrix.
+
+        :param tuple ballot: The type of ballot.
+
+        :returns: The ID of the appended ballot type.
+        :rtype: int
+        """
+        return int(self.append(self._to_row(ballot)[numpy.newaxis])[0])
+
+    def find(self, ballot):
+        """ Returns the IDs of every occurrence of the given ballot type in the matrix.
+
+        The rows are searched in full, so this is only suitable for occasional lookups.
+
+        :param tuple ballot: The type of ballot.
+
+        :returns: The IDs of the rows holding the ballot type.
+        :rtype: :class:`numpy.ndarray`
+        """
+        return numpy.flatnonzero((self.get_rows() == self._to_row(ballot)).all(axis=1))
+
+    def index(self, ballot):
+        """ Returns the ID of the first occurrence of the given ballot type in the matrix.
+
+        :param tuple ballot: The type of ballot.
+
+        :returns: The ID of the ballot type (None if it is not in the matrix).
+        :rtype: int
+        """
+        matches = self.find(ballot)
+        return int(matches[0]) if len(matches) > 0 else None
+
+    def __len__(self):
+        """ Returns the number of ballot types in the matrix.
+
+        :returns: The number of ballot types in the matrix.
+        :rtype: int
+        """
+        return self._num_rows
+
+    def __getitem__(self, ballot_id):
+        """ Returns the ballot type with the given ID.
+
+        :param int ballot_id: The ID of the ballot type.
+
+        :returns: The IDs of the candidates in preference order.
+        :rtype: tuple
+        """
+        if ballot_id < 0:
+            ballot_id += self._num_rows
+        if not 0 <= ballot_id < self._num_rows:
+            raise IndexError('ballot type ID out of range')
+        row = self._rows[ballot_id]
+        return tuple(row[row != BallotMatrix.PADDING].tolist())
+
+    def __iter__(self):
+        """ Returns an iterator over the ballot types in the matrix.
+
+        :returns: An iterator over the ballot types in the matrix.
+        :rtype: iterator
+        """
+        return (self[i] for i in range(self._num_rows))
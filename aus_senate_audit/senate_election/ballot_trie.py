@@ -0,0 +1,135 @@
+# -*- coding: utf-8 -*-
+
+""" Implements a Prefix Trie of the Ballot Types of a Senate Election. """
+
+import numpy
+
+
+class BallotTrie(object):
+    """ Implements a prefix trie of the ballot types of a senate election.
+
+    Each node of the trie (other than the root) is a prefix of one or more ballot types, and holds the last candidate
+    of that prefix; each ballot type ends at the node of its full preferences. Ballot types which share a prefix (such
+    as those marked above the line for the same group) share the nodes of that prefix, so ballot papers which are held
+    at the same node move through a count together, and can be transferred as a single subtree.
+
+    Nodes are numbered in the order they are added, so every node is numbered after its parent.
+
+    :ivar dict _candidate_indices: A mapping from the ID of a candidate to the index stored in the trie's nodes.
+    :ivar dict _children: A mapping from a node and the index of a candidate to the child of the node for that
+        candidate.
+    :ivar list _parents: The parent of each node, indexed by node (-1 for the root).
+    :ivar list _candidates: The index of the last candidate of each node's prefix, indexed by node (-1 for the root).
+    :ivar list _depths: The length of each node's prefix, indexed by node.
+    :ivar list _ballot_type_nodes: The node at which each ballot type ends, indexed by ballot type ID.
+    :ivar dict _arrays: The arrays describing the trie, built from the lists above when first needed after the trie
+        changes (None if they are out of date).
+    """
+    # The node of the empty prefix.
+    ROOT = 0
+
+    def __init__(self, candidate_indices):
+        """ Initializes a :class:`BallotTrie` object.
+
+        :param dict candidate_indices: A mapping from the ID of a candidate to the index stored in the trie's nodes.
+        """
+        self._candidate_indices = candidate_indices
+        self._children = {}
+        self._parents = [-1]
+        self._candidates = [-1]
+        self._depths = [0]
+        self._ballot_type_nodes = []
+        self._arrays = None
+
+    def get_num_ballot_types(self):
+        """ Returns the number of ballot types in the trie.
+
+        :returns: The number of ballot types in the trie.
+        :rtype: int
+        """
+        return len(self._ballot_type_nodes)
+
+    def extend(self, ballot_types):
+        """ Adds the ballot types which are not in the trie yet.
+
+        Ballot types are only ever appended to the ballots of an election, so only the ballot types after the first
+        :meth:`get_num_ballot_types` are added.
+
+        :param list ballot_types: The ballot types, indexed by ID (each a tuple of candidate IDs in preference order).
+        """
+        for ballot in ballot_types[len(self._ballot_type_nodes):]:
+            node = BallotTrie.ROOT
+            for cid in ballot:
+                candidate = self._candidate_indices[cid]
+                child = self._children.get((node, candidate))
+                if child is None:
+                    child = self._children[(node, candidate)] = len(self._parents)
+                    self._parents.append(node)
+                    self._candidates.append(candidate)
+                    self._depths.append(self._depths[node] + 1)
+                node = child
+            self._ballot_type_nodes.append(node)
+            self._arrays = None
+
+    def _get_arrays(self):
+        """ Returns the arrays describing the trie, building them if the trie changed since they were last built.
+
+        :returns: A mapping from the name of an array to the array.
+        :rtype: dict
+        """
+        if self._arrays is None:
+            parents = numpy.array(self._parents, dtype=numpy.int64)
+            depths = numpy.array(self._depths, dtype=numpy.int64)
+            # The children of each node are stored contiguously, in a compressed sparse row layout.
+            children = numpy.argsort(parents[1:], kind='stable') + 1
+            child_offsets = numpy.concatenate([[0], numpy.cumsum(numpy.bincount(parents[1:], minlength=len(parents)))])
+            self._arrays = {
+                'parents': parents,
+                'candidates': numpy.array(self._candidates, dtype=numpy.int64),
+                'ballot_type_nodes': numpy.array(self._ballot_type_nodes, dtype=numpy.int64),
+                'children': children,
+                'child_offsets': child_offsets,
+                'levels': [numpy.flatnonzero(depths == depth) for depth in range(int(depths.max()), 0, -1)],
+            }
+        return self._arrays
+
+    def get_candidates(self, nodes):
+        """ Returns the index of the last candidate of the prefix of each of the given nodes.
+
+        :param :class:`numpy.ndarray` nodes: The nodes.
+
+        :returns: The index of the last candidate of each node's prefix.
+        :rtype: :class:`numpy.ndarray`
+        """
+        return self._get_arrays()['candidates'][nodes]
+
+    def get_children(self, nodes):
+        """ Returns the children of the given nodes.
+
+        :param :class:`numpy.ndarray` nodes: The nodes.
+
+        :returns: The children of all of the given nodes, grouped by node.
+        :rtype: :class:`numpy.ndarray`
+        """
+        arrays = self._get_arrays()
+        starts = arrays['child_offsets'][nodes]
+        counts = arrays['child_offsets'][nodes + 1] - starts
+        # Offset each position in the output by the start of its node's children.
+        positions = numpy.arange(counts.sum()) + numpy.repeat(starts - (numpy.cumsum(counts) - counts), counts)
+        return arrays['children'][positions]
+
+    def get_weights(self, ballot_weights):
+        """ Returns the summed weight of the ballot types under each node of the trie.
+
+        :param :class:`numpy.ndarray` ballot_weights: The (integer) weight of each ballot type, indexed by ID.
+
+        :returns: The total weight of the ballot types ending at each node or its descendants, indexed by node.
+        :rtype: :class:`numpy.ndarray`
+        """
+        arrays = self._get_arrays()
+        weights = numpy.zeros(len(arrays['parents']), dtype=numpy.int64)
+        numpy.add.at(weights, arrays['ballot_type_nodes'][:len(ballot_weights)], ballot_weights)
+        # Nodes are summed into their parents a level at a time, from the deepest level up.
+        for level in arrays['levels']:
+            numpy.add.at(weights, arrays['parents'][level], weights[level])
+        return weights
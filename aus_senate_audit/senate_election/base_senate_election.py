@@ -2,7 +2,7 @@
 
 """ Implements a Base Class for Representing a Senate Election. """
 
-from collections import Counter
+import numpy
 
 
 class BaseSenateElection(object):
@@ -12,7 +12,11 @@ class BaseSenateElection(object):
     :ivar int _m: The total number of candidates in the election.
     :ivar int _seats: The number of available seats in the election.
     :ivar int _num_ballots_drawn: The number of ballots drawn in the election thus far.
-    :ivar :class:`Counter` _ballot_weights: A mapping from a ballot type to the number of ballots drawn of that type.
+    :ivar dict _ballot_ids: A mapping from a ballot type to its ID (its position in :attr:`_ballot_types`).
+    :ivar list _ballot_types: The ballot types drawn thus far, indexed by ID.
+    :ivar :class:`numpy.ndarray` _ballot_weight_array: The number of ballots drawn of each ballot type, indexed by ID
+        (grown geometrically, so only the first ``len(_ballot_types)`` entries are in use).
+    :ivar bool _has_prior_ballots: Whether the prior ballots have been added to the ballots drawn thus far.
     :ivar list _candidates: The candidates participating in the election.
     :ivar list _candidate_ids: The IDs of the candidates participating in the election.
     :ivar str _election_id: The ID of the election.
@@ -25,7 +29,10 @@ class BaseSenateElection(object):
         self._m = 0
         self._seats = 0
         self._num_ballots_drawn = 0
-        self._ballot_weights = Counter()
+        self._ballot_ids = {}
+        self._ballot_types = []
+        self._ballot_weight_array = numpy.zeros(0, dtype=numpy.int64)
+        self._has_prior_ballots = False
         self._candidates = []
         self._candidate_ids = []
         self._election_id = None
@@ -57,10 +64,49 @@ class BaseSenateElection(object):
     def get_ballots(self):
         """ Returns the ballots drawn thus far.
 
-        :returns: The ballots drawn thus far.
-        :rtype: set
+        :returns: The ballot types drawn thus far, indexed by ID.
+        :rtype: list
+        """
+        return self._ballot_types
+
+    def get_ballot_id(self, ballot):
+        """ Returns the ID of the given ballot type, registering the ballot type if it has not been drawn before.
+
+        :param tuple ballot: The type of ballot.
+
+        :returns: The ID of the given ballot type.
+        :rtype: int
+        """
+        ballot_id = self._ballot_ids.get(ballot)
+        if ballot_id is None:
+            ballot_id = self._ballot_ids[ballot] = len(self._ballot_types)
+            self._ballot_types.append(ballot)
+            self._reserve_ballot_weights(ballot_id + 1)
+        return ballot_id
+
+    def _reserve_ballot_weights(self, num_ballot_types):
+        """ Grows the weight array (geometrically) so it holds at least the given number of ballot types.
+
+        :param int num_ballot_types: The number of ballot types the weight array must hold.
+        """
+        if num_ballot_types > len(self._ballot_weight_array):
+            self._ballot_weight_array = numpy.concatenate([
+                self._ballot_weight_array,
+                numpy.zeros(
+                    max(num_ballot_types - len(self._ballot_weight_array), len(self._ballot_weight_array), 16),
+                    dtype=numpy.int64,
+                ),
+            ])
+
+    def get_ballot_type(self, ballot_id):
+        """ Returns the ballot type with the given ID.
+
+        :param int ballot_id: The ID of the ballot type.
+
+        :returns: The type of ballot.
+        :rtype: tuple
         """
-        return self._ballot_weights.keys()
+        return self._ballot_types[ballot_id]
 
     def get_ballot_weight(self, ballot):
         """ Returns the weight of the given ballot type in the ballots drawn thus far.
@@ -70,7 +116,16 @@ class BaseSenateElection(object):
         :returns: The weight of the given ballot type in the ballots drawn thus far.
         :rtype: int
         """
-        return self._ballot_weights[ballot]
+        ballot_id = self._ballot_ids.get(ballot)
+        return 0 if ballot_id is None else int(self._ballot_weight_array[ballot_id])
+
+    def get_ballot_weight_array(self):
+        """ Returns the weights of the ballot types drawn thus far, indexed by ID.
+
+        :returns: The weights of the ballot types drawn thus far.
+        :rtype: :class:`numpy.ndarray`
+        """
+        return self._ballot_weight_array[:len(self._ballot_types)]
 
     def get_candidates(self):
         """ Returns the candidates participating in the election.
@@ -110,9 +165,30 @@ class BaseSenateElection(object):
         :param tuple ballot: The ballot type to add to the ballots drawn thus far.
         :param int weight: The weight of the ballot type being added.
         """
-        self._ballot_weights[ballot] += weight
+        ballot_id = self.get_ballot_id(ballot)  # Registering the ballot type may grow the weight array.
+        self._ballot_weight_array[ballot_id] += weight
         self._num_ballots_drawn += weight
 
+    def add_ballot_weights(self, ballot_ids, weights):
+        """ Adds the given weights to the ballot types with the given IDs in the ballots drawn thus far.
+
+        :param :class:`numpy.ndarray` ballot_ids: The IDs of the ballot types (repeated IDs are accumulated).
+        :param :class:`numpy.ndarray` weights: The weight to add to each ballot type.
+        """
+        numpy.add.at(self._ballot_weight_array, ballot_ids, weights)
+        self._num_ballots_drawn += int(numpy.sum(weights))
+
+    def add_prior_ballots(self):
+        """ Adds one "prior" ballot for each candidate to the ballots drawn thus far, to establish a Bayesian prior.
+
+        The prior ballot is a length-one partial ballot with just a first choice vote for that candidate. The prior
+        ballots are only added once, however many audit stages are run on the election.
+        """
+        if not self._has_prior_ballots:
+            for cid in self.get_candidate_ids():
+                self.add_ballot((cid,), 1)
+            self._has_prior_ballots = True
+
     def draw_ballots(self):
         """ Adds cast ballots to the growing sample for the audit. """
         raise NotImplementedError
@@ -120,10 +196,20 @@ class BaseSenateElection(object):
     def get_outcome(self, ballot_weights):
         """ Returns the outcome of a senate election with the given ballot weights.
 
-        :param :class:`Counter` ballot_weights: A mapping from a ballot type to the number of ballots drawn of that
-            type.
+        :param :class:`numpy.ndarray` ballot_weights: The weight of each ballot type, indexed by ID.
 
         :returns: The IDs of the candidates elected to the available seats, sorted in lexicographical order.
         :rtype: tuple
         """
         raise NotImplementedError
+
+    def get_outcomes(self, ballot_weights):
+        """ Returns the outcomes of senate elections with each of the given rows of ballot weights.
+
+        :param :class:`numpy.ndarray` ballot_weights: The weight of each ballot type, indexed by ID, with one row per
+            trial.
+
+        :returns: The outcome of each trial (see :meth:`get_outcome`).
+        :rtype: list
+        """
+        return [self.get_outcome(weights) for weights in ballot_weights]
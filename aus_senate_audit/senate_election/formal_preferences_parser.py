@@ -0,0 +1,107 @@
+# -*- coding: utf-8 -*-
+
+""" Implements a Class for Parsing Ballots from the AEC Formal Preferences Format. """
+
+from collections import Counter
+from csv import reader
+
+from aus_senate_audit.constants import PREFERENCES_COLUMN_INDEX
+
+
+class FormalPreferencesParser(object):
+    """ Implements a class for parsing ballots from the AEC formal preferences format.
+
+    The formal form of a ballot is resolved with the same rules :mod:`dividebatur` applies to post-2015 senate data:
+    the below the line preferences are used if they are formal (at least six unique, consecutive preferences), and the
+    above the line preferences (expanded to the candidates of each group) are used otherwise.
+
+    :ivar list _group_candidate_ids: The IDs of the candidates in each group, in the order the groups appear on the
+        ballot.
+    :ivar list _candidate_ids: The IDs of all candidates, in the order they appear on the ballot.
+    :ivar dict _forms: A mapping from a preferences string to its formal form (or None if the preferences are informal).
+    """
+    # The minimum number of below the line preferences for a formal below the line vote.
+    MIN_BTL_PREFERENCES = 6
+
+    # A mapping from the text of a single preference to the preference it represents.
+    PREFERENCE_VALUES = dict([(str(i), i) for i in range(1, 1024)] + [('*', 1), ('/', 1), ('', None)])
+
+    def __init__(self, group_candidate_ids, candidate_ids):
+        """ Initializes a :class:`FormalPreferencesParser` object.
+
+        :param list group_candidate_ids: The IDs of the candidates in each group, in the order the groups appear on
+            the ballot.
+        :param list candidate_ids: The IDs of all candidates, in the order they appear on the ballot.
+        """
+        self._group_candidate_ids = [tuple(cids) for cids in group_candidate_ids]
+        self._candidate_ids = list(candidate_ids)
+        self._forms = {}
+
+    @classmethod
+    def from_state_metadata(cls, metadata):
+        """ Returns a parser for the contest described by the given metadata.
+
+        :param dict metadata: The metadata about a state's contest (see :meth:`DatasetMetadataCache.get_state_metadata`).
+
+        :returns: A parser for the contest.
+        :rtype: :class:`FormalPreferencesParser`
+        """
+        return cls(metadata['group_candidate_ids'], [candidate[0] for candidate in metadata['candidates']])
+
+    @staticmethod
+    def _get_ordered_choices(form, choices):
+        """ Returns the choices marked with consecutive, unique preferences starting at one.
+
+        :param list form: The preference marked against each choice (None if no preference was marked).
+        :param list choices: The choices, in the order they appear on the ballot.
+
+        :returns: The choices marked with consecutive, unique preferences starting at one, in preference order.
+        :rtype: list
+        """
+        by_pref = {}
+        for pref, choice in zip(form, choices):
+            if pref is not None:
+                by_pref.setdefault(pref, []).append(choice)
+        ordered_choices = []
+        for i in range(1, len(form) + 1):
+            at_pref = by_pref.get(i)
+            if not at_pref or len(at_pref) != 1:
+                break
+            ordered_choices.append(at_pref[0])
+        return ordered_choices
+
+    def parse_preferences(self, preferences):
+        """ Returns the formal form of the ballot with the given preferences.
+
+        :param str preferences: The comma separated preferences of the ballot (above the line preferences followed by
+            below the line preferences).
+
+        :returns: The candidate IDs in preference order, or None if the ballot is informal.
+        :rtype: tuple
+        """
+        if preferences not in self._forms:
+            raw_form = [FormalPreferencesParser.PREFERENCE_VALUES[pref] for pref in preferences.split(',')]
+            num_groups = len(self._group_candidate_ids)
+            btl_prefs = self._get_ordered_choices(raw_form[num_groups:], self._candidate_ids)
+            if len(btl_prefs) >= FormalPreferencesParser.MIN_BTL_PREFERENCES:
+                form = tuple(btl_prefs)
+            else:
+                atl_prefs = self._get_ordered_choices(raw_form[:num_groups], self._group_candidate_ids)
+                form = tuple(cid for cids in atl_prefs for cid in cids) or None
+            self._forms[preferences] = form
+        return self._forms[preferences]
+
+    def parse_ballots(self, lines):
+        """ Returns the formal ballots recorded in the given lines of a formal preferences file.
+
+        :param iterable lines: Lines of a formal preferences file, excluding the header lines.
+
+        :returns: A mapping from a ballot type to the number of formal ballots of that type.
+        :rtype: :class:`Counter`
+        """
+        ballots = Counter()
+        for row in reader(lines):
+            form = self.parse_preferences(row[PREFERENCES_COLUMN_INDEX])
+            if form is not None:
+                ballots[form] += 1
+        return ballots
@@ -2,115 +2,238 @@
 
 """ Implements a Class for Representing a Real Senate Election. """
 
+from itertools import islice
+
 import dividebatur.counter as cnt
-import dividebatur.senatecount as sc
+from dividebatur.aecdata.candidatelist import Candidate
+import numpy
 
 from aus_senate_audit.audit_recorder import AuditRecorder
 from aus_senate_audit.audit_tie_breaker import AuditTieBreaker
 from aus_senate_audit.config_reader import ConfigReader
-from aus_senate_audit.constants import AGGREGATE_BALLOTS_FILE_NAME
-from aus_senate_audit.constants import DATA_DIR_NAME
+from aus_senate_audit.constants import CROSSCHECK_COUNTER
+from aus_senate_audit.constants import DEFAULT_COUNTER
+from aus_senate_audit.constants import DIVIDEBATUR_COUNTER
 from aus_senate_audit.constants import FORMAL_PREFERENCES_CSV_NUM_HEADER_LINES
+from aus_senate_audit.constants import TIE_BREAKER_ORDER_FILE_NAME
 from aus_senate_audit.senate_election.base_senate_election import BaseSenateElection
+from aus_senate_audit.senate_election.formal_preferences_parser import FormalPreferencesParser
 from aus_senate_audit.senate_election.real_senate_election_results import RealSenateElectionResults
+from aus_senate_audit.senate_election.stv_counter import StvCounter
 
 
 class RealSenateElection(BaseSenateElection):
-    """ Implements a class for representing a real senate election. """
+    """ Implements a class for representing a real senate election.
+
+    :ivar dict _candidate_orders: A mapping from the ID of a candidate to the position of the candidate on the ballot.
+    :ivar :class:`FormalPreferencesParser` _parser: Parses ballots from the AEC formal preferences format.
+    :ivar int _max_ballots: The maximum number of sampled ballots to add to the election (None or 0 if unlimited, as
+        for dividebatur). Unlike dividebatur, which adds whole groups of ballots with the same preferences until it
+        reaches the maximum, the cap is applied to individual ballots in the order they were sampled.
+    :ivar int _num_ballots_read: The number of sampled ballots read into the election thus far.
+    :ivar :class:`AuditTieBreaker` _tie_breaker: Breaks ties encountered while counting.
+    :ivar str _counter: The counter used to determine the outcome of each trial.
+    :ivar :class:`StvCounter` _stv_counter: The native counter (used unless :attr:`_counter` is dividebatur).
+    """
     TYPE = 'Real'
 
-    def __init__(self, seed, state, data_file_path, max_ballots=None):
+    def __init__(self, seed, state, data_file_path, max_ballots=None, config_reader=None, counter=DEFAULT_COUNTER):
         """ Initializes a :class:`RealSenateElection` object.
 
+        The ballots sampled thus far are read from the audit's aggregate ballots file.
+
         :param int seed: The starting value for the random number generator.
         :param str state: The abbreviated name of the state whose senate election is being audited.
         :param str data_file_path: The path to all Australian senate election data.
         :param int max_ballots: The maximum number of ballots to check when performing the senate election audit
-            (default: None).
+            (default: None, unlimited). Informal ballots count towards the maximum.
+        :param :class:`ConfigReader` config_reader: A reader for the configuration of the senate election data
+            (default: None, the configuration file is read from :param:`data_file_path`).
+        :param str counter: The counter used to determine the outcome of each trial: the native counter, dividebatur,
+            or both, checking that they agree (default: dividebatur).
+
+        :raises ValueError: If the state's AEC data is not in a format which can be audited.
         """
         super(RealSenateElection, self).__init__()
-        # Read the configuration file for the election data.
-        election_config = ConfigReader(data_file_path).get_config()
-        self._election_id = election_config['title']
-        for contest in election_config['count']:
-            if contest['name'] == state:
-                contest_config = contest
-        self._seats = contest_config['vacancies']
-
-        try:
-            # Remove this key to suppress verification checks which would
-            # not be valid for a subsample of the ballots from the contest.
-            del contest_config['verified']
-        except KeyError:
-            pass
-
-        # Get the social choice function.
-        input_cls = sc.get_input_method(contest_config['aec-data']['format'])
-
-        data_options = {}  # Passed when getting data from :mod:`dividebatur`.
-        if max_ballots is not None:
-            data_options['max_ballots'] = max_ballots
-
-        path_to_formal_preferences_file = '{}/{}'.format(data_file_path, contest_config['aec-data']['formal-preferences'])
-        total_num_lines = sum(1 for _ in open(path_to_formal_preferences_file, 'r'))
-        self._n = total_num_lines - FORMAL_PREFERENCES_CSV_NUM_HEADER_LINES
-        contest_config['aec-data']['senate-candidates'] \
-            = '{}/{}'.format(data_file_path, contest_config['aec-data']['senate-candidates'])
-        contest_config['aec-data']['all-candidates'] \
-            = '{}/{}'.format(data_file_path, contest_config['aec-data']['all-candidates'])
-        contest_config['aec-data']['formal-preferences'] = AuditRecorder(state).get_file_path(
-            AGGREGATE_BALLOTS_FILE_NAME,
-        )
-
-        # Get election data.
-        self._data = sc.get_data(input_cls, '', contest_config, **data_options)
-
-        # Build remaining ticket data structure from tickets and randomly shuffle for sampling.
-        for ticket, weight in self._data.tickets_for_count:
-            self.add_ballot(ticket, weight)
+        # Read the cached metadata about the contest.
+        if config_reader is None:
+            config_reader = ConfigReader(data_file_path)
+        metadata = config_reader.get_state_metadata(state)
+        self._election_id = metadata['title']
+        self._seats = metadata['vacancies']
+        self._n = metadata['num_ballots']
 
         # Get candidate data.
-        self._candidate_ids = self._data.get_candidate_ids()
-        self._candidates = self._data.candidates.candidates
-
-        # Initialize AuditTieBreaker with tie-breaking information from the contest.
+        self._candidates = [Candidate(*candidate) for candidate in metadata['candidates']]
+        self._candidate_ids = [candidate.candidate_id for candidate in self._candidates]
+        self._candidate_orders = {candidate.candidate_id: candidate.candidate_order for candidate in self._candidates}
+        self._parser = FormalPreferencesParser.from_state_metadata(metadata)
+
+        # Get the ballots sampled thus far, parsing only those added to the aggregate since the previous audit stage.
+        self._max_ballots = max_ballots
+        self._num_ballots_read = 0
+        audit_recorder = AuditRecorder(state)
+        self.add_ballots_from_aggregate(audit_recorder, config_reader.get_state_signature(state))
+
+        # Initialize AuditTieBreaker with tie-breaking information from the contest, reusing the linear order saved
+        # by a previous audit stage.
         self._tie_breaker = AuditTieBreaker(self._candidate_ids, seed=seed)
         self._tie_breaker.load_events(
-            contest_config['election_order_ties'],
-            contest_config['election_ties'],
-            contest_config['exclusion_ties'],
+            metadata['election_order_ties'],
+            metadata['election_ties'],
+            metadata['exclusion_ties'],
+            linear_order_path=audit_recorder.get_file_path(TIE_BREAKER_ORDER_FILE_NAME),
         )
+        self._counter = counter
+        self._stv_counter = StvCounter(self._seats, self._candidate_ids, self._candidate_orders, self._tie_breaker)
+
+    def add_ballots_from_lines(self, lines):
+        """ Adds the formal ballots recorded in the given lines of a formal preferences file to the ballots drawn thus
+        far.
+
+        Informal ballots are skipped. No more than :attr:`_max_ballots` sampled ballots are read in total: the lines
+        are cut off at the first line past the maximum (not after a whole group of identical preferences, as by
+        dividebatur).
+
+        :param iterable lines: Lines of a formal preferences file, excluding the header lines.
+        """
+        if self._max_ballots:
+            lines = list(islice(lines, max(self._max_ballots - self._num_ballots_read, 0)))
+        else:
+            lines = list(lines)
+        self._num_ballots_read += len(lines)
+        for ballot, weight in self._parser.parse_ballots(lines).items():
+            self.add_ballot(ballot, weight)
+
+    def add_ballots_from_sample(self, ballots, indices):
+        """ Adds the formal ballots at the given positions of the given cast ballots to the ballots drawn thus far.
+
+        Informal ballots are skipped. No more than :attr:`_max_ballots` sampled ballots are read in total: the
+        positions are cut off at the first position past the maximum (not after a whole group of identical
+        preferences, as by dividebatur).
+
+        :param ballots: All cast ballots for the state (a :class:`FormalPreferencesIndex` or :class:`BallotStore`).
+        :param list indices: The positions of the sampled ballots.
+        """
+        if self._max_ballots:
+            indices = indices[:max(self._max_ballots - self._num_ballots_read, 0)]
+        self._num_ballots_read += len(indices)
+        for ballot, weight in ballots.get_formal_ballots(indices, self._parser).items():
+            self.add_ballot(ballot, weight)
+
+    def add_ballots_from_file(self, path_to_formal_preferences_file):
+        """ Adds the formal ballots recorded in the given formal preferences file to the ballots drawn thus far.
+
+        :param str path_to_formal_preferences_file: The path to a file in the AEC formal preferences format.
+        """
+        with open(path_to_formal_preferences_file, 'r') as f:
+            self.add_ballots_from_lines(islice(f, FORMAL_PREFERENCES_CSV_NUM_HEADER_LINES, None))
+
+    def add_ballots_from_aggregate(self, audit_recorder, signature):
+        """ Adds the formal ballots recorded in the audit's aggregate ballots to the ballots drawn thus far.
+
+        The tally of the ballot types in the aggregate ballots is persisted alongside them, so only the ballots added
+        to the aggregate ballots since the tally was recorded (i.e. the newly validated audit round) are parsed, and
+        merged into the tally. The tally is rebuilt from all aggregate ballots if it was recorded for a different
+        version of the contest's data, a different maximum number of ballots or a different audit store, or if the
+        aggregate ballots have been truncated.
+
+        :param :class:`AuditRecorder` audit_recorder: The recorder of the audit's progress thus far.
+        :param list signature: The signature of the contest's data (see :meth:`ConfigReader.get_state_signature`).
+        """
+        tally = audit_recorder.get_aggregate_tally()
+        new_ballots = None
+        if (
+            tally is not None and
+            tally['signature'] == signature and
+            tally['max_ballots'] == self._max_ballots and
+            tally.get('store', False) == audit_recorder.uses_store()
+        ):
+            new_ballots = audit_recorder.read_aggregate_ballots(tally['offset'])
+        if new_ballots is None:
+            tally = {'offset': 0, 'num_ballots_read': 0, 'ballots': []}
+            new_ballots = audit_recorder.read_aggregate_ballots(0)
+        # Ballot types are added in the order they were first read, so they keep the IDs of a full parse.
+        for ballot, weight in tally['ballots']:
+            self.add_ballot(tuple(ballot), weight)
+        self._num_ballots_read = tally['num_ballots_read']
+
+        lines, offset = new_ballots
+        self.add_ballots_from_lines(lines)
+
+        audit_recorder.record_aggregate_tally({
+            'signature': signature,
+            'max_ballots': self._max_ballots,
+            'store': audit_recorder.uses_store(),
+            'offset': offset,
+            'num_ballots_read': self._num_ballots_read,
+            'ballots': [
+                [list(ballot), weight]
+                for ballot, weight in zip(self.get_ballots(), self.get_ballot_weight_array().tolist())
+            ],
+        })
+
+    def get_candidate_order(self, candidate_id):
+        """ Returns the position of the given candidate on the ballot.
+
+        :param int candidate_id: The ID of the candidate.
+
+        :returns: The position of the given candidate on the ballot (0 based).
+        :rtype: int
+        """
+        return self._candidate_orders[candidate_id]
 
     def draw_ballots(self):
         """ Real senate election audit does not draw ballots through this interface. """
         pass
 
-    def get_outcome(self, ballot_weights):
-        """ Returns the outcome of a senate election with the given ballot weights.
+    def _get_dividebatur_outcome(self, ballot_weights):
+        """ Returns the candidates elected by dividebatur's counter with the given ballot weights.
 
-        :param :class:`Counter` ballot_weights: A mapping from a ballot type to the number of ballots drawn of that
-            type.
+        :param :class:`numpy.ndarray` ballot_weights: The weight of each ballot type, indexed by ID.
 
-        :returns: The IDs of the candidates elected to the available seats, sorted in lexicographical order.
-        :rtype: tuple
+        :returns: The IDs of the candidates elected, in the order they were elected.
+        :rtype: list
         """
-        # Reset tickets for count.
-        self._data.tickets_for_count = sc.PapersForCount()
-        for ballot, weight in ballot_weights.items():
-            self._data.tickets_for_count.add_ticket(tuple(ballot), weight)
+        tickets_for_count = cnt.PapersForCount()
+        ballot_types = self.get_ballots()
+        weights = ballot_weights.tolist()
+        for ballot_id in numpy.flatnonzero(ballot_weights).tolist():
+            tickets_for_count.add_ticket(ballot_types[ballot_id], weights[ballot_id])
 
         # Set up and run counter.
         results = RealSenateElectionResults()
         _ = cnt.SenateCounter(
             results,
             self._seats,
-            self._data.tickets_for_count,
+            tickets_for_count,
             self._tie_breaker.break_election_order_tie,
             self._tie_breaker.break_exclusion_tie,
             self._tie_breaker.break_election_tie,
-            self._data.get_candidate_ids(),
-            self._data.get_candidate_order,
+            self._candidate_ids,
+            self.get_candidate_order,
             disable_bulk_exclusions=True,
         ).run()
+        return results.get_elected_candidates()
 
-        return tuple(sorted(results.get_elected_candidates()))
+    def get_outcome(self, ballot_weights):
+        """ Returns the outcome of a senate election with the given ballot weights.
+
+        :param :class:`numpy.ndarray` ballot_weights: The weight of each ballot type, indexed by ID.
+
+        :returns: The IDs of the candidates elected to the available seats, sorted in lexicographical order.
+        :rtype: tuple
+
+        :raises RuntimeError: If cross-checking, and the native counter and dividebatur elect different candidates.
+        """
+        if self._counter == DIVIDEBATUR_COUNTER:
+            return tuple(sorted(self._get_dividebatur_outcome(ballot_weights)))
+        outcome = tuple(sorted(self._stv_counter.count(self.get_ballots(), ballot_weights)))
+        if self._counter == CROSSCHECK_COUNTER:
+            expected_outcome = tuple(sorted(self._get_dividebatur_outcome(ballot_weights)))
+            if outcome != expected_outcome:
+                raise RuntimeError('The native counter elected {} but dividebatur elected {}.'.format(
+                    outcome,
+                    expected_outcome,
+                ))
+        return outcome
@@ -2,12 +2,14 @@
 
 """ Implements a Class for Representing a Simulated Senate Election. """
 
-from collections import Counter
-from random import random
-from random import seed as set_seed
 from time import asctime
 from time import localtime
 
+import numpy
+
+from aus_senate_audit.constants import SIMULATION_RNG_STREAM
+from aus_senate_audit.random_streams import get_rng
+from aus_senate_audit.senate_election.ballot_matrix import BallotMatrix
 from aus_senate_audit.senate_election.base_senate_election import BaseSenateElection
 
 
@@ -15,13 +17,26 @@ class SimulatedSenateElection(BaseSenateElection):
     """ Implements a class for representing a simulated senate election.
 
     :ivar int _sample_increment_size: The number of ballots to add to the growing sample during each audit stage.
+    :ivar :class:`numpy.random.Generator` _rng: The random number generator used to simulate ballots.
+    :ivar bool _compact: Whether every simulated ballot is stored as its own row of :attr:`_ballot_matrix` (which
+        then stands in for the list of ballot types), rather than being merged with earlier ballots of the same type.
+    :ivar :class:`BallotMatrix` _ballot_matrix: The ballot types, one small-integer row per ballot type ID.
+    :ivar :class:`numpy.ndarray` _first_seen: The order in which the candidates first appear in the ballot types,
+        indexed by candidate index (:attr:`_m` for candidates which do not appear in any ballot type).
+    :ivar int _num_candidates_seen: The number of candidates which appear in the ballot types.
 
     NOTE: The :attr:`_candidates` and :attr:`_candidate_ids` instance attributes are set as a [1, ..., :attr:`_m`].
     """
     TYPE = 'Simulated'
     DEFAULT_ID = 'SimulatedElection{}'
 
-    def __init__(self, seed, n, m, sample_increment_size):
+    # The maximum number of ballots simulated with a single noise matrix, bounding the memory used by each batch.
+    DRAW_CHUNK_SIZE = 1 << 16
+
+    # The maximum number of ballot types whose positions are converted for a single matrix product when scoring.
+    SCORE_CHUNK_SIZE = 1 << 14
+
+    def __init__(self, seed, n, m, sample_increment_size, rng=None, compact=False):
         """ Initializes a :class:`SimulatedSenateElection` object.
 
         The number of seats in a simulated senate election is equal to the floor of the number of candidates in the
@@ -31,6 +46,10 @@ class SimulatedSenateElection(BaseSenateElection):
         :param int n: The total number of ballots cast in the election.
         :param int m: The total number of candidates in the election.
         :param int sample_increment_size: The number of ballots to add to the growing sample during each audit stage.
+        :param :class:`numpy.random.Generator` rng: The random number generator used to simulate ballots (default:
+            None, the simulation's substream of :param:`seed` is used).
+        :param bool compact: Whether to store each simulated ballot as its own row of a compact ballot matrix, without
+            looking up its ballot type (default: False).
         """
         super(SimulatedSenateElection, self).__init__()
         self._n = n
@@ -40,7 +59,122 @@ class SimulatedSenateElection(BaseSenateElection):
         self._candidate_ids = list(range(1, self._m + 1))
         self._election_id = SimulatedSenateElection.DEFAULT_ID.format(asctime(localtime()))
         self._sample_increment_size = sample_increment_size
-        set_seed(seed)  # Set the initial value of the RNG.
+        self._rng = get_rng(seed, SIMULATION_RNG_STREAM) if rng is None else rng
+        self._compact = compact
+        self._ballot_matrix = BallotMatrix(self._m, self._m)
+        if self._compact:
+            self._ballot_types = self._ballot_matrix
+            self._ballot_ids = None
+        self._first_seen = numpy.full(self._m, self._m, dtype=numpy.int64)
+        self._num_candidates_seen = 0
+
+    def get_ballot_id(self, ballot):
+        """ Returns the ID of the given ballot type, registering the ballot type if it has not been seen before.
+
+        In compact mode the ballot matrix is searched in full, so this is only suitable for the occasional ballot type
+        (such as prior ballots); simulated ballots are appended to the matrix directly.
+
+        :param tuple ballot: The type of ballot.
+
+        :returns: The ID of the given ballot type.
+        :rtype: int
+        """
+        if self._compact:
+            ballot_id = self._ballot_matrix.index(ballot)
+            if ballot_id is None:
+                ballot_id = self._ballot_matrix.append_ballot(ballot)
+                self._reserve_ballot_weights(ballot_id + 1)
+                self._record_candidates_seen(ballot_id)
+            return ballot_id
+        num_ballot_types = len(self._ballot_types)
+        ballot_id = super(SimulatedSenateElection, self).get_ballot_id(ballot)
+        if ballot_id == num_ballot_types:
+            self._ballot_matrix.append_ballot(ballot)
+            self._record_candidates_seen(ballot_id)
+        return ballot_id
+
+    def get_ballot_weight(self, ballot):
+        """ Returns the weight of the given ballot type.
+
+        :param tuple ballot: The type of ballot.
+
+        :returns: The weight of the given ballot type.
+        :rtype: int
+        """
+        if self._compact:
+            ballot_ids = self._ballot_matrix.find(ballot)
+            return int(self._ballot_weight_array[ballot_ids].sum())
+        return super(SimulatedSenateElection, self).get_ballot_weight(ballot)
+
+    def _record_candidates_seen(self, start):
+        """ Records the order in which the candidates first appear in the ballot types from the given ID onwards.
+
+        :param int start: The ID of the first newly registered ballot type.
+        """
+        preferences = self._ballot_matrix.get_rows(start).ravel()
+        preferences = preferences[preferences != BallotMatrix.PADDING]
+        cids, first_indices = numpy.unique(preferences, return_index=True)
+        candidates = cids[numpy.argsort(first_indices)].astype(numpy.int64) - 1  # Candidate IDs are 1, ..., m.
+        candidates = candidates[self._first_seen[candidates] == self._m]
+        num_candidates_seen = self._num_candidates_seen + len(candidates)
+        self._first_seen[candidates] = numpy.arange(self._num_candidates_seen, num_candidates_seen)
+        self._num_candidates_seen = num_candidates_seen
+
+    def _get_positions(self, start, stop):
+        """ Returns the position (0 based) of each candidate on the given ballot types.
+
+        :param int start: The first ballot type ID (inclusive).
+        :param int stop: The last ballot type ID (exclusive).
+
+        :returns: The position of each candidate on each ballot type, indexed by ballot type ID (less :param:`start`)
+            and candidate index (0 if the candidate is not on the ballot).
+        :rtype: :class:`numpy.ndarray`
+        """
+        rows = self._ballot_matrix.get_rows(start, stop).astype(numpy.intp)
+        # Column 0 collects the padding of each row, and column `cid` the position of candidate `cid`.
+        positions = numpy.zeros((len(rows), self._m + 1))
+        numpy.put_along_axis(positions, rows, numpy.arange(self._m, dtype=numpy.float64)[numpy.newaxis], axis=1)
+        return positions[:, 1:]
+
+    def get_borda_counts(self, ballot_weights):
+        """ Returns the Borda count of each candidate with the given ballot weights.
+
+        The Borda counts are the product of the ballot weights and the ballot position matrix (built a chunk of ballot
+        types at a time from the ballot matrix), so the counts for a whole batch of trials are a single matrix product.
+
+        :param :class:`numpy.ndarray` ballot_weights: The weight of each ballot type, indexed by ID (optionally with one
+            row per trial).
+
+        :returns: The Borda count of each candidate, indexed by candidate index (with one row per trial if the ballot
+            weights have one).
+        :rtype: :class:`numpy.ndarray`
+        """
+        ballot_weights = numpy.asarray(ballot_weights, dtype=numpy.float64)
+        counts = numpy.zeros(ballot_weights.shape[:-1] + (self._m,))
+        # The counts are sums of integers well below 2 ** 53, so the floating point products are exact.
+        for start in range(0, ballot_weights.shape[-1], SimulatedSenateElection.SCORE_CHUNK_SIZE):
+            stop = min(start + SimulatedSenateElection.SCORE_CHUNK_SIZE, ballot_weights.shape[-1])
+            counts += ballot_weights[..., start:stop] @ self._get_positions(start, stop)
+        return numpy.rint(counts).astype(numpy.int64)
+
+    def _get_winners(self, borda_counts):
+        """ Returns the candidates elected with the given Borda counts.
+
+        The :attr:`_seats` candidates with the lowest Borda counts are elected. Ties are broken in favour of the
+        candidate which first appears later in the ballot types.
+
+        :param :class:`numpy.ndarray` borda_counts: The Borda count of each candidate, indexed by candidate index.
+
+        :returns: The IDs of the candidates elected to the available seats, sorted in lexicographical order.
+        :rtype: tuple
+        """
+        seen = numpy.flatnonzero(self._first_seen < self._m)
+        if self._seats >= len(seen):
+            return tuple(sorted(seen + 1))
+        # A single key orders the candidates by increasing Borda count, and then by decreasing order of appearance.
+        keys = borda_counts[seen] * self._m + (self._m - 1 - self._first_seen[seen])
+        winners = seen[numpy.argpartition(keys, self._seats - 1)[:self._seats]]
+        return tuple(sorted((winners + 1).tolist()))
 
     def draw_ballots(self):
         """ Adds simulated ballots to the sample of ballots drawn thus far.
@@ -49,29 +183,54 @@ class SimulatedSenateElection(BaseSenateElection):
         is given a value `i + v * U` where `U = uniform(0, 1)` and `v` is the level of noise. Then the candidates are
         sorted into increasing order by these values. Note that the total number of ballots drawn may not exceed the
         total number of cast votes, :attr:`_n`.
+
+        The ballots are simulated a batch at a time: the noise for the whole batch is drawn as one matrix (one row per
+        ballot, in the same order as drawing each ballot's noise in turn), and each row is argsorted in one operation.
+        The ballot types of the batch are then registered in the order they first occur, so a given seed always
+        produces the same ballots, with the same ballot type IDs, whatever the sample increment size.
+
+        In compact mode each ballot of the batch is appended to the ballot matrix as its own ballot type with weight 1,
+        so no ballot type is ever looked up (with many candidates nearly every simulated ballot is unique anyway).
         """
         v = self._m / 2.0  # Noise level to control position variance.
         batch_size = min(self._sample_increment_size, self._n - self._num_ballots_drawn)
-        for _ in range(batch_size):
-            candidate_values = [(i + v * random(), cid) for i, cid in enumerate(self._candidate_ids)]
-            ballot = tuple(cid for val, cid in sorted(candidate_values))
-            self.add_ballot(ballot, 1)
+        candidate_ids = numpy.array(self._candidate_ids)
+        for start in range(0, batch_size, SimulatedSenateElection.DRAW_CHUNK_SIZE):
+            num_ballots = min(SimulatedSenateElection.DRAW_CHUNK_SIZE, batch_size - start)
+            candidate_values = numpy.arange(self._m) + v * self._rng.random((num_ballots, self._m))
+            ballots = candidate_ids[numpy.argsort(candidate_values, axis=1)]
+            if self._compact:
+                ballot_ids = self._ballot_matrix.append(ballots)
+                self._reserve_ballot_weights(len(self._ballot_matrix))
+                self._record_candidates_seen(int(ballot_ids[0]))
+                self.add_ballot_weights(ballot_ids, numpy.ones(num_ballots, dtype=numpy.int64))
+                continue
+            ballot_types, first_indices, counts = numpy.unique(ballots, axis=0, return_index=True, return_counts=True)
+            order = numpy.argsort(first_indices)
+            ballot_ids = numpy.array([self.get_ballot_id(tuple(ballot)) for ballot in ballot_types[order].tolist()])
+            self.add_ballot_weights(ballot_ids, counts[order])
 
     def get_outcome(self, ballot_weights):
         """ Returns the outcome of a senate election with the given ballot weights.
 
         The social choice function used in the simulated senate election is Borda count.
 
-        :param :class:`Counter` ballot_weights: A mapping from a ballot type to the number of ballots drawn of that
-            type.
+        :param :class:`numpy.ndarray` ballot_weights: The weight of each ballot type, indexed by ID.
 
         :returns: The IDs of the candidates elected to the available seats, sorted in lexicographical order.
         :rtype: tuple
         """
-        counter = Counter()
-        for ballot, weight in ballot_weights.items():
-            for i, cid in enumerate(ballot):
-                counter[cid] += weight * i
-        # Get the :attr:`_seat` candidates with the lowest Borda counts in increasing order.
-        winners = counter.most_common()[-self._seats:][::-1]
-        return tuple(sorted([cid for cid, count in winners]))
+        return self._get_winners(self.get_borda_counts(ballot_weights))
+
+    def get_outcomes(self, ballot_weights):
+        """ Returns the outcomes of senate elections with each of the given rows of ballot weights.
+
+        The Borda counts of all trials are computed with a single matrix product.
+
+        :param :class:`numpy.ndarray` ballot_weights: The weight of each ballot type, indexed by ID, with one row per
+            trial.
+
+        :returns: The outcome of each trial (see :meth:`get_outcome`).
+        :rtype: list
+        """
+        return [self._get_winners(borda_counts) for borda_counts in self.get_borda_counts(ballot_weights)]
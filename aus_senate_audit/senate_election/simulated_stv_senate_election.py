@@ -0,0 +1,147 @@
+# -*- coding: utf-8 -*-
+
+""" Implements a Class for Representing a Simulated Senate Election Counted with STV. """
+
+from time import asctime
+from time import localtime
+
+import numpy
+
+from aus_senate_audit.audit_tie_breaker import AuditTieBreaker
+from aus_senate_audit.constants import DEFAULT_SYNTHETIC_ATL_FRACTION
+from aus_senate_audit.constants import DEFAULT_SYNTHETIC_NUM_GROUPS
+from aus_senate_audit.constants import DEFAULT_SYNTHETIC_VACANCIES
+from aus_senate_audit.constants import SIMULATION_RNG_STREAM
+from aus_senate_audit.random_streams import get_rng
+from aus_senate_audit.senate_election.base_senate_election import BaseSenateElection
+from aus_senate_audit.senate_election.stv_counter import StvCounter
+from aus_senate_audit.synthetic_dataset import SyntheticBallotModel
+
+
+class SimulatedStvSenateElection(BaseSenateElection):
+    """ Implements a class for representing a simulated senate election counted with STV.
+
+    Unlike :class:`SimulatedSenateElection`, whose ballots are random permutations of all candidates, the ballots are
+    drawn from a :class:`SyntheticBallotModel` with group tickets: most are marked above the line (and expanded to the
+    candidates of each group, in order, as the AEC does), with a long tail marked below the line. The outcome of each
+    trial is determined by the same native STV counter as a real senate election, so trial throughput, the number of
+    ballot types and stopping sample sizes resemble those of a real senate election audit.
+
+    :ivar int _sample_increment_size: The number of ballots to add to the growing sample during each audit stage.
+    :ivar :class:`SyntheticBallotModel` _model: The model the ballots are drawn from.
+    :ivar :class:`AuditTieBreaker` _tie_breaker: Breaks ties encountered while counting (there are no tie events).
+    :ivar :class:`StvCounter` _stv_counter: The counter used to determine the outcome of each trial.
+
+    NOTE: The :attr:`_candidates` and :attr:`_candidate_ids` instance attributes are set as a [1, ..., :attr:`_m`], in
+    the order the candidates appear on the ballot.
+    """
+    TYPE = 'Simulated STV'
+    DEFAULT_ID = 'SimulatedStvElection{}'
+
+    # The maximum number of ballots drawn from the model at once, bounding the memory used by each batch.
+    DRAW_CHUNK_SIZE = 1 << 16
+
+    def __init__(
+        self,
+        seed,
+        n,
+        m,
+        sample_increment_size,
+        num_groups=DEFAULT_SYNTHETIC_NUM_GROUPS,
+        vacancies=DEFAULT_SYNTHETIC_VACANCIES,
+        atl_fraction=DEFAULT_SYNTHETIC_ATL_FRACTION,
+        rng=None,
+    ):
+        """ Initializes a :class:`SimulatedStvSenateElection` object.
+
+        :param int seed: The starting value for the random number generator.
+        :param int n: The total number of ballots cast in the election.
+        :param int m: The total number of candidates in the election.
+        :param int sample_increment_size: The number of ballots to add to the growing sample during each audit stage.
+        :param int num_groups: The number of groups (above the line boxes) in the election (default: 40).
+        :param int vacancies: The number of vacancies in the election (default: 12).
+        :param float atl_fraction: The fraction of the ballots marked above the line (default: 0.95).
+        :param :class:`numpy.random.Generator` rng: The random number generator used to simulate ballots (default:
+            None, the simulation's substream of :param:`seed` is used).
+        """
+        super(SimulatedStvSenateElection, self).__init__()
+        if m <= vacancies:
+            raise ValueError('There must be more candidates than vacancies.')
+        self._n = n
+        self._m = m
+        self._seats = vacancies
+        self._candidates = list(range(1, self._m + 1))
+        self._candidate_ids = list(range(1, self._m + 1))
+        self._election_id = SimulatedStvSenateElection.DEFAULT_ID.format(asctime(localtime()))
+        self._sample_increment_size = sample_increment_size
+        self._model = SyntheticBallotModel(
+            m,
+            num_groups,
+            atl_fraction,
+            get_rng(seed, SIMULATION_RNG_STREAM) if rng is None else rng,
+        )
+        self._tie_breaker = AuditTieBreaker(self._candidate_ids, seed=seed)
+        self._tie_breaker.load_events([], [], [])
+        self._stv_counter = StvCounter(
+            self._seats,
+            self._candidate_ids,
+            {cid: cid - 1 for cid in self._candidate_ids},
+            self._tie_breaker,
+        )
+
+    def _get_ballots(self, choices, num_preferences):
+        """ Returns the candidates, in preference order, of the ballots with the given choices.
+
+        :param :class:`numpy.ndarray` choices: The choices marked on each ballot, in preference order (see
+            :meth:`SyntheticBallotModel.draw`).
+        :param :class:`numpy.ndarray` num_preferences: The number of choices marked on each ballot.
+
+        :returns: The IDs of the candidates on each ballot in preference order, padded with zeros, one row per ballot.
+        :rtype: :class:`numpy.ndarray`
+        """
+        num_groups = self._model.get_num_groups()
+        group_size = self._model.get_group_size()
+        ballots = numpy.zeros((len(choices), self._m), dtype=numpy.int64)
+
+        # Above the line choices are expanded to the candidates of each group, in the order they appear on the ballot.
+        atl = numpy.flatnonzero(choices[:, 0] < num_groups)
+        max_atl = min(choices.shape[1], num_groups)
+        groups = numpy.minimum(choices[atl, :max_atl], num_groups - 1)
+        candidates = (groups[:, :, numpy.newaxis] * group_size + numpy.arange(1, group_size + 1)).reshape(len(atl), -1)
+        marked = numpy.arange(candidates.shape[1]) // group_size < num_preferences[atl, numpy.newaxis]
+        ballots[atl, :candidates.shape[1]] = numpy.where(marked, candidates, 0)
+
+        btl = numpy.flatnonzero(choices[:, 0] >= num_groups)
+        max_btl = min(choices.shape[1], self._m)
+        marked = numpy.arange(max_btl) < num_preferences[btl, numpy.newaxis]
+        ballots[btl, :max_btl] = numpy.where(marked, choices[btl, :max_btl] - num_groups + 1, 0)
+        return ballots
+
+    def draw_ballots(self):
+        """ Adds simulated ballots to the sample of ballots drawn thus far.
+
+        Note that the total number of ballots drawn may not exceed the total number of cast votes, :attr:`_n`. The
+        ballot types of each batch are registered in the order they first occur.
+        """
+        batch_size = min(self._sample_increment_size, self._n - self._num_ballots_drawn)
+        for start in range(0, batch_size, SimulatedStvSenateElection.DRAW_CHUNK_SIZE):
+            num_ballots = min(SimulatedStvSenateElection.DRAW_CHUNK_SIZE, batch_size - start)
+            ballots = self._get_ballots(*self._model.draw(num_ballots))
+            ballot_types, first_indices, counts = numpy.unique(ballots, axis=0, return_index=True, return_counts=True)
+            order = numpy.argsort(first_indices)
+            ballot_ids = numpy.array([
+                self.get_ballot_id(tuple(cid for cid in ballot if cid)) for ballot in ballot_types[order].tolist()
+            ])
+            self.add_ballot_weights(ballot_ids, counts[order])
+
+    def get_outcome(self, ballot_weights):
+        """ Returns the outcome of a senate election with the given ballot weights.
+
+        The social choice function used in the simulated senate election is STV, as counted for a real senate election.
+
+        :param :class:`numpy.ndarray` ballot_weights: The weight of each ballot type, indexed by ID.
+
+        :returns: The IDs of the candidates elected to the available seats, sorted in lexicographical order.
+        :rtype: tuple
+        """
+        return tuple(sorted(self._stv_counter.count(self.get_ballots(), ballot_weights)))
@@ -0,0 +1,336 @@
+# -*- coding: utf-8 -*-
+
+""" Implements a Native Array-Based Counter for the Australian Senate STV Count. """
+
+from collections import namedtuple
+from fractions import Fraction
+
+import numpy
+
+from aus_senate_audit.senate_election.ballot_trie import BallotTrie
+
+
+# A collection of ballot papers transferred to a candidate at a common transfer value.
+#   - nodes: the nodes of the ballot trie holding the ballot papers (each holds the papers of the ballot types under it).
+#   - transfer_value: the transfer value (a Fraction).
+#   - papers: the number of ballot papers in the transaction.
+#   - votes: the vote value of the transaction (the papers multiplied by the transfer value, rounded down).
+Transaction = namedtuple('Transaction', ('nodes', 'transfer_value', 'papers', 'votes'))
+
+
+class StvCounter(object):
+    """ Implements a native counter for the Australian senate STV count, over integer coded ballots.
+
+    The counter applies exactly the rules of :class:`dividebatur.counter.SenateCounter` with bulk exclusions disabled
+    (the same quota, transfer values, order of distributions, tie breaking from previous rounds and end of count
+    provisions), and calls the same :class:`AuditTieBreaker` methods when an Australian Electoral Officer would have to
+    break a tie, so the two counters elect the same candidates.
+
+    Rather than moving a bundle of ballot papers per ticket through the count, the counter keeps the ballot types in
+    a :class:`BallotTrie`. Ballot papers which have reached the same prefix of preferences are held together as the
+    node of that prefix, so each distribution of preferences moves whole subtrees of the trie, and its cost grows with
+    the number of distinct prefixes distributed rather than the number of ballot types.
+
+    :ivar int _vacancies: The number of vacancies to fill.
+    :ivar list _candidate_ids: The IDs of the candidates participating in the election.
+    :ivar dict _candidate_indices: A mapping from the ID of a candidate to its position in :attr:`_candidate_ids`.
+    :ivar list _candidate_orders: The position on the ballot of each candidate, indexed by candidate index.
+    :ivar :class:`AuditTieBreaker` _tie_breaker: Breaks ties encountered while counting.
+    :ivar :class:`BallotTrie` _trie: The ballot types counted thus far.
+    """
+    def __init__(self, vacancies, candidate_ids, candidate_orders, tie_breaker):
+        """ Initializes a :class:`StvCounter` object.
+
+        :param int vacancies: The number of vacancies to fill.
+        :param list candidate_ids: The IDs of the candidates participating in the election.
+        :param dict candidate_orders: A mapping from the ID of a candidate to its position on the ballot.
+        :param :class:`AuditTieBreaker` tie_breaker: Breaks ties encountered while counting.
+        """
+        self._vacancies = vacancies
+        self._candidate_ids = list(candidate_ids)
+        self._candidate_indices = {cid: i for i, cid in enumerate(self._candidate_ids)}
+        self._candidate_orders = [candidate_orders[cid] for cid in self._candidate_ids]
+        self._tie_breaker = tie_breaker
+        self._trie = BallotTrie(self._candidate_indices)
+
+    def count(self, ballot_types, ballot_weights):
+        """ Returns the candidates elected by a count of the given ballot types with the given weights.
+
+        :param list ballot_types: The ballot types, indexed by ID (each a tuple of candidate IDs in preference order).
+        :param :class:`numpy.ndarray` ballot_weights: The (integer) weight of each ballot type, indexed by ID.
+
+        :returns: The IDs of the candidates elected, in the order they were elected.
+        :rtype: list
+        """
+        self._trie.extend(ballot_types)
+        return _StvCount(self, self._trie.get_weights(numpy.asarray(ballot_weights, dtype=numpy.int64))).run()
+
+
+class _StvCount(object):
+    """ Implements a single count of a :class:`StvCounter`.
+
+    :ivar :class:`StvCounter` _counter: The counter running the count.
+    :ivar :class:`BallotTrie` _trie: The ballot types counted.
+    :ivar :class:`numpy.ndarray` _weights: The summed weight of the ballot types under each node of :attr:`_trie`.
+    :ivar int _quota: The number of votes a candidate needs to be elected.
+    :ivar list _transactions: The transactions held by each candidate, indexed by candidate index.
+    :ivar list _papers: The number of ballot papers held by each candidate, indexed by candidate index.
+    :ivar list _elected: The indices of the candidates elected thus far, in the order they were elected.
+    :ivar list _excluded: The indices of the candidates excluded thus far, in the order they were excluded.
+    :ivar :class:`numpy.ndarray` _skipped: Whether ballots skip each candidate (because the candidate is elected or
+        excluded), indexed by candidate index.
+    :ivar list _rounds: The votes held by each candidate at the end of each round, indexed by candidate index.
+    :ivar list _exclusions_pending: The exclusion distributions to perform, as pairs of the index of the excluded
+        candidate and the transfer value of the transactions to distribute.
+    :ivar list _elections_pending: The election distributions to perform, as pairs of the index of the elected
+        candidate and the transfer value of its surplus.
+    """
+    def __init__(self, counter, weights):
+        """ Initializes a :class:`_StvCount` object.
+
+        :param :class:`StvCounter` counter: The counter running the count.
+        :param :class:`numpy.ndarray` weights: The summed weight of the ballot types under each node of the counter's
+            trie.
+        """
+        num_candidates = len(counter._candidate_ids)
+        self._counter = counter
+        self._trie = counter._trie
+        self._weights = weights
+        self._quota = int(int(weights[BallotTrie.ROOT]) / (counter._vacancies + 1)) + 1
+        self._transactions = [[] for _ in range(num_candidates)]
+        self._papers = [0] * num_candidates
+        self._elected = []
+        self._excluded = []
+        self._skipped = numpy.zeros(num_candidates, dtype=bool)
+        self._rounds = []
+        self._exclusions_pending = []
+        self._elections_pending = []
+
+    def _get_order(self, candidate):
+        """ Returns the position on the ballot of the candidate with the given index. """
+        return self._counter._candidate_orders[candidate]
+
+    def _transfer_to(self, nodes, transfer_value, votes):
+        """ Transfers the ballot papers held at the given nodes to the last candidate of each node's prefix.
+
+        One transaction is made for each candidate receiving ballot papers, in the order the candidates appear on the
+        ballot.
+
+        :param :class:`numpy.ndarray` nodes: The nodes of the trie (each with a positive weight).
+        :param transfer_value: The transfer value of the ballot papers.
+        :type transfer_value: :class:`fractions.Fraction`
+        :param list votes: The votes held by each candidate, updated in place.
+        """
+        candidates = self._trie.get_candidates(nodes)
+        for candidate in sorted(numpy.unique(candidates).tolist(), key=self._get_order):
+            transferred = nodes[candidates == candidate]
+            papers = int(self._weights[transferred].sum())
+            transaction = Transaction(transferred, transfer_value, papers, int(papers * transfer_value))
+            self._transactions[candidate].append(transaction)
+            self._papers[candidate] += papers
+            votes[candidate] += transaction.votes
+
+    def _distribute(self, transactions, transfer_value, votes):
+        """ Distributes the given transactions to the next continuing candidate of each ballot paper.
+
+        The nodes of the transactions are replaced by their children, and any child whose candidate is elected or
+        excluded by its own children, until every node reached is for a continuing candidate. Ballot papers ending at
+        a node which is replaced are exhausted.
+
+        :param list transactions: The transactions to distribute, as pairs of the index of the candidate holding the
+            transaction and the transaction.
+        :param transfer_value: The transfer value of the ballot papers distributed.
+        :type transfer_value: :class:`fractions.Fraction`
+        :param list votes: The votes held by each candidate, updated in place.
+        """
+        for candidate, transaction in transactions:
+            votes[candidate] -= transaction.votes
+            self._transactions[candidate] = [t for t in self._transactions[candidate] if t is not transaction]
+            self._papers[candidate] -= transaction.papers
+        if not transactions:
+            return
+        nodes = numpy.concatenate([transaction.nodes for _, transaction in transactions])
+        reached = []
+        while len(nodes) > 0:
+            children = self._trie.get_children(nodes)
+            # Ballot types with no weight in this count are not part of it.
+            children = children[self._weights[children] > 0]
+            skipped = self._skipped[self._trie.get_candidates(children)]
+            reached.append(children[~skipped])
+            nodes = children[skipped]
+        self._transfer_to(numpy.concatenate(reached), transfer_value, votes)
+
+    def _find_tie_breaker(self, candidates):
+        """ Returns the votes of the most recent round in which each of the given candidates held a different number of
+        votes.
+
+        :param list candidates: The indices of the tied candidates.
+
+        :returns: The votes held by each candidate in that round (None if there is no such round).
+        :rtype: list
+        """
+        for votes in reversed(self._rounds):
+            if len(set(votes[candidate] for candidate in candidates)) == len(candidates):
+                return votes
+        return None
+
+    def _get_candidates_to_elect(self, votes):
+        """ Returns the candidates which hold a quota of votes and have not been elected yet, in the order in which
+        they are elected.
+
+        :param list votes: The votes held by each candidate.
+
+        :returns: The indices of the candidates to elect, in order of decreasing votes.
+        :rtype: list
+        """
+        candidates_by_votes = {}
+        for candidate, candidate_votes in enumerate(votes):
+            if candidate not in self._elected and candidate_votes >= self._quota:
+                candidates_by_votes.setdefault(candidate_votes, []).append(candidate)
+        to_elect = []
+        for candidate_votes in sorted(candidates_by_votes, reverse=True):
+            candidates = sorted(candidates_by_votes[candidate_votes], key=self._get_order)
+            if len(candidates) == 1:
+                to_elect.extend(candidates)
+                continue
+            tie_breaker = self._find_tie_breaker(candidates)
+            if tie_breaker is not None:
+                to_elect.extend(reversed(sorted(candidates, key=tie_breaker.__getitem__)))
+            else:
+                candidate_ids = self._counter._candidate_ids
+                order = self._counter._tie_breaker.get_election_order([candidate_ids[c] for c in candidates])
+                to_elect.extend(self._counter._candidate_indices[cid] for cid in order)
+        return to_elect
+
+    def _resolve_tie(self, candidates, break_tie):
+        """ Returns the candidate chosen by the given tie breaking callback.
+
+        As in :meth:`dividebatur.counter.SenateCounter.resolve_exclusion_tie`, the callback is given the candidates in
+        the given order, and its result indexes the candidates sorted by their position on the ballot.
+
+        :param list candidates: The indices of the tied candidates.
+        :param function break_tie: A tie breaking callback of :class:`AuditTieBreaker`.
+
+        :returns: The index of the chosen candidate.
+        :rtype: int
+        """
+        candidate_ids = self._counter._candidate_ids
+        choice = break_tie([candidate_ids[candidate] for candidate in candidates])
+        return sorted(candidates, key=self._get_order)[choice]
+
+    def _get_candidate_to_exclude(self, votes):
+        """ Returns the continuing candidate with the fewest votes.
+
+        :param list votes: The votes held by each candidate.
+
+        :returns: The index of the candidate to exclude.
+        :rtype: int
+        """
+        continuing = [c for c in range(len(votes)) if c not in self._elected and c not in self._excluded]
+        min_votes = min(votes[candidate] for candidate in continuing)
+        candidates = [candidate for candidate in continuing if votes[candidate] == min_votes]
+        if len(candidates) == 1:
+            return candidates[0]
+        tie_breaker = self._find_tie_breaker(candidates)
+        if tie_breaker is not None:
+            return min(candidates, key=tie_breaker.__getitem__)
+        return self._resolve_tie(candidates, self._counter._tie_breaker.break_exclusion_tie)
+
+    def _elect(self, votes, candidate):
+        """ Elects the given candidate, scheduling the distribution of its surplus unless all vacancies are filled.
+
+        :param list votes: The votes held by each candidate.
+        :param int candidate: The index of the candidate to elect.
+        """
+        self._elected.append(candidate)
+        self._skipped[candidate] = True
+        if len(self._elected) != self._counter._vacancies:
+            excess = max(votes[candidate] - self._quota, 0)
+            papers = self._papers[candidate]
+            self._elections_pending.append((candidate, Fraction(excess, papers) if papers > 0 else 0))
+
+    def _exclude(self, candidate):
+        """ Excludes the given candidate, scheduling one distribution per transfer value of its transactions, in
+        order of decreasing transfer value.
+
+        :param int candidate: The index of the candidate to exclude.
+        """
+        self._excluded.append(candidate)
+        self._skipped[candidate] = True
+        transfer_values = set(transaction.transfer_value for transaction in self._transactions[candidate])
+        for transfer_value in sorted(transfer_values, reverse=True):
+            self._exclusions_pending.append((candidate, transfer_value))
+
+    def _process_round(self, votes):
+        """ Determines the elections or exclusions which follow a round with the given votes.
+
+        :param list votes: The votes held by each candidate at the end of the round.
+
+        :returns: Whether the count continues.
+        :rtype: bool
+        """
+        to_elect = self._get_candidates_to_elect(votes)
+        if to_elect:
+            for candidate in to_elect:
+                self._elect(votes, candidate)
+                if len(self._elected) == self._counter._vacancies:
+                    return False
+            return True
+        if self._elections_pending or self._exclusions_pending:
+            return True
+
+        # The order of the continuing candidates matches dividebatur's, which passes them to the tie breaker.
+        candidate_ids = self._counter._candidate_ids
+        continuing = [self._counter._candidate_indices[cid] for cid in list(
+            set(candidate_ids) -
+            set(candidate_ids[candidate] for candidate in self._elected) -
+            set(candidate_ids[candidate] for candidate in self._excluded)
+        )]
+        still_to_elect = self._counter._vacancies - len(self._elected)
+        if len(continuing) == still_to_elect:
+            # Section 273(18): the last continuing candidates fill the remaining vacancies.
+            for candidate in reversed(sorted(continuing, key=votes.__getitem__)):
+                self._elect(votes, candidate)
+            return False
+        if len(continuing) == 2:
+            # Section 273(17): the last two continuing candidates are decided by their votes.
+            candidate_a, candidate_b = continuing
+            if votes[candidate_a] == votes[candidate_b]:
+                self._elect(votes, self._resolve_tie(continuing, self._counter._tie_breaker.break_election_tie))
+            else:
+                self._elect(votes, candidate_a if votes[candidate_a] > votes[candidate_b] else candidate_b)
+            return False
+
+        # A candidate holding no ballot papers has nothing to distribute, so keep excluding until there is.
+        while not self._exclusions_pending:
+            self._exclude(self._get_candidate_to_exclude(votes))
+        return True
+
+    def run(self):
+        """ Runs the count.
+
+        :returns: The IDs of the candidates elected, in the order they were elected.
+        :rtype: list
+        """
+        votes = [0] * len(self._counter._candidate_ids)
+        root = numpy.array([BallotTrie.ROOT])
+        first_preferences = self._trie.get_children(root)
+        first_preferences = first_preferences[self._weights[first_preferences] > 0]
+        if self._weights[first_preferences].sum() != self._weights[BallotTrie.ROOT]:
+            raise ValueError('A ballot with no first preference was included in the count.')
+        self._transfer_to(first_preferences, Fraction(1, 1), votes)
+
+        while True:
+            self._rounds.append(votes)
+            if not self._process_round(votes):
+                break
+            votes = list(votes)
+            if self._exclusions_pending:
+                candidate, transfer_value = self._exclusions_pending.pop(0)
+                transactions = [t for t in self._transactions[candidate] if t.transfer_value == transfer_value]
+                self._distribute([(candidate, t) for t in transactions], transfer_value, votes)
+            else:
+                candidate, transfer_value = self._elections_pending.pop(0)
+                self._distribute([(candidate, t) for t in self._transactions[candidate]], transfer_value, votes)
+                votes[candidate] = self._quota
+        return [self._counter._candidate_ids[candidate] for candidate in self._elected]
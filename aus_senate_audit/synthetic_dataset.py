@@ -0,0 +1,456 @@
+# -*- coding: utf-8 -*-
+
+""" Implements a Generator of Synthetic Australian Senate Election Data. """
+
+from csv import writer
+from itertools import permutations
+from json import dumps
+from json import load
+from os import makedirs
+from os import replace
+from os.path import exists
+
+import numpy
+
+from aus_senate_audit.constants import AEC_DATA_FORMAT
+from aus_senate_audit.constants import COLUMN_HEADER_DELIMS
+from aus_senate_audit.constants import COLUMN_HEADERS
+from aus_senate_audit.constants import CONFIG_FILE_PATH
+from aus_senate_audit.constants import DEFAULT_SYNTHETIC_ATL_FRACTION
+from aus_senate_audit.constants import DEFAULT_SYNTHETIC_NUM_TIE_EVENTS
+from aus_senate_audit.constants import DEFAULT_SYNTHETIC_VACANCIES
+from aus_senate_audit.constants import SYNTHETIC_ALL_CANDIDATES_FILE_NAME
+from aus_senate_audit.constants import SYNTHETIC_DATASET_RNG_STREAM
+from aus_senate_audit.constants import SYNTHETIC_ELECTION_TITLE
+from aus_senate_audit.constants import SYNTHETIC_FORMAL_PREFERENCES_FILE_NAME
+from aus_senate_audit.constants import SYNTHETIC_SENATE_CANDIDATES_FILE_NAME
+from aus_senate_audit.random_streams import get_rng
+from aus_senate_audit.senate_election.formal_preferences_parser import FormalPreferencesParser
+
+
+class SyntheticBallotModel(object):
+    """ Implements a model of the ballots cast in a synthetic senate election with group tickets.
+
+    The candidates are split evenly across the groups, and the candidates left over are ungrouped. Each group is given
+    a Zipf distributed popularity (ungrouped candidates are half as popular as the least popular group), and each ballot
+    ranks the groups (above the line) or the candidates (below the line, favouring candidates higher in their group's
+    column) by their popularity plus independent Gumbel noise, so the ranking is a random draw weighted by popularity.
+    Like a real senate election, the ballots marked above the line have few distinct shapes, and those marked below
+    the line are a long tail.
+
+    :ivar int _num_candidates: The number of candidates.
+    :ivar int _num_groups: The number of groups (above the line boxes).
+    :ivar int _group_size: The number of candidates in each group.
+    :ivar float _atl_fraction: The fraction of the ballots marked above the line.
+    :ivar :class:`numpy.random.Generator` _rng: The random number generator used to draw ballots.
+    :ivar :class:`numpy.ndarray` _log_group_popularity: The log popularity of each group.
+    :ivar :class:`numpy.ndarray` _log_candidate_popularity: The log popularity of each candidate (below the line),
+        indexed by the position (0 based) of the candidate on the ballot.
+    """
+    # The most preferences marked above the line, and below the line, on a synthetic ballot.
+    MAX_ATL_PREFERENCES = 6
+    MAX_BTL_PREFERENCES = 12
+
+    # The penalty on the popularity of a candidate (below the line) for each position it is down its group's column.
+    BALLOT_POSITION_PENALTY = 0.5
+
+    def __init__(self, num_candidates, num_groups, atl_fraction, rng):
+        """ Initializes a :class:`SyntheticBallotModel` object.
+
+        :param int num_candidates: The number of candidates.
+        :param int num_groups: The number of groups (above the line boxes).
+        :param float atl_fraction: The fraction of the ballots marked above the line.
+        :param :class:`numpy.random.Generator` rng: The random number generator used to draw ballots.
+        """
+        if num_groups < 1 or num_candidates < 2 * num_groups:
+            raise ValueError('Every group must have at least two candidates.')
+        if not 0 <= atl_fraction <= 1:
+            raise ValueError('The fraction of ballots marked above the line must be between 0 and 1.')
+        self._num_candidates = num_candidates
+        self._num_groups = num_groups
+        self._group_size = num_candidates // num_groups
+        self._atl_fraction = atl_fraction
+        self._rng = rng
+        self._log_group_popularity = -numpy.log(self._rng.permutation(num_groups) + 1.0)
+        groups, positions = zip(*[self.get_group(candidate) for candidate in range(num_candidates)])
+        self._log_candidate_popularity = numpy.array([
+            self._log_group_popularity[group] if group is not None else -numpy.log(2.0 * num_groups)
+            for group in groups
+        ]) - SyntheticBallotModel.BALLOT_POSITION_PENALTY * numpy.array(positions)
+
+    def get_num_groups(self):
+        """ Returns the number of groups (above the line boxes).
+
+        :returns: The number of groups.
+        :rtype: int
+        """
+        return self._num_groups
+
+    def get_group_size(self):
+        """ Returns the number of candidates in each group.
+
+        :returns: The number of candidates in each group.
+        :rtype: int
+        """
+        return self._group_size
+
+    def get_group(self, candidate):
+        """ Returns the group of the given candidate, and the candidate's position in the group's column.
+
+        :param int candidate: The position (0 based) of the candidate on the ballot.
+
+        :returns: The index of the candidate's group (None if the candidate is ungrouped), and the position (0 based)
+            of the candidate in the group's column (or in the column of ungrouped candidates).
+        :rtype: tuple
+        """
+        group, position = divmod(candidate, self._group_size)
+        if group < self._num_groups:
+            return group, position
+        return None, candidate - self._num_groups * self._group_size
+
+    def draw(self, num_ballots):
+        """ Returns the choices marked on the given number of random ballots.
+
+        A choice is the index of a group (above the line), or the number of groups plus the position (0 based) of a
+        candidate on the ballot (below the line). Every ballot is marked either above the line or below the line.
+
+        :param int num_ballots: The number of ballots.
+
+        :returns: The choices marked on each ballot in preference order, padded with the number of groups plus the
+            number of candidates, and the number of choices marked on each ballot.
+        :rtype: tuple
+        """
+        num_choices = self._num_groups + self._num_candidates
+        max_atl = min(self._num_groups, SyntheticBallotModel.MAX_ATL_PREFERENCES)
+        max_btl = min(self._num_candidates, SyntheticBallotModel.MAX_BTL_PREFERENCES)
+        min_btl = min(self._num_candidates, FormalPreferencesParser.MIN_BTL_PREFERENCES)
+        choices = numpy.full((num_ballots, max(max_atl, max_btl)), num_choices)
+        num_preferences = numpy.zeros(num_ballots, dtype=numpy.int64)
+
+        atl = numpy.flatnonzero(self._rng.random(num_ballots) < self._atl_fraction)
+        keys = self._log_group_popularity + self._rng.gumbel(size=(len(atl), self._num_groups))
+        choices[atl, :max_atl] = numpy.argsort(-keys, axis=1)[:, :max_atl]
+        num_preferences[atl] = self._rng.integers(1, max_atl + 1, size=len(atl))
+
+        btl = numpy.setdiff1d(numpy.arange(num_ballots), atl, assume_unique=True)
+        keys = self._log_candidate_popularity + self._rng.gumbel(size=(len(btl), self._num_candidates))
+        choices[btl, :max_btl] = self._num_groups + numpy.argsort(-keys, axis=1)[:, :max_btl]
+        num_preferences[btl] = self._rng.integers(min_btl, max_btl + 1, size=len(btl))
+
+        choices[numpy.arange(choices.shape[1]) >= num_preferences[:, numpy.newaxis]] = num_choices
+        return choices, num_preferences
+
+
+class SyntheticDatasetGenerator(object):
+    """ Implements a generator of synthetic Australian senate election data.
+
+    The generator writes a state's contest in the same layout as the 2016 AEC download: an entry in the configuration
+    file (see :data:`CONFIG_FILE_PATH`), an all candidates file, a senate candidates file and a formal preferences file,
+    so the contest can be audited in every mode which reads real senate election data. Contests for other states
+    already in the configuration file are kept.
+
+    The ballots are drawn from a :class:`SyntheticBallotModel`. The tie events are consistent with a hidden linear
+    order of the candidates, so the audit tie-breaking graph they build is always acyclic.
+
+    :ivar str _state: The abbreviated name of the state whose contest is generated.
+    :ivar int _num_ballots: The number of ballots cast in the contest.
+    :ivar int _num_candidates: The number of candidates in the contest.
+    :ivar int _vacancies: The number of vacancies in the contest.
+    :ivar int _num_tie_events: The number of tie events recorded in the contest's configuration.
+    :ivar :class:`numpy.random.Generator` _rng: The random number generator used to generate the contest.
+    :ivar :class:`SyntheticBallotModel` _model: The model the contest's ballots are drawn from.
+    """
+    # The ID of the first candidate of a synthetic contest (the candidates are numbered in ballot order).
+    FIRST_CANDIDATE_ID = 10001
+
+    # The ticket of the ungrouped candidates.
+    UNGROUPED_TICKET = 'UG'
+
+    # The party of the ungrouped candidates, and its abbreviation.
+    UNGROUPED_PARTY = ('Independent', 'IND')
+
+    # The number of papers in each batch, batches at each vote collection point, and vote collection points in each
+    # electorate.
+    PAPERS_PER_BATCH = 50
+    BATCHES_PER_COLLECTION_POINT = 20
+    COLLECTION_POINTS_PER_ELECTORATE = 100
+
+    # The maximum number of ballots generated at once, bounding the memory used by each batch.
+    CHUNK_SIZE = 1 << 16
+
+    # The columns of the all candidates file read by :class:`dividebatur.aecdata.CandidateList`.
+    ALL_CANDIDATES_COLUMN_HEADERS = [
+        'txn_nm',
+        'nom_ty',
+        'state_ab',
+        'div_nm',
+        'ticket',
+        'ballot_position',
+        'surname',
+        'ballot_given_nm',
+        'party_ballot_nm',
+    ]
+
+    # The columns of the senate candidates file read by :class:`dividebatur.aecdata.CandidateList`.
+    SENATE_CANDIDATES_COLUMN_HEADERS = [
+        'StateAb',
+        'Ticket',
+        'CandidateID',
+        'BallotPosition',
+        'CandidateDetails',
+        'Surname',
+        'GivenNm',
+        'PartyAb',
+        'PartyNm',
+    ]
+
+    def __init__(
+        self,
+        seed,
+        state,
+        num_ballots,
+        num_candidates,
+        num_groups,
+        vacancies=DEFAULT_SYNTHETIC_VACANCIES,
+        atl_fraction=DEFAULT_SYNTHETIC_ATL_FRACTION,
+        num_tie_events=DEFAULT_SYNTHETIC_NUM_TIE_EVENTS,
+    ):
+        """ Initializes a :class:`SyntheticDatasetGenerator` object.
+
+        :param int seed: The starting value for the random number generator.
+        :param str state: The abbreviated name of the state whose contest is generated.
+        :param int num_ballots: The number of ballots cast in the contest.
+        :param int num_candidates: The number of candidates in the contest.
+        :param int num_groups: The number of groups (above the line boxes) in the contest.
+        :param int vacancies: The number of vacancies in the contest (default: 12).
+        :param float atl_fraction: The fraction of the ballots marked above the line (default: 0.95).
+        :param int num_tie_events: The number of tie events recorded in the contest's configuration (default: 3).
+        """
+        if num_candidates <= vacancies:
+            raise ValueError('There must be more candidates than vacancies.')
+        self._state = state
+        self._num_ballots = num_ballots
+        self._num_candidates = num_candidates
+        self._vacancies = vacancies
+        self._num_tie_events = num_tie_events
+        self._rng = get_rng(seed, SYNTHETIC_DATASET_RNG_STREAM)
+        self._model = SyntheticBallotModel(num_candidates, num_groups, atl_fraction, self._rng)
+
+    @staticmethod
+    def get_ticket(group):
+        """ Returns the ticket (A, ..., Z, AA, AB, ...) of the given group.
+
+        :param int group: The index (0 based) of the group, in the order the groups appear on the ballot.
+
+        :returns: The ticket of the group.
+        :rtype: str
+        """
+        ticket = ''
+        group += 1
+        while group > 0:
+            group, letter = divmod(group - 1, 26)
+            ticket = chr(ord('A') + letter) + ticket
+        return ticket
+
+    def _get_candidates(self):
+        """ Returns the candidates of the contest, in the order they appear on the ballot.
+
+        :returns: The ticket, ballot position (1 based), ID, surname, given name, party name and party abbreviation of
+            each candidate.
+        :rtype: list
+        """
+        candidates = []
+        for i in range(self._num_candidates):
+            cid = SyntheticDatasetGenerator.FIRST_CANDIDATE_ID + i
+            group, position = self._model.get_group(i)
+            if group is not None:
+                ticket = SyntheticDatasetGenerator.get_ticket(group)
+                party = ('Synthetic Party {}'.format(ticket), 'SP{}'.format(ticket))
+            else:
+                ticket = SyntheticDatasetGenerator.UNGROUPED_TICKET
+                party = SyntheticDatasetGenerator.UNGROUPED_PARTY
+            candidates.append((ticket, position + 1, cid, 'SURNAME{}'.format(cid), 'Given{}'.format(cid)) + party)
+        return candidates
+
+    def _get_tie_events(self, candidate_ids):
+        """ Returns random tie events consistent with a hidden linear order of the given candidates.
+
+        :param list candidate_ids: The IDs of the candidates, in the order they appear on the ballot.
+
+        :returns: The election order ties, election ties and exclusion ties (see :meth:`AuditTieBreaker.load_events`).
+        :rtype: tuple
+        """
+        ranks = dict(zip(self._rng.permutation(candidate_ids).tolist(), range(len(candidate_ids))))
+        election_order_ties, election_ties, exclusion_ties = [], [], []
+        for _ in range(self._num_tie_events):
+            num_tied = int(self._rng.integers(2, min(3, len(candidate_ids)) + 1))
+            tied = sorted(self._rng.choice(candidate_ids, num_tied, replace=False).tolist())
+            event_type = self._rng.integers(3)
+            if event_type == 0:
+                order = sorted(tied, key=ranks.get)
+                election_order_ties.append([[list(permutation) for permutation in permutations(tied)], order])
+            elif event_type == 1:
+                election_ties.append([tied, min(tied, key=ranks.get)])
+            else:
+                exclusion_ties.append([tied, max(tied, key=ranks.get)])
+        return election_order_ties, election_ties, exclusion_ties
+
+    def _get_marked_columns(self, choices, num_preferences):
+        """ Returns the columns of the formal preferences file marked on the given ballots.
+
+        :param :class:`numpy.ndarray` choices: The choices marked on each ballot, which are the columns of the ballot
+            (groups, then candidates; see :meth:`SyntheticBallotModel.draw`).
+        :param :class:`numpy.ndarray` num_preferences: The number of choices marked on each ballot.
+
+        :returns: The columns marked on each ballot in increasing order, padded with the number of columns, and the
+            preference marked in each of those columns.
+        :rtype: tuple
+        """
+        preferences = numpy.broadcast_to(numpy.arange(1, choices.shape[1] + 1), choices.shape)
+        order = numpy.argsort(choices, axis=1, kind='stable')
+        return numpy.take_along_axis(choices, order, axis=1), numpy.take_along_axis(preferences, order, axis=1)
+
+    def _get_rows(self, start, columns, preferences):
+        """ Returns the rows of the formal preferences file for the given ballots.
+
+        :param int start: The position of the first ballot in the formal preferences file.
+        :param :class:`numpy.ndarray` columns: The columns marked on each ballot (see :meth:`_get_marked_columns`).
+        :param :class:`numpy.ndarray` preferences: The preference marked in each of those columns.
+
+        :returns: The rows of the formal preferences file (see :data:`COLUMN_HEADERS`).
+        :rtype: list
+        """
+        num_columns = self._model.get_num_groups() + self._num_candidates
+        commas = [',' * i for i in range(num_columns)]
+        rows = []
+        for i, (ballot_columns, ballot_preferences) in enumerate(zip(columns.tolist(), preferences.tolist()), start):
+            # Only the marked columns are visited; the runs of empty columns between them are single strings.
+            pieces = []
+            previous = 0
+            for column, preference in zip(ballot_columns, ballot_preferences):
+                if column == num_columns:
+                    break
+                pieces.append(commas[column - previous])
+                pieces.append(str(preference))
+                previous = column
+            pieces.append(commas[num_columns - 1 - previous])
+            batch, paper = divmod(i, SyntheticDatasetGenerator.PAPERS_PER_BATCH)
+            collection_point, batch = divmod(batch, SyntheticDatasetGenerator.BATCHES_PER_COLLECTION_POINT)
+            electorate = collection_point // SyntheticDatasetGenerator.COLLECTION_POINTS_PER_ELECTORATE
+            rows.append([
+                'Synthetic Division {}'.format(electorate + 1),
+                'Synthetic Collection Point {}'.format(collection_point + 1),
+                collection_point + 1,
+                batch + 1,
+                paper + 1,
+                ''.join(pieces),
+            ])
+        return rows
+
+    @staticmethod
+    def _write_file(path, write_fn):
+        """ Writes a file with the given function, replacing the file atomically.
+
+        :param str path: The path to the file.
+        :param function write_fn: Writes the contents of the file to the open file it is given.
+        """
+        with open(path + '.tmp', 'w', newline='') as f:
+            write_fn(f)
+        replace(path + '.tmp', path)
+
+    def _write_candidates(self, data_file_path, candidates):
+        """ Writes the all candidates file and senate candidates file of the contest.
+
+        :param str data_file_path: The path to the data directory.
+        :param list candidates: The candidates of the contest (see :meth:`_get_candidates`).
+        """
+        def write_all_candidates(f):
+            csv_writer = writer(f, lineterminator='\n')
+            csv_writer.writerow(SyntheticDatasetGenerator.ALL_CANDIDATES_COLUMN_HEADERS)
+            for ticket, position, _, surname, given_name, party_name, _ in candidates:
+                csv_writer.writerow([
+                    'Nominate', 'S', self._state, '', ticket, position, surname, given_name, party_name,
+                ])
+
+        def write_senate_candidates(f):
+            csv_writer = writer(f, lineterminator='\n')
+            csv_writer.writerow(['{} Senate Candidates'.format(SYNTHETIC_ELECTION_TITLE)])
+            csv_writer.writerow(SyntheticDatasetGenerator.SENATE_CANDIDATES_COLUMN_HEADERS)
+            for ticket, position, cid, surname, given_name, party_name, party_ab in candidates:
+                csv_writer.writerow([
+                    self._state, ticket, cid, position, '{}, {}'.format(surname, given_name), surname, given_name,
+                    party_ab, party_name,
+                ])
+
+        SyntheticDatasetGenerator._write_file(
+            '{}/{}'.format(data_file_path, SYNTHETIC_ALL_CANDIDATES_FILE_NAME.format(self._state)),
+            write_all_candidates,
+        )
+        SyntheticDatasetGenerator._write_file(
+            '{}/{}'.format(data_file_path, SYNTHETIC_SENATE_CANDIDATES_FILE_NAME.format(self._state)),
+            write_senate_candidates,
+        )
+
+    def _write_formal_preferences(self, data_file_path):
+        """ Writes the formal preferences file of the contest, a chunk of ballots at a time.
+
+        :param str data_file_path: The path to the data directory.
+        """
+        def write_formal_preferences(f):
+            csv_writer = writer(f, lineterminator='\n')
+            csv_writer.writerow(COLUMN_HEADERS)
+            csv_writer.writerow(COLUMN_HEADER_DELIMS)
+            for start in range(0, self._num_ballots, SyntheticDatasetGenerator.CHUNK_SIZE):
+                num_ballots = min(SyntheticDatasetGenerator.CHUNK_SIZE, self._num_ballots - start)
+                columns, preferences = self._get_marked_columns(*self._model.draw(num_ballots))
+                csv_writer.writerows(self._get_rows(start, columns, preferences))
+
+        SyntheticDatasetGenerator._write_file(
+            '{}/{}'.format(data_file_path, SYNTHETIC_FORMAL_PREFERENCES_FILE_NAME.format(self._state)),
+            write_formal_preferences,
+        )
+
+    def _write_config(self, data_file_path, tie_events):
+        """ Adds the contest to the configuration file, replacing any existing contest for the same state.
+
+        :param str data_file_path: The path to the data directory.
+        :param tuple tie_events: The election order ties, election ties and exclusion ties of the contest.
+        """
+        path = '{}/{}'.format(data_file_path, CONFIG_FILE_PATH)
+        config = {'title': SYNTHETIC_ELECTION_TITLE, 'house': 'Senate', 'count': []}
+        if exists(path):
+            with open(path, 'r') as f:
+                config = load(f)
+        election_order_ties, election_ties, exclusion_ties = tie_events
+        contest_config = {
+            'name': self._state,
+            'shortname': self._state.lower(),
+            'state': self._state,
+            'description': 'Synthetic senate election for {}'.format(self._state),
+            'house': 'Senate',
+            'vacancies': self._vacancies,
+            'aec-data': {
+                'format': AEC_DATA_FORMAT,
+                'all-candidates': SYNTHETIC_ALL_CANDIDATES_FILE_NAME.format(self._state),
+                'senate-candidates': SYNTHETIC_SENATE_CANDIDATES_FILE_NAME.format(self._state),
+                'formal-preferences': SYNTHETIC_FORMAL_PREFERENCES_FILE_NAME.format(self._state),
+            },
+            'election_order_ties': election_order_ties,
+            'election_ties': election_ties,
+            'exclusion_ties': exclusion_ties,
+        }
+        config['count'] = [contest for contest in config['count'] if contest['name'] != self._state] + [contest_config]
+        SyntheticDatasetGenerator._write_file(path, lambda f: f.write(dumps(config, indent=4)))
+
+    def generate(self, data_file_path):
+        """ Writes the contest's data files, and adds the contest to the configuration file, in the given directory.
+
+        :param str data_file_path: The path to the data directory (created if it does not exist).
+        """
+        makedirs(data_file_path, exist_ok=True)
+        candidates = self._get_candidates()
+        tie_events = self._get_tie_events([cid for _, _, cid, _, _, _, _ in candidates])
+        self._write_candidates(data_file_path, candidates)
+        self._write_formal_preferences(data_file_path)
+        # The configuration is written last, so it never refers to data files which have not been written.
+        self._write_config(data_file_path, tie_events)
@@ -17,6 +17,6 @@ setup(
     url='https://github.com/berjc/aus-senate-audit',
     packages=find_packages(exclude=['docs', 'tests']),
     setup_requires='setuptools',
-    install_requires=['dividebatur'],
+    install_requires=['dividebatur', 'numpy'],
     scripts=['aus-senate-audit'],
 )
@@ -0,0 +1,35 @@
+# -*- coding: utf-8 -*-
+
+""" Tests the Write-Ahead Journal of an Audit's Stage Transitions. """
+
+from aus_senate_audit.audit_journal import AuditJournal
+
+
+def test_last_entry_survives_torn_append(tmp_path):
+    """ The last complete entry is found after an append torn by an interruption, and the torn line is removed before
+    the next entry is appended.
+    """
+    path = str(tmp_path / 'journal.jsonl')
+    journal = AuditJournal(path)
+    assert journal.get_last_entry() is None
+    journal.append({'event': 'sampled', 'sample': ['x' * 100] * 1000})
+    with open(path, 'a') as f:
+        f.write('{"event": "valid')
+    assert AuditJournal(path).get_last_entry()['event'] == 'sampled'
+
+    AuditJournal(path).append({'event': 'validated'})
+    with open(path, 'r') as f:
+        assert len(f.readlines()) == 2
+    assert AuditJournal(path).get_last_entry() == {'event': 'validated'}
+
+
+def test_compact_keeps_only_the_given_entry(tmp_path):
+    """ Compacting the journal replaces every entry with the given one. """
+    path = str(tmp_path / 'journal.jsonl')
+    journal = AuditJournal(path)
+    for stage in range(1, 4):
+        journal.append({'event': 'sampled', 'stage': stage, 'sample': ['x' * 100] * 1000})
+        journal.compact({'event': 'audited', 'stage': stage})
+        with open(path, 'r') as f:
+            assert len(f.readlines()) == 1
+        assert AuditJournal(path).get_last_entry() == {'event': 'audited', 'stage': stage}
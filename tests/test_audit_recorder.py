@@ -0,0 +1,51 @@
+# -*- coding: utf-8 -*-
+
+""" Tests Recording the Audit's Progress. """
+
+from glob import glob
+
+import pytest
+
+from aus_senate_audit.audit_recorder import AuditRecorder
+
+
+STATE = 'TAS'
+
+
+def get_sample(audit_stage, num_ballots):
+    """ Returns a sample of ballots for the given audit stage, two ballots per batch.
+
+    :param int audit_stage: The audit stage.
+    :param int num_ballots: The number of ballots in the sample.
+
+    :returns: The ballots, as lines of the formal preferences format.
+    :rtype: list
+    """
+    return [
+        'Denison,POSTAL 3,311,{},{},"1,2,3"'.format(audit_stage * 1000 + i // 2, i) for i in range(num_ballots)
+    ]
+
+
+@pytest.mark.parametrize('num_teams, teams', [(2, [1, 2]), (1, [])])
+def test_packets_of_earlier_rounds_are_removed(tmp_path, monkeypatch, num_teams, teams):
+    """ When a round has fewer teams than the round before it (or is not split into packets), the earlier round's
+    extra packets are removed rather than left to be ingested again.
+    """
+    monkeypatch.chdir(tmp_path)
+    audit_recorder = AuditRecorder(STATE)
+    audit_recorder.record_sample(1, 12, list(range(12)), get_sample(1, 12), False, num_teams=3)
+    assert sorted(glob('selected_ballots_team_*.csv')) == [
+        'selected_ballots_team_1.csv',
+        'selected_ballots_team_2.csv',
+        'selected_ballots_team_3.csv',
+    ]
+
+    audit_recorder.record_sample(2, 24, list(range(12, 24)), get_sample(2, 12), False, num_teams=num_teams)
+    packets = sorted(glob('selected_ballots_team_*.csv'))
+    assert packets == ['selected_ballots_team_{}.csv'.format(team) for team in teams]
+    ballots = []
+    for path in packets:
+        with open(path, 'r') as f:
+            ballots.extend(line.rstrip('\n') for line in f.readlines()[1:])
+    if teams:
+        assert sorted(ballots) == sorted(AuditRecorder.remove_preferences_from_ballot(b) for b in get_sample(2, 12))
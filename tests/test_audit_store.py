@@ -0,0 +1,148 @@
+# -*- coding: utf-8 -*-
+
+""" Tests the Embedded SQLite Store of an Audit's Progress, and Its Import and Export of Audit Files. """
+
+from glob import glob
+from os import remove
+
+from aus_senate_audit.audit_recorder import AuditRecorder
+from aus_senate_audit.audit_store import AuditStore
+
+
+STATE = 'TAS'
+
+
+def get_sample(audit_stage, num_ballots):
+    """ Returns a sample of electronic ballots for the given audit stage.
+
+    :param int audit_stage: The audit stage.
+    :param int num_ballots: The number of ballots in the sample.
+
+    :returns: The ballots, as lines of the formal preferences format.
+    :rtype: list
+    """
+    return ['Denison,POSTAL 3,311,{},{},"1,2,{}"'.format(audit_stage, i, i % 3 + 3) for i in range(num_ballots)]
+
+
+def record_audit(audit_recorder):
+    """ Records two audit stages: a validated stage (with a ballot which was not validated and a ballot which did not
+    match), and a stage whose sample has been drawn but not validated.
+
+    :param :class:`AuditRecorder` audit_recorder: The recorder of the audit's progress.
+
+    :returns: The match results of the validated stage.
+    :rtype: list
+    """
+    sample = get_sample(1, 5)
+    audit_recorder.record_sample(1, 5, list(range(5)), sample, False)
+    paper_preferences = ['1,2,3', '1,2,4', None, '1,2,3', '2,1,4']
+    matches = [
+        (ballot, None, None) if preferences is None else
+        (ballot, int(ballot.endswith('"{}"'.format(preferences))), preferences)
+        for ballot, preferences in zip(sample, paper_preferences)
+    ]
+    new_ballots = [
+        '{}"{}"\n'.format(AuditRecorder.remove_preferences_from_ballot(ballot), preferences)
+        for ballot, _, preferences in matches if preferences is not None
+    ]
+    audit_recorder.record_validation(matches, new_ballots)
+    audit_recorder.record_stage_outcome(False)
+    audit_recorder.record_sample(2, 9, list(range(5, 9)), get_sample(2, 4), False)
+    return matches
+
+
+def read_audit_files():
+    """ Returns the contents of the audit's info file, round files and aggregate ballots file.
+
+    :returns: A mapping from the path of each audit file to its contents.
+    :rtype: dict
+    """
+    paths = ['audit_TAS/info.json', 'audit_TAS/aggregate.csv'] + glob('audit_TAS/rounds/*.csv')
+    contents = {}
+    for path in paths:
+        with open(path, 'r') as f:
+            contents[path] = f.read()
+    return contents
+
+
+def get_store_contents(store):
+    """ Returns the samples, match results, summaries and aggregate ballots of the two stages recorded by
+    :func:`record_audit`.
+
+    :param :class:`AuditStore` store: The store.
+
+    :returns: The samples and match results of each stage, the stage summaries and the aggregate ballots.
+    :rtype: tuple
+    """
+    return (
+        [store.get_sampled_ballots(audit_stage) for audit_stage in [1, 2]],
+        [store.get_matches(audit_stage) for audit_stage in [1, 2]],
+        store.get_stage_summaries(),
+        store.get_aggregate_ballots(),
+    )
+
+
+def test_store_records_audit(tmp_path):
+    """ The store returns the audit info, samples, match results, summaries and aggregate ballots recorded in it. """
+    store = AuditStore(str(tmp_path / 'audit.sqlite3'))
+    store.record_audit_info(1, 3)
+    store.record_sampled_ballots(1, get_sample(1, 3))
+    store.record_matches(1, [(1, '1,2,3'), None, (0, '1,3,2')])
+    store.add_aggregate_ballots(1, ['a', 'b'])
+    store.add_aggregate_ballots(None, ['c'])
+    assert store.get_audit_info() == {'audit_stage': 1, 'sample_size': 3}
+    assert store.get_sampled_ballots(1) == get_sample(1, 3)
+    assert store.get_matches(1) == [(1, '1,2,3'), None, (0, '1,3,2')]
+    assert store.get_stage_summaries() == [(1, 2, 1)]
+    assert store.find_sampled_ballots(311, 1, 2) == [(1, 2, get_sample(1, 3)[2])]
+    assert store.get_aggregate_ballots() == ['a', 'b', 'c']
+    assert store.get_aggregate_ballots(1) == ['b', 'c']
+    store.truncate_aggregate_ballots(1)
+    assert store.get_num_aggregate_ballots() == 1
+    store.close()
+
+
+def test_files_round_trip_through_store(tmp_path, monkeypatch):
+    """ Audit files imported into the store and exported again (as by export mode) are byte-identical. """
+    monkeypatch.chdir(tmp_path)
+    matches = record_audit(AuditRecorder(STATE))
+    audit_files = read_audit_files()
+    assert len(audit_files) == 4
+
+    store = AuditRecorder(STATE, use_store=True).get_store()
+    assert store.get_audit_info() == {'audit_stage': 2, 'sample_size': 9}
+    assert store.get_sampled_ballots(1) == get_sample(1, 5)
+    assert store.get_sampled_ballots(2) == get_sample(2, 4)
+    assert store.get_matches(1) == [
+        None if match is None else (match, preferences) for _, match, preferences in matches
+    ]
+    assert store.get_matches(2) == [None] * 4
+    assert store.get_stage_summaries() == [(1, 4, 3)]
+    assert len(store.get_aggregate_ballots()) == 4
+
+    for path in audit_files:
+        remove(path)
+    AuditRecorder(STATE).export_files()
+    assert read_audit_files() == audit_files
+
+
+def test_store_round_trips_to_files(tmp_path, monkeypatch):
+    """ An audit recorded in the store exports the same audit files as the audit recorded in files, which import back
+    into an identical store.
+    """
+    (tmp_path / 'files').mkdir()
+    (tmp_path / 'store').mkdir()
+    monkeypatch.chdir(tmp_path / 'files')
+    record_audit(AuditRecorder(STATE))
+    audit_files = read_audit_files()
+
+    monkeypatch.chdir(tmp_path / 'store')
+    audit_recorder = AuditRecorder(STATE, use_store=True)
+    record_audit(audit_recorder)
+    audit_recorder.export_files()
+    assert read_audit_files() == audit_files
+
+    contents = get_store_contents(audit_recorder.get_store())
+    audit_recorder.get_store().close()
+    remove('audit_TAS/audit.sqlite3')
+    assert get_store_contents(AuditRecorder(STATE, use_store=True).get_store()) == contents
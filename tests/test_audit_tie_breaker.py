@@ -0,0 +1,176 @@
+# -*- coding: utf-8 -*-
+
+""" Tests the Audit Tie Breaker Against the Permutation-Based and Recursive Algorithms It Replaces. """
+
+import itertools
+from json import dump
+from json import load
+
+import numpy
+import pytest
+
+from aus_senate_audit.audit_tie_breaker import AuditTieBreaker
+from aus_senate_audit.constants import TIE_BREAKER_RNG_STREAM
+from aus_senate_audit.random_streams import get_rng
+
+
+def get_random_events(candidate_ids, rng, num_events):
+    """ Returns random tie-breaking events which are consistent with a hidden random order of the given candidates.
+
+    :param list candidate_ids: The IDs of the candidates.
+    :param :class:`numpy.random.RandomState` rng: The random number generator used to draw the events.
+    :param int num_events: The number of events of each case.
+
+    :returns: The election order ties, election ties and exclusion ties (see :meth:`AuditTieBreaker.load_events`).
+    :rtype: tuple
+    """
+    hidden_order = dict((cid, i) for i, cid in enumerate(rng.permutation(candidate_ids).tolist()))
+
+    def get_tied_candidates():
+        tied = rng.choice(candidate_ids, rng.randint(2, min(4, len(candidate_ids)) + 1), replace=False).tolist()
+        return tied, sorted(tied, key=hidden_order.get)
+
+    election_order_ties, election_ties, exclusion_ties = [], [], []
+    for _ in range(num_events):
+        tied, order = get_tied_candidates()
+        election_order_ties.append([[list(p) for p in sorted(itertools.permutations(tied))], order])
+        tied, order = get_tied_candidates()
+        election_ties.append([tied, order[0]])
+        tied, order = get_tied_candidates()
+        exclusion_ties.append([tied, order[-1]])
+    return election_order_ties, election_ties, exclusion_ties
+
+
+def get_baseline_linear_order(candidate_ids, events, rng):
+    """ Returns the linear order of the candidates determined by the recursive random topological sort the tie breaker
+    used to use.
+
+    :param list candidate_ids: The IDs of the candidates.
+    :param tuple events: The election order ties, election ties and exclusion ties.
+    :param :class:`numpy.random.Generator` rng: The random number generator used to determine the sort.
+
+    :returns: The linear order of the candidate IDs.
+    :rtype: list
+    """
+    election_order_ties, election_ties, exclusion_ties = events
+    vertices = dict((cid, []) for cid in candidate_ids)
+    for _, resolution in election_order_ties:
+        for src_cid, dest_cid in itertools.combinations(resolution, 2):
+            vertices[src_cid].append(dest_cid)
+    for tied, resolution in election_ties:
+        vertices[resolution].extend(cid for cid in tied if cid != resolution)
+    for tied, resolution in exclusion_ties:
+        for cid in tied:
+            if cid != resolution:
+                vertices[cid].append(resolution)
+
+    linear_order = []
+
+    def visit(v):
+        if v in linear_order:
+            return
+        rng.shuffle(vertices[v])
+        for u in vertices[v]:
+            visit(u)
+        linear_order.insert(0, v)
+
+    roots = sorted(vertices)
+    rng.shuffle(roots)
+    for v in roots:
+        visit(v)
+    return linear_order
+
+
+def get_tie_breaker(candidate_ids, seed, events, linear_order_path=None):
+    """ Returns a tie breaker with the given tie-breaking events loaded.
+
+    :param list candidate_ids: The IDs of the candidates.
+    :param int seed: The seed of the tie breaker.
+    :param tuple events: The election order ties, election ties and exclusion ties.
+    :param str linear_order_path: The path the linear order is saved to (default: None, it is not saved).
+
+    :returns: The tie breaker.
+    :rtype: :class:`AuditTieBreaker`
+    """
+    tie_breaker = AuditTieBreaker(candidate_ids, seed=seed)
+    tie_breaker.load_events(*events, linear_order_path=linear_order_path)
+    return tie_breaker
+
+
+@pytest.mark.parametrize('seed', range(20))
+def test_linear_order_matches_recursive_sort(seed):
+    """ The iterative sort gives the same linear order as the recursive sort, drawing the same random numbers. """
+    rng = numpy.random.RandomState(seed)
+    candidate_ids = list(range(1, rng.randint(2, 30)))
+    events = get_random_events(candidate_ids, rng, rng.randint(0, 6))
+    tie_breaker = get_tie_breaker(candidate_ids, seed, events)
+    linear_order = tie_breaker.get_election_order(candidate_ids)
+    assert linear_order == get_baseline_linear_order(candidate_ids, events, get_rng(seed, TIE_BREAKER_RNG_STREAM))
+
+
+def test_long_chain_is_sorted():
+    """ A chain of election ties longer than the recursion limit is sorted in the order of the chain. """
+    candidate_ids = list(range(5000))
+    election_ties = [[[cid, cid + 1], cid] for cid in candidate_ids[:-1]]
+    assert get_tie_breaker(candidate_ids, 1, ([], election_ties, [])).get_election_order(candidate_ids) == candidate_ids
+
+
+@pytest.mark.parametrize('seed', range(20))
+def test_election_order_rank_matches_permutation_index(seed):
+    """ The Lehmer rank of the election order is its index in the sorted permutations of the tied candidates (as
+    dividebatur builds them), as found by the permutation-based wrapper it replaces.
+    """
+    rng = numpy.random.RandomState(seed)
+    candidate_ids = rng.choice(1000, 8, replace=False).tolist()
+    tie_breaker = get_tie_breaker(candidate_ids, seed, get_random_events(candidate_ids, rng, 3))
+    for size in range(1, 7):
+        tied = rng.choice(candidate_ids, size, replace=False).tolist()
+        permutations = sorted(itertools.permutations(tied))
+        expected = permutations.index(tuple(tie_breaker.break_tie(list(permutations[0]), 1)))
+        assert tie_breaker.get_election_order_rank(tied) == expected
+        assert tie_breaker.break_election_order_tie(permutations) == expected
+
+
+def test_saved_linear_order_is_reused_only_for_same_tie_breaker(tmp_path, monkeypatch):
+    """ The saved linear order is reused by a tie breaker with the same seed, candidates and events, and sorted again
+    (and saved) if any of them changes.
+    """
+    path = str(tmp_path / 'tie_breaker_order.json')
+    rng = numpy.random.RandomState(1)
+    candidate_ids = list(range(1, 13))
+    events = get_random_events(candidate_ids, rng, 3)
+    other_events = get_random_events(candidate_ids, rng, 3)
+    sorts = []
+    sort = AuditTieBreaker._sort
+    monkeypatch.setattr(AuditTieBreaker, '_sort', lambda self, vertices: sorts.append(1) or sort(self, vertices))
+
+    linear_order = get_tie_breaker(candidate_ids, 1, events, path).get_election_order(candidate_ids)
+    assert len(sorts) == 1
+    assert get_tie_breaker(candidate_ids, 1, events, path).get_election_order(candidate_ids) == linear_order
+    assert len(sorts) == 1
+
+    # The saved order is used as saved (so a tampered but consistent order shows it is not sorted again).
+    with open(path, 'r') as f:
+        state = load(f)
+    state['linear_order'] = get_baseline_linear_order(candidate_ids, events, numpy.random.default_rng(7))
+    with open(path, 'w') as f:
+        dump(state, f)
+    assert get_tie_breaker(candidate_ids, 1, events, path).get_election_order(candidate_ids) == state['linear_order']
+    assert len(sorts) == 1
+
+    for changed_candidate_ids, seed, changed_events in [
+        (candidate_ids, 2, events),
+        (candidate_ids + [13], 1, events),
+        (candidate_ids, 1, other_events),
+    ]:
+        num_sorts = len(sorts)
+        tie_breaker = get_tie_breaker(changed_candidate_ids, seed, changed_events, path)
+        assert len(sorts) == num_sorts + 1
+        assert tie_breaker.get_election_order(changed_candidate_ids) == get_baseline_linear_order(
+            changed_candidate_ids,
+            changed_events,
+            get_rng(seed, TIE_BREAKER_RNG_STREAM),
+        )
+        # The new linear order replaces the saved one.
+        get_tie_breaker(changed_candidate_ids, seed, changed_events, path)
+        assert len(sorts) == num_sorts + 1
@@ -0,0 +1,146 @@
+# -*- coding: utf-8 -*-
+
+""" Tests Validating Paper Preferences Against Electronic Preferences. """
+
+from aus_senate_audit.audit_recorder import AuditRecorder
+from aus_senate_audit.audit_validator import AuditValidator
+from aus_senate_audit.audit_validator import match_paper_ballots
+from aus_senate_audit.constants import COLUMN_HEADERS
+
+
+STATE = 'TAS'
+
+
+def get_ballot(batch_no, paper_no, preferences='1,2,3'):
+    """ Returns the line of the formal preferences format of the ballot on the given paper.
+
+    :param int batch_no: The number of the batch of the paper.
+    :param int paper_no: The number of the paper within its batch.
+    :param str preferences: The preferences of the ballot (default: '1,2,3').
+
+    :returns: The ballot, as a line of the formal preferences format.
+    :rtype: str
+    """
+    return 'Denison,POSTAL 3,311,{},{},"{}"'.format(batch_no, paper_no, preferences)
+
+
+def write_selected_ballots(path, ballots):
+    """ Writes the given paper ballots to a selected ballots file.
+
+    :param path: The path to the selected ballots file.
+    :param list ballots: The paper ballots.
+
+    :returns: The path to the selected ballots file.
+    :rtype: str
+    """
+    with open(str(path), 'w') as f:
+        f.write('{}\n'.format(','.join(COLUMN_HEADERS)) + ''.join('{}\n'.format(ballot) for ballot in ballots))
+    return str(path)
+
+
+# The electronic ballots drawn for the audit round: the paper of batch 1, paper 3 was drawn twice.
+ELECTRONIC_BALLOTS = [get_ballot(1, 1), get_ballot(1, 2), get_ballot(1, 3), get_ballot(2, 1), get_ballot(1, 3)]
+
+
+def test_paper_ballots_are_matched_by_paper(tmp_path):
+    """ Each paper ballot is matched to the electronic ballot drawn on the same paper, whatever order and file it is
+    read in; papers drawn twice are matched twice, and missing, extra and duplicate papers are reported.
+    """
+    paths = [
+        write_selected_ballots(tmp_path / 'chunk_1.csv', [
+            get_ballot(1, 3),
+            get_ballot(9, 9),  # Extra: not drawn.
+            get_ballot(1, 1, '1,3,2'),  # Does not match its electronic ballot.
+        ]),
+        write_selected_ballots(tmp_path / 'chunk_2.csv', [
+            get_ballot(1, 3),
+            get_ballot(1, 1),  # Duplicate: batch 1, paper 1 was only drawn once.
+            get_ballot(1, 3),  # Duplicate: batch 1, paper 3 was only drawn twice.
+        ]),
+    ]
+    matches, new_ballots, extra, duplicates = match_paper_ballots(ELECTRONIC_BALLOTS, paths)
+    assert matches == [
+        (get_ballot(1, 1), 0, '1,3,2'),
+        (get_ballot(1, 2), None, None),  # Missing.
+        (get_ballot(1, 3), 1, '1,2,3'),
+        (get_ballot(2, 1), None, None),  # Missing.
+        (get_ballot(1, 3), 1, '1,2,3'),
+    ]
+    assert new_ballots == [
+        (2, get_ballot(1, 3) + '\n'),
+        (0, get_ballot(1, 1, '1,3,2') + '\n'),
+        (4, get_ballot(1, 3) + '\n'),
+    ]
+    assert extra == [get_ballot(9, 9)]
+    assert duplicates == [get_ballot(1, 1), get_ballot(1, 3)]
+
+
+def test_paper_key_ignores_padding_and_short_lines():
+    """ The paper key is read with surrounding whitespace removed, and lines without one have no key. """
+    assert AuditValidator.get_paper_key(['Denison', 'POSTAL 3', ' 311', '1 ', '2', '"1,2,3"']) == ('311', '1', '2')
+    assert AuditValidator.get_paper_key(['Denison', 'POSTAL 3']) is None
+
+
+def test_compare_records_chunked_round(tmp_path, monkeypatch):
+    """ Comparing a round returned in several chunks records its match results, and adds the matched paper ballots
+    to the aggregate ballots in the order they were read.
+    """
+    monkeypatch.chdir(tmp_path)
+    audit_recorder = AuditRecorder(STATE)
+    audit_recorder.record_sample(1, 5, list(range(5)), ELECTRONIC_BALLOTS, False)
+    paths = [
+        write_selected_ballots(tmp_path / 'chunk_1.csv', [get_ballot(2, 1), get_ballot(1, 1, '1,3,2')]),
+        write_selected_ballots(tmp_path / 'chunk_2.csv', [get_ballot(1, 3), get_ballot(9, 9)]),
+    ]
+    validator = AuditValidator(paths, audit_recorder)
+    validator.compare()
+    assert validator.get_missing() == [get_ballot(1, 2), get_ballot(1, 3)]
+    assert validator.get_extra() == [get_ballot(9, 9)]
+    assert validator.get_duplicates() == []
+    lines, _ = audit_recorder.read_aggregate_ballots()
+    assert list(lines) == [get_ballot(2, 1) + '\n', get_ballot(1, 1, '1,3,2') + '\n', get_ballot(1, 3) + '\n']
+    with open(audit_recorder.get_current_audit_round_file_name(), 'r') as f:
+        assert f.read().split('\n')[1:] == [
+            get_ballot(1, 1) + ',0,"1,3,2"',
+            get_ballot(1, 2),
+            get_ballot(1, 3) + ',1,"1,2,3"',
+            get_ballot(2, 1) + ',1,"1,2,3"',
+            get_ballot(1, 3),
+            '',
+        ]
+
+
+def test_ingest_closes_round_once_every_packet_is_ingested(tmp_path, monkeypatch):
+    """ Work packets ingested one at a time, and together in parallel, close the round once every team's packet has
+    been ingested, adding the paper ballots to the aggregate ballots in the order they were drawn.
+    """
+    electronic_ballots = [get_ballot(batch_no, paper_no) for batch_no in [1, 2, 3] for paper_no in [1, 2]]
+    for workers in [1, 2]:
+        (tmp_path / str(workers)).mkdir()
+        monkeypatch.chdir(tmp_path / str(workers))
+        audit_recorder = AuditRecorder(STATE)
+        audit_recorder.record_sample(1, 6, list(range(6)), electronic_ballots, False, num_teams=2)
+        teams = audit_recorder.get_current_round_teams()
+        packets = [
+            write_selected_ballots('packet_{}.csv'.format(team), [
+                ballot for ballot, ballot_team in reversed(list(zip(electronic_ballots, teams))) if ballot_team == team
+            ])
+            for team in [1, 2]
+        ]
+        if workers == 1:
+            assert not AuditValidator(packets[1], audit_recorder).ingest()
+            assert audit_recorder.get_waiting_teams() == [1]
+            # The second team's packet is returned again, together with a ballot of the first team's batches.
+            write_selected_ballots(packets[1], [
+                ballot for ballot, team in zip(electronic_ballots, teams) if team == 2
+            ] + [electronic_ballots[teams.index(1)]])
+            assert not AuditValidator(packets[1], audit_recorder).ingest()
+            validator = AuditValidator(packets[0], audit_recorder)
+            assert validator.ingest()
+            # The ballot validated by both packets is merged from the first team's packet.
+            assert validator.get_duplicates() == [electronic_ballots[teams.index(1)]]
+        else:
+            assert AuditValidator(packets, audit_recorder).ingest(workers=workers)
+        assert audit_recorder.get_current_round_teams() is None
+        lines, _ = audit_recorder.read_aggregate_ballots()
+        assert list(lines) == ['{}\n'.format(ballot) for ballot in electronic_ballots]
@@ -0,0 +1,45 @@
+# -*- coding: utf-8 -*-
+
+""" Tests the Binary Ballot Store Against the Formal Preferences File It Is Converted From. """
+
+import numpy
+
+from aus_senate_audit.config_reader import ConfigReader
+from aus_senate_audit.senate_election.real_senate_election import RealSenateElection
+from aus_senate_audit.synthetic_dataset import SyntheticDatasetGenerator
+
+
+STATE = 'TAS'
+
+
+def get_election(data_file_path, ballots, indices):
+    """ Returns a real senate election holding the ballots at the given positions of the given cast ballots.
+
+    :param str data_file_path: The path to the synthetic dataset.
+    :param ballots: All cast ballots for the state (a :class:`FormalPreferencesIndex` or :class:`BallotStore`).
+    :param list indices: The positions of the sampled ballots.
+
+    :returns: The election.
+    :rtype: :class:`RealSenateElection`
+    """
+    election = RealSenateElection(1, STATE, data_file_path)
+    election.add_ballots_from_sample(ballots, indices)
+    return election
+
+
+def test_store_and_formal_preferences_file_give_same_ballots(tmp_path, monkeypatch):
+    """ The store and the formal preferences file give the same ballot types, in the same order, with the same
+    weights, for the same sampled positions.
+    """
+    monkeypatch.chdir(tmp_path)
+    data_file_path = str(tmp_path / 'data')
+    SyntheticDatasetGenerator(1, STATE, 2000, 16, 5, vacancies=6, atl_fraction=0.6).generate(data_file_path)
+    config_reader = ConfigReader(data_file_path)
+    with config_reader.get_all_ballots_for_state(STATE) as index:
+        with config_reader.convert_ballots_for_state(STATE) as store:
+            indices = numpy.random.RandomState(1).randint(0, len(index), 500).tolist()
+            index_election = get_election(data_file_path, index, indices)
+            store_election = get_election(data_file_path, store, indices)
+    assert store_election.get_ballots() == index_election.get_ballots()
+    assert store_election.get_ballot_weight_array().tolist() == index_election.get_ballot_weight_array().tolist()
+    assert len(store_election.get_ballots()) > 1
@@ -0,0 +1,42 @@
+# -*- coding: utf-8 -*-
+
+""" Tests Reading the Australian Senate Election Configuration File. """
+
+from json import dump
+from json import load
+
+import pytest
+
+from aus_senate_audit.config_reader import ConfigReader
+from aus_senate_audit.constants import CONFIG_FILE_PATH
+from aus_senate_audit.synthetic_dataset import SyntheticDatasetGenerator
+
+
+STATE = 'TAS'
+
+
+@pytest.mark.parametrize('option, value', [
+    ('format', 'AusSenatePre2015'),
+    ('s282', {'recount_from': 'TAS', 'method': 'restrict_form'}),
+    ('remove', {'candidates': [['SURNAME', 'Given']], 'method': 'strict'}),
+])
+def test_unsupported_contests_are_rejected(tmp_path, option, value):
+    """ A contest which dividebatur would count differently from the audit is rejected, rather than audited as if it
+    were counted as usual.
+    """
+    data_file_path = str(tmp_path / 'data')
+    SyntheticDatasetGenerator(1, STATE, 100, 8, 4, vacancies=2).generate(data_file_path)
+    assert ConfigReader(data_file_path).get_state_metadata(STATE)['num_ballots'] == 100
+
+    config_file_path = '{}/{}'.format(data_file_path, CONFIG_FILE_PATH)
+    with open(config_file_path, 'r') as f:
+        config = load(f)
+    contest_config = config['count'][0]
+    if option == 'format':
+        contest_config['aec-data']['format'] = value
+    else:
+        contest_config[option] = value
+    with open(config_file_path, 'w') as f:
+        dump(config, f)
+    with pytest.raises(ValueError, match=STATE):
+        ConfigReader(data_file_path).get_state_metadata(STATE)
@@ -0,0 +1,30 @@
+# -*- coding: utf-8 -*-
+
+""" Tests Random Access to the Ballots of a Formal Preferences File. """
+
+import pytest
+
+from aus_senate_audit.formal_preferences_index import FormalPreferencesIndex
+
+
+HEADER = 'ElectorateNm,VoteCollectionPointNm,VoteCollectionPointId,BatchNo,PaperNo,Preferences\n------------\n'
+
+
+@pytest.mark.parametrize('contents', ['', HEADER])
+def test_file_without_ballots(tmp_path, contents):
+    """ A formal preferences file which is empty, or holds only the header lines, has no ballots. """
+    path = tmp_path / 'formal_preferences.csv'
+    path.write_text(contents)
+    with FormalPreferencesIndex(str(path)) as index:
+        assert len(index) == 0
+        assert list(index) == []
+
+
+def test_close_releases_memory_map(tmp_path):
+    """ The ballots can be read until the index is closed, but not after. """
+    path = tmp_path / 'formal_preferences.csv'
+    path.write_text(HEADER + 'Denison,POSTAL 3,311,19,42,"1,2,3"  \nDenison,POSTAL 3,311,19,43,"3,2,1"\n')
+    with FormalPreferencesIndex(str(path)) as index:
+        assert list(index) == ['Denison,POSTAL 3,311,19,42,"1,2,3"', 'Denison,POSTAL 3,311,19,43,"3,2,1"']
+    with pytest.raises(ValueError):
+        index[0]
@@ -0,0 +1,44 @@
+# -*- coding: utf-8 -*-
+
+""" Tests the Long-Lived Session for Running a Quick Audit. """
+
+import pytest
+
+from aus_senate_audit.audit_recorder import AuditRecorder
+from aus_senate_audit.ballot_store import BallotStore
+from aus_senate_audit.config_reader import ConfigReader
+from aus_senate_audit.formal_preferences_index import FormalPreferencesIndex
+from aus_senate_audit.quick_audit_session import QuickAuditSession
+from aus_senate_audit.synthetic_dataset import SyntheticDatasetGenerator
+
+
+STATE = 'TAS'
+
+
+@pytest.mark.parametrize('convert', [False, True])
+def test_session_closes_cast_ballots(tmp_path, monkeypatch, convert):
+    """ The session's cast ballots (a formal preferences index, or a ballot store once the state is converted) are
+    closed when the session is.
+    """
+    monkeypatch.chdir(tmp_path)
+    data_file_path = str(tmp_path / 'data')
+    SyntheticDatasetGenerator(1, STATE, 200, 8, 4, vacancies=2).generate(data_file_path)
+    if convert:
+        ConfigReader(data_file_path).convert_ballots_for_state(STATE).close()
+    opened, closed = [], []
+    get_all_ballots_for_state = ConfigReader.get_all_ballots_for_state
+    monkeypatch.setattr(
+        ConfigReader,
+        'get_all_ballots_for_state',
+        lambda self, state: opened.append(get_all_ballots_for_state(self, state)) or opened[-1],
+    )
+    for cls in [BallotStore, FormalPreferencesIndex]:
+        monkeypatch.setattr(cls, 'close', lambda self, close=cls.close: closed.append(self) or close(self))
+
+    with QuickAuditSession(1, STATE, 50, data_file_path, AuditRecorder(STATE)) as session:
+        session.draw_ballots()
+        assert [ballots for ballots in opened if ballots in closed] == []
+    assert len(opened) == 1
+    assert isinstance(opened[0], BallotStore if convert else FormalPreferencesIndex)
+    assert opened[0] in closed
+    assert session.get_election().get_num_ballots_drawn() == 50
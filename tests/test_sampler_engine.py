@@ -0,0 +1,92 @@
+# -*- coding: utf-8 -*-
+
+""" Tests the Resumable Sampler Engine Against Rivest's Reference Sampler. """
+
+from json import dumps
+
+import pytest
+
+from aus_senate_audit.sampler.sampler import generate_outputs
+from aus_senate_audit.sampler.sampler_engine import SamplerEngine
+
+
+# The seeds, ranges [a, b] and total sample sizes of each audit stage sampled by the tests.
+CASES = [
+    ('1', 0, 9, [3, 7, 10]),
+    ('20160805', 0, 999, [1, 100, 350, 351, 900]),
+    ('seed with spaces', 5, 2004, [250, 500, 2000]),
+    ('42', 0, 2 ** 40, [17, 40]),
+]
+
+
+@pytest.mark.parametrize('seed, a, b, sizes', CASES)
+@pytest.mark.parametrize('with_replacement', [False, True])
+def test_fresh_engine_matches_generate_outputs(seed, a, b, sizes, with_replacement):
+    """ A fresh engine gives byte-identical previous and new picks to :func:`generate_outputs`, for every previous
+    sample size.
+    """
+    for skip in [0] + sizes[:-1]:
+        expected = generate_outputs(sizes[-1], with_replacement, a, b, seed, skip)
+        outputs = SamplerEngine(seed, a, b, with_replacement).sample(sizes[-1], skip)
+        assert dumps(outputs) == dumps(expected)
+
+
+@pytest.mark.parametrize('seed, a, b, sizes', CASES)
+@pytest.mark.parametrize('with_replacement', [False, True])
+def test_resumed_engine_matches_generate_outputs(tmp_path, seed, a, b, sizes, with_replacement):
+    """ An engine resumed from its checkpoint at the end of each audit stage gives byte-identical previous and new picks
+    to :func:`generate_outputs` for the next stage.
+    """
+    path = str(tmp_path / 'sampler_state.json')
+    skip = 0
+    for n in sizes:
+        engine = SamplerEngine.load(path, seed, a, b, with_replacement)
+        assert len(engine.get_outputs()) == skip
+        outputs = engine.sample(n, skip)
+        assert dumps(outputs) == dumps(generate_outputs(n, with_replacement, a, b, seed, skip))
+        engine.save(path)
+        skip = n
+
+
+def test_checkpoint_of_other_sample_is_not_resumed(tmp_path):
+    """ A checkpoint saved with different parameters, or at a different sample size, is not extended. """
+    path = str(tmp_path / 'sampler_state.json')
+    engine = SamplerEngine('1', 0, 999)
+    engine.sample(100, 0)
+    engine.save(path)
+    assert SamplerEngine.load(path, '2', 0, 999).get_outputs() == []
+    assert SamplerEngine.load(path, '1', 0, 998).get_outputs() == []
+    # The checkpoint holds 100 picks, so a previous sample of 50 is regenerated from the start of the sequence.
+    outputs = SamplerEngine.load(path, '1', 0, 999).sample(150, 50)
+    assert dumps(outputs) == dumps(generate_outputs(150, False, 0, 999, '1', 50))
+
+
+@pytest.mark.parametrize('seed, a, b, sizes', CASES)
+@pytest.mark.parametrize('with_replacement', [False, True])
+def test_parallel_hashing_matches_serial_and_generate_outputs(tmp_path, seed, a, b, sizes, with_replacement):
+    """ Hashing counter values across worker processes gives byte-identical picks, and leaves byte-identical
+    checkpoints, to hashing them serially, and both match :func:`generate_outputs`, stage after stage.
+    """
+    skip = 0
+    for n in sizes:
+        expected = dumps(generate_outputs(n, with_replacement, a, b, seed, skip))
+        checkpoints = []
+        for workers in [1, 2, 3]:
+            path = str(tmp_path / 'sampler_state_{}.json'.format(workers))
+            engine = SamplerEngine.load(path, seed, a, b, with_replacement)
+            assert dumps(engine.sample(n, skip, workers)) == expected
+            engine.save(path)
+            with open(path, 'r') as f:
+                checkpoints.append(f.read())
+        assert checkpoints[1] == checkpoints[0]
+        assert checkpoints[2] == checkpoints[0]
+        skip = n
+
+
+def test_parallel_hashing_of_nearly_exhausted_range():
+    """ Hashing counter values across worker processes rejects duplicates as the serial sampler does when nearly every
+    integer of the range has been picked (so most counter values give duplicates).
+    """
+    expected = dumps(generate_outputs(200, False, 1, 200, 'exhausted', 0))
+    assert dumps(SamplerEngine('exhausted', 1, 200).sample(200, 0, 4)) == expected
+    assert dumps(SamplerEngine('exhausted', 1, 200).sample(200, 0)) == expected
@@ -0,0 +1,107 @@
+# -*- coding: utf-8 -*-
+
+""" Tests the Borda Count and Compact Storage of a Simulated Senate Election Against Per-Ballot Scoring. """
+
+from collections import Counter
+
+import numpy
+import pytest
+
+from aus_senate_audit.senate_election.simulated_senate_election import SimulatedSenateElection
+
+
+def get_baseline_outcome(election, ballot_weights):
+    """ Returns the outcome of the simulated senate election as scored one ballot at a time, the way the election used
+    to be scored.
+
+    :param :class:`SimulatedSenateElection` election: The simulated senate election.
+    :param :class:`numpy.ndarray` ballot_weights: The weight of each ballot type, indexed by ID.
+
+    :returns: The IDs of the candidates elected to the available seats, sorted in lexicographical order.
+    :rtype: tuple
+    """
+    counter = Counter()
+    for ballot_id, weight in enumerate(ballot_weights.tolist()):
+        for i, cid in enumerate(election.get_ballot_type(ballot_id)):
+            counter[cid] += weight * i
+    # Get the seats candidates with the lowest Borda counts in increasing order.
+    winners = counter.most_common()[-election.get_num_seats():][::-1]
+    return tuple(sorted([cid for cid, count in winners]))
+
+
+def get_election(seed, m, num_ballots, compact=False):
+    """ Returns a simulated senate election with the given number of ballots drawn, and the prior ballots added.
+
+    :param int seed: The starting value for the random number generator.
+    :param int m: The total number of candidates in the election.
+    :param int num_ballots: The number of ballots to draw.
+    :param bool compact: Whether to store each simulated ballot as its own ballot type (default: False).
+
+    :returns: The simulated senate election.
+    :rtype: :class:`SimulatedSenateElection`
+    """
+    election = SimulatedSenateElection(seed, num_ballots, m, num_ballots, compact=compact)
+    election.draw_ballots()
+    election.add_prior_ballots()
+    return election
+
+
+@pytest.mark.parametrize('seed', range(10))
+@pytest.mark.parametrize('m', [2, 3, 5, 8])
+def test_outcomes_match_per_ballot_scoring(seed, m):
+    """ The winners found with the Borda matrix product match the winners found by scoring one ballot at a time, with
+    small random weights (including zero weights) so the Borda counts are often tied.
+    """
+    election = get_election(seed, m, 20)
+    rng = numpy.random.RandomState(seed)
+    ballot_weights = rng.randint(0, 3, (50, len(election.get_ballots())))
+    expected = [get_baseline_outcome(election, weights) for weights in ballot_weights]
+    assert election.get_outcomes(ballot_weights) == expected
+    assert [election.get_outcome(weights) for weights in ballot_weights] == expected
+
+
+def test_tied_outcomes_favour_candidates_first_seen_later():
+    """ Candidates with tied Borda counts are elected in favour of the candidate which first appears later in the
+    ballot types, as when scoring one ballot at a time.
+    """
+    election = SimulatedSenateElection(1, 4, 5, 1)
+    election.add_ballot((2, 4, 1, 3, 5), 1)
+    election.add_ballot((5, 3, 1, 4, 2), 1)
+    # Every candidate has a Borda count of 4 (and of 0 with no weight).
+    for ballot_weights in [[1, 1], [0, 0]]:
+        ballot_weights = numpy.array(ballot_weights)
+        assert election.get_outcome(ballot_weights) == get_baseline_outcome(election, ballot_weights) == (3, 5)
+
+
+def test_outcome_with_fewer_candidates_than_seats():
+    """ If fewer candidates appear in the ballot types than there are seats, all of them are elected. """
+    election = SimulatedSenateElection(1, 4, 8, 1)
+    election.add_ballot((6, 2), 1)
+    election.add_ballot((2, 7), 3)
+    ballot_weights = election.get_ballot_weight_array()
+    assert election.get_outcome(ballot_weights) == get_baseline_outcome(election, ballot_weights) == (2, 6, 7)
+
+
+@pytest.mark.parametrize('seed', range(10))
+@pytest.mark.parametrize('m', [3, 5, 8])
+def test_compact_election_matches_election(seed, m):
+    """ A compact election holds the same ballots and weights as an election which merges ballots of the same type,
+    and gives the same winners for the same weights per ballot type (often tied), as scored one ballot at a time.
+    """
+    election = get_election(seed, m, 40)
+    compact_election = get_election(seed, m, 40, compact=True)
+    ballots = election.get_ballots()
+    assert compact_election.get_num_ballots_drawn() == election.get_num_ballots_drawn()
+    assert sorted(set(compact_election.get_ballots())) == sorted(ballots)
+    for ballot in ballots:
+        assert compact_election.get_ballot_weight(ballot) == election.get_ballot_weight(ballot)
+
+    # Spread random weights over the compact rows, and merge them by ballot type for the election.
+    ballot_ids = numpy.array([election.get_ballot_id(ballot) for ballot in compact_election.get_ballots()])
+    compact_weights = numpy.random.RandomState(seed).randint(0, 2, (50, len(ballot_ids)))
+    ballot_weights = numpy.zeros((50, len(ballots)), dtype=numpy.int64)
+    for compact_id, ballot_id in enumerate(ballot_ids):
+        ballot_weights[:, ballot_id] += compact_weights[:, compact_id]
+    expected = [get_baseline_outcome(election, weights) for weights in ballot_weights]
+    assert compact_election.get_outcomes(compact_weights) == expected
+    assert [get_baseline_outcome(compact_election, weights) for weights in compact_weights] == expected
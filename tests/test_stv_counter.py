@@ -0,0 +1,144 @@
+# -*- coding: utf-8 -*-
+
+""" Tests the Native STV Counter Against dividebatur's Counter. """
+
+import dividebatur.counter as cnt
+import numpy
+import pytest
+
+from aus_senate_audit.audit_tie_breaker import AuditTieBreaker
+from aus_senate_audit.senate_election.real_senate_election_results import RealSenateElectionResults
+from aus_senate_audit.senate_election.stv_counter import StvCounter
+
+
+class RecordingTieBreaker(AuditTieBreaker):
+    """ Implements an :class:`AuditTieBreaker` which records the case of each tie it breaks.
+
+    :ivar list cases: The case (election order, election or exclusion tie) of each tie broken thus far.
+    """
+    def __init__(self, candidate_ids, seed):
+        """ Initializes a :class:`RecordingTieBreaker` object, with no tie-breaking events.
+
+        :param list candidate_ids: The IDs of the candidates participating in the election.
+        :param int seed: The starting value for the random number generator.
+        """
+        super(RecordingTieBreaker, self).__init__(candidate_ids, seed=seed)
+        self.load_events([], [], [])
+        self.cases = []
+
+    def break_tie(self, candidate_ids, case_num):
+        """ Records the case of the tie, and breaks it (see :meth:`AuditTieBreaker.break_tie`). """
+        self.cases.append(case_num)
+        return super(RecordingTieBreaker, self).break_tie(candidate_ids, case_num)
+
+
+def get_result(count_fn):
+    """ Returns the result of the given count, or the type of the error it raised.
+
+    :param function count_fn: Runs the count, returning the IDs of the candidates elected.
+
+    :returns: The IDs of the candidates elected, in the order they were elected (or the type of the error raised).
+    :rtype: list
+    """
+    try:
+        return count_fn()
+    except ValueError as e:
+        return type(e)
+
+
+def count_with_both_counters(candidate_ids, vacancies, ballot_types, weights, seed):
+    """ Counts the given ballots with the native counter and with dividebatur's counter.
+
+    :param list candidate_ids: The IDs of the candidates, in the order they appear on the ballot.
+    :param int vacancies: The number of vacancies to fill.
+    :param list ballot_types: The distinct ballot types (each a tuple of candidate IDs in preference order).
+    :param list weights: The number of ballots of each ballot type.
+    :param int seed: The starting value for the random number generator of the tie breakers.
+
+    :returns: The result of each count (see :func:`get_result`) and the cases of the ties it broke, native first.
+    :rtype: tuple
+    """
+    candidate_orders = {cid: i for i, cid in enumerate(candidate_ids)}
+
+    native_tie_breaker = RecordingTieBreaker(candidate_ids, seed)
+    native_counter = StvCounter(vacancies, candidate_ids, candidate_orders, native_tie_breaker)
+    native_result = get_result(lambda: native_counter.count(ballot_types, numpy.array(weights)))
+
+    dividebatur_tie_breaker = RecordingTieBreaker(candidate_ids, seed)
+
+    def count_with_dividebatur():
+        papers_for_count = cnt.PapersForCount()
+        for ballot_type, weight in zip(ballot_types, weights):
+            if weight:
+                papers_for_count.add_ticket(ballot_type, weight)
+        results = RealSenateElectionResults()
+        cnt.SenateCounter(
+            results,
+            vacancies,
+            papers_for_count,
+            dividebatur_tie_breaker.break_election_order_tie,
+            dividebatur_tie_breaker.break_exclusion_tie,
+            dividebatur_tie_breaker.break_election_tie,
+            candidate_ids,
+            candidate_orders.__getitem__,
+            disable_bulk_exclusions=True,
+        ).run()
+        return results.get_elected_candidates()
+
+    dividebatur_result = get_result(count_with_dividebatur)
+    return native_result, dividebatur_result, native_tie_breaker.cases, dividebatur_tie_breaker.cases
+
+
+@pytest.mark.parametrize('seed', [1, 2, 3, 4])
+@pytest.mark.parametrize('case_num, candidate_ids, vacancies, ballot_types, weights', [
+    # The two trailing candidates are tied for exclusion.
+    (AuditTieBreaker.EXCLUSION_TIE_ID, [1, 2, 3, 4], 1, [(1, 2), (2, 1), (3, 1), (4, 2)], [3, 3, 1, 1]),
+    # Two candidates reach the quota with the same number of votes in the same round.
+    (AuditTieBreaker.ELECTION_ORDER_TIE_ID, [1, 2, 3], 2, [(1, 3), (2, 3), (3,)], [4, 4, 1]),
+    # The two continuing candidates are tied for the last vacancy.
+    (AuditTieBreaker.ELECTION_TIE_ID, [1, 2, 3], 1, [(1,), (2,), (3,)], [2, 2, 1]),
+])
+def test_counters_agree_on_ties(seed, case_num, candidate_ids, vacancies, ballot_types, weights):
+    """ The counters break the same ties, in the same way, and elect the same candidates in the same order. """
+    native_result, dividebatur_result, native_cases, dividebatur_cases = count_with_both_counters(
+        candidate_ids,
+        vacancies,
+        ballot_types,
+        weights,
+        seed,
+    )
+    assert case_num in dividebatur_cases
+    assert native_cases == dividebatur_cases
+    assert native_result == dividebatur_result
+
+
+def test_counters_agree_on_random_elections():
+    """ The counters elect the same candidates in the same order, breaking the same ties, over random elections with
+    few ballots (so exclusions, and ties of every case, are frequent).
+    """
+    all_cases = set()
+    for seed in range(300):
+        rng = numpy.random.RandomState(seed)
+        num_candidates = rng.randint(4, 9)
+        candidate_ids = list(range(1, num_candidates + 1))
+        vacancies = rng.randint(1, num_candidates - 1)
+        ballot_types = sorted(set(
+            tuple(rng.permutation(candidate_ids)[:rng.randint(1, num_candidates + 1)].tolist())
+            for _ in range(rng.randint(3, 25))
+        ))
+        weights = rng.randint(1, 4, len(ballot_types)).tolist()
+        native_result, dividebatur_result, native_cases, dividebatur_cases = count_with_both_counters(
+            candidate_ids,
+            vacancies,
+            ballot_types,
+            weights,
+            seed,
+        )
+        assert native_result == dividebatur_result, seed
+        assert native_cases == dividebatur_cases, seed
+        all_cases.update(native_cases)
+    assert all_cases == {
+        AuditTieBreaker.ELECTION_ORDER_TIE_ID,
+        AuditTieBreaker.ELECTION_TIE_ID,
+        AuditTieBreaker.EXCLUSION_TIE_ID,
+    }
@@ -0,0 +1,47 @@
+# -*- coding: utf-8 -*-
+
+""" Tests the Executors for Running the Trials of an Audit Stage. """
+
+from os import listdir
+
+from aus_senate_audit.audits.trial_executor import ProcessPoolTrialExecutor
+from aus_senate_audit.audits.trial_executor import SerialTrialExecutor
+from aus_senate_audit.constants import TRIAL_BLOCKS_IN_FLIGHT_PER_WORKER
+
+
+def record_trial(election, path, trial):
+    """ Runs a trial which records that it was run, by creating a file named after it in the given directory.
+
+    :param election: The senate election being audited (unused).
+    :param str path: The directory the trials are recorded in.
+    :param int trial: The index of the trial.
+
+    :returns: The index of the trial.
+    :rtype: int
+    """
+    open('{}/{}'.format(path, trial), 'w').close()
+    return trial
+
+
+def test_executors_return_results_in_order(tmp_path):
+    """ The results of the trials are returned in the order the trials were given, however many workers run them. """
+    trials_args = [(str(tmp_path), trial) for trial in range(50)]
+    with SerialTrialExecutor(None, record_trial) as executor:
+        assert list(executor.run(trials_args)) == list(range(50))
+    with ProcessPoolTrialExecutor(None, record_trial, 3) as executor:
+        assert list(executor.run(trials_args)) == list(range(50))
+
+
+def test_process_pool_stops_submitting_trials_once_consumer_stops(tmp_path):
+    """ Once the consumer stops reading the results, only the trials already in flight are run, and the trials of the
+    next run are not queued behind the abandoned ones.
+    """
+    stage_path = tmp_path / 'stage'
+    stage_path.mkdir()
+    with ProcessPoolTrialExecutor(None, record_trial, 2) as executor:
+        results = executor.run([(str(stage_path), trial) for trial in range(1000)])
+        assert next(results) == 0
+        results.close()
+        # The pool runs tasks in the order they were submitted, so the earlier trials have all been taken up.
+        assert list(executor.run([(str(tmp_path), 'next')])) == ['next']
+    assert len(listdir(str(stage_path))) <= 1 + 2 * TRIAL_BLOCKS_IN_FLIGHT_PER_WORKER